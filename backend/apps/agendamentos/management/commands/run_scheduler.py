@@ -0,0 +1,54 @@
+"""
+Agendador de relatórios: executa os agendamentos vencidos.
+Pode haver mais de um processo rodando (os vencidos são reservados com
+SELECT ... FOR UPDATE SKIP LOCKED). Encerra com Ctrl+C/SIGTERM depois de
+terminar as execuções em andamento.
+
+Uso:
+    python manage.py run_scheduler --workers 8
+    python manage.py run_scheduler --uma-vez   # uma rodada (ex.: cron)
+"""
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from services.agendador import Agendador
+
+
+class Command(BaseCommand):
+    help = 'Executa os agendamentos de relatórios vencidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.AGENDADOR_WORKERS,
+            help='Execuções simultâneas neste processo'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=settings.AGENDADOR_INTERVALO_SEGUNDOS,
+            help='Segundos entre buscas quando não há agendamentos vencidos'
+        )
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Executa uma rodada e sai'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O agendador exige PostgreSQL (SELECT ... FOR UPDATE SKIP LOCKED)')
+
+        agendador = Agendador(workers=options['workers'], intervalo=options['intervalo'])
+
+        def parar(signum, frame):
+            self.stdout.write('Encerrando após as execuções em andamento...')
+            agendador.parar()
+        signal.signal(signal.SIGINT, parar)
+        signal.signal(signal.SIGTERM, parar)
+
+        self.stdout.write(f'Agendador iniciado ({options["workers"]} workers)')
+        disparados = agendador.rodar(uma_vez=options['uma_vez'])
+        self.stdout.write(self.style.SUCCESS(f'{disparados} agendamento(s) executado(s)'))
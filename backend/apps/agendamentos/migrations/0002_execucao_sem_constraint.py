@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0001_initial'),
+        ('execucoes', '0008_execucao_indices_historico'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='execucaoagendada',
+            name='execucao',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='execucoes.execucao'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:30
+
+import calendar
+import zoneinfo
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# Regra de agendamento no momento desta migration (services.agendador)
+MAX_DIAS_BUSCA = 400
+
+
+def _executa_no_dia(agendamento, dia):
+    if agendamento.frequencia == 'SEMANAL':
+        # dias_semana usa 0=Domingo; date.weekday() usa 0=Segunda
+        return (dia.weekday() + 1) % 7 in (agendamento.dias_semana or [])
+    if agendamento.frequencia == 'MENSAL':
+        ultimo = calendar.monthrange(dia.year, dia.month)[1]
+        return dia.day == min(agendamento.dia_mes or 1, ultimo)
+    return True
+
+
+def _proxima_execucao(agendamento, agora):
+    zona = zoneinfo.ZoneInfo(agendamento.empresa.fuso_horario or settings.TIME_ZONE)
+    dia = agora.astimezone(zona).date()
+    for _ in range(MAX_DIAS_BUSCA):
+        if _executa_no_dia(agendamento, dia):
+            candidato = datetime.combine(dia, agendamento.hora_execucao, tzinfo=zona).astimezone(dt_timezone.utc)
+            if candidato > agora:
+                return candidato
+        dia += timedelta(days=1)
+    return None
+
+
+def calcular_proximas(apps, schema_editor):
+    """Preenche proxima_execucao dos agendamentos ativos que ainda não têm"""
+    Agendamento = apps.get_model('agendamentos', 'Agendamento')
+    agora = timezone.now()
+    pendentes = Agendamento.objects.filter(ativo=True, proxima_execucao__isnull=True).select_related('empresa')
+    for agendamento in pendentes.iterator():
+        agendamento.proxima_execucao = _proxima_execucao(agendamento, agora)
+        agendamento.save(update_fields=['proxima_execucao'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0003_particionar_execucoes_agendadas'),
+        ('empresas', '0006_empresa_fuso_horario'),
+        ('relatorios', '0008_relatorio_busca'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['ativo', 'proxima_execucao'], name='agendamentos_ativo_proxima'),
+        ),
+        migrations.RunPython(calcular_proximas, migrations.RunPython.noop),
+    ]
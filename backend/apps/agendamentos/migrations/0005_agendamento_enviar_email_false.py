@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:10
+
+from django.db import migrations, models
+
+
+def desativar_envio(apps, schema_editor):
+    """O envio por email nunca foi feito; desmarca para não sugerir o contrário"""
+    Agendamento = apps.get_model('agendamentos', 'Agendamento')
+    Agendamento.objects.filter(enviar_email=True).update(enviar_email=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0004_agendamento_proxima_execucao'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='agendamento',
+            name='enviar_email',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(desativar_envio, migrations.RunPython.noop),
+    ]
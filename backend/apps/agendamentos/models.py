@@ -28,7 +28,8 @@ class Agendamento(models.Model):
 
     # Parâmetros de Execução
     filtros_padrao = JSONField(null=True, blank=True, help_text="Valores para os filtros do relatório")
-    enviar_email = models.BooleanField(default=True)
+    # Envio ainda não implementado: o serializer só aceita False
+    enviar_email = models.BooleanField(default=False)
     emails_destino = JSONField(default=list, help_text="Lista de emails destinatários")
 
     # Status
@@ -44,6 +45,10 @@ class Agendamento(models.Model):
         verbose_name = 'Agendamento'
         verbose_name_plural = 'Agendamentos'
         ordering = ['-criado_em']
+        indexes = [
+            # Busca dos agendamentos vencidos pelo agendador (services/agendador.py)
+            models.Index(fields=['ativo', 'proxima_execucao'], name='agendamentos_ativo_proxima'),
+        ]
 
     def __str__(self):
         return f"{self.nome} ({self.get_frequencia_display()})"
@@ -53,7 +58,11 @@ class ExecucaoAgendada(models.Model):
     """Histórico de execuções disparadas pelo agendamento"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     agendamento = models.ForeignKey(Agendamento, on_delete=models.CASCADE, related_name='historico_execucoes')
-    execucao = models.ForeignKey(Execucao, on_delete=models.SET_NULL, null=True, blank=True)
+    # Sem constraint no banco: execucoes é particionada (PK inclui iniciado_em)
+    # e suas partições antigas são removidas pela retenção
+    execucao = models.ForeignKey(
+        Execucao, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False
+    )
     
     iniciado_em = models.DateTimeField(auto_now_add=True)
     finalizado_em = models.DateTimeField(null=True, blank=True)
@@ -25,14 +25,40 @@ class AgendamentoSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'empresa', 'criado_por', 'proxima_execucao', 'ultima_execucao', 'criado_em', 'atualizado_em']
         
+    def validate_enviar_email(self, value):
+        # O agendador ainda não envia emails: o resultado fica no histórico
+        if value:
+            raise serializers.ValidationError(
+                "O envio por email ainda não está disponível; o resultado fica no histórico do agendamento."
+            )
+        return value
+
     def validate(self, data):
-        """Validações customizadas de frequência"""
-        if data.get('frequencia') == 'SEMANAL' and not data.get('dias_semana'):
-            raise serializers.ValidationError({"dias_semana": "Obrigatório para frequência semanal."})
-            
-        if data.get('frequencia') == 'MENSAL' and not data.get('dia_mes'):
-            raise serializers.ValidationError({"dia_mes": "Obrigatório para frequência mensal."})
-            
+        """
+        Validações customizadas de frequência.
+        Em atualizações parciais, campos ausentes valem o que já está gravado.
+        """
+        def valor(campo):
+            return data[campo] if campo in data else getattr(self.instance, campo, None)
+
+        frequencia = valor('frequencia')
+        if frequencia == 'SEMANAL':
+            dias_semana = valor('dias_semana')
+            if not dias_semana:
+                raise serializers.ValidationError({"dias_semana": "Obrigatório para frequência semanal."})
+            # Dias fora de 0-6 nunca executariam
+            if not isinstance(dias_semana, list) or any(
+                not isinstance(dia, int) or isinstance(dia, bool) or not 0 <= dia <= 6 for dia in dias_semana
+            ):
+                raise serializers.ValidationError({"dias_semana": "Informe uma lista de dias entre 0 (Domingo) e 6 (Sábado)."})
+
+        if frequencia == 'MENSAL':
+            dia_mes = valor('dia_mes')
+            if not dia_mes:
+                raise serializers.ValidationError({"dia_mes": "Obrigatório para frequência mensal."})
+            if not 1 <= dia_mes <= 31:
+                raise serializers.ValidationError({"dia_mes": "Informe um dia entre 1 e 31."})
+
         return data
 
     def create(self, validated_data):
@@ -1,3 +1,237 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from apps.conexoes.models import Conexao
+from apps.empresas.models import Empresa
+from apps.relatorios.models import Relatorio
+from apps.usuarios.models import Usuario
+from core import crypto
+from services import result_spill
+from services.agendador import calcular_proxima_execucao, executar, reservar_vencidos
+from .models import Agendamento
+from .serializers import AgendamentoSerializer
 
-# Create your tests here.
+SAO_PAULO = ZoneInfo('America/Sao_Paulo')
+NOVA_YORK = ZoneInfo('America/New_York')
+
+
+class CalcularProximaExecucaoTest(SimpleTestCase):
+
+    def _agendamento(self, frequencia, hora, dias_semana=None, dia_mes=None, fuso='America/Sao_Paulo'):
+        return SimpleNamespace(
+            frequencia=frequencia, hora_execucao=hora, dias_semana=dias_semana, dia_mes=dia_mes,
+            empresa=SimpleNamespace(fuso_horario=fuso),
+        )
+
+    def test_proxima_execucao(self):
+        # 2025-01-15 é quarta-feira
+        quarta = datetime(2025, 1, 15, 10, 0, tzinfo=SAO_PAULO)
+        CASOS = [
+            ('diário antes do horário', self._agendamento('DIARIO', time(12, 0)),
+             quarta, datetime(2025, 1, 15, 12, 0, tzinfo=SAO_PAULO)),
+            ('diário no horário exato vai para o dia seguinte', self._agendamento('DIARIO', time(10, 0)),
+             quarta, datetime(2025, 1, 16, 10, 0, tzinfo=SAO_PAULO)),
+            ('semanal 0 = domingo', self._agendamento('SEMANAL', time(8, 0), dias_semana=[0]),
+             quarta, datetime(2025, 1, 19, 8, 0, tzinfo=SAO_PAULO)),
+            ('semanal 1 = segunda', self._agendamento('SEMANAL', time(8, 0), dias_semana=[1]),
+             quarta, datetime(2025, 1, 20, 8, 0, tzinfo=SAO_PAULO)),
+            ('semanal 6 = sábado', self._agendamento('SEMANAL', time(8, 0), dias_semana=[6]),
+             quarta, datetime(2025, 1, 18, 8, 0, tzinfo=SAO_PAULO)),
+            ('semanal 3 = quarta, mesmo dia', self._agendamento('SEMANAL', time(11, 0), dias_semana=[3, 5]),
+             quarta, datetime(2025, 1, 15, 11, 0, tzinfo=SAO_PAULO)),
+            ('dia 31 em fevereiro vira o último dia', self._agendamento('MENSAL', time(6, 0), dia_mes=31),
+             datetime(2025, 1, 31, 7, 0, tzinfo=SAO_PAULO), datetime(2025, 2, 28, 6, 0, tzinfo=SAO_PAULO)),
+            ('dia 31 em fevereiro bissexto', self._agendamento('MENSAL', time(6, 0), dia_mes=31),
+             datetime(2024, 2, 1, tzinfo=SAO_PAULO), datetime(2024, 2, 29, 6, 0, tzinfo=SAO_PAULO)),
+            ('dia 31 volta a ser 31 em março', self._agendamento('MENSAL', time(6, 0), dia_mes=31),
+             datetime(2025, 2, 28, 7, 0, tzinfo=SAO_PAULO), datetime(2025, 3, 31, 6, 0, tzinfo=SAO_PAULO)),
+            # 2025-03-09 02:30 não existe em Nova York (02:00 -> 03:00): roda às 03:30 EDT
+            ('horário inexistente no início do horário de verão',
+             self._agendamento('DIARIO', time(2, 30), fuso='America/New_York'),
+             datetime(2025, 3, 9, 0, 0, tzinfo=NOVA_YORK), datetime(2025, 3, 9, 7, 30, tzinfo=dt_timezone.utc)),
+            ('dia seguinte à mudança segue o horário local',
+             self._agendamento('DIARIO', time(2, 30), fuso='America/New_York'),
+             datetime(2025, 3, 9, 12, 0, tzinfo=NOVA_YORK), datetime(2025, 3, 10, 2, 30, tzinfo=NOVA_YORK)),
+        ]
+        for descricao, agendamento, depois, esperado in CASOS:
+            with self.subTest(descricao):
+                proxima = calcular_proxima_execucao(agendamento, depois)
+                self.assertEqual(proxima, esperado)
+                self.assertEqual(proxima.tzinfo, dt_timezone.utc)
+
+    def test_semanal_sem_dias_nunca_executa(self):
+        agendamento = self._agendamento('SEMANAL', time(8, 0), dias_semana=[])
+        self.assertIsNone(calcular_proxima_execucao(agendamento, datetime(2025, 1, 15, tzinfo=SAO_PAULO)))
+
+
+class AgendamentoSerializerTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        cls.admin = Usuario.objects.create_user('admin@empresa.com', cls.empresa, 'senha', nome='Admin', role='ADMIN')
+        conexao = Conexao.objects.create(
+            empresa=cls.empresa, nome='Conexão', tipo='POSTGRESQL', host='localhost',
+            porta=5432, database='db', usuario='u', senha_encriptada=''
+        )
+        cls.relatorio = Relatorio.objects.create(
+            empresa=cls.empresa, conexao=conexao, nome='Vendas', query_sql='SELECT 1', criado_por=cls.admin
+        )
+
+    def _dados(self, **campos):
+        return {
+            'relatorio': self.relatorio.pk, 'nome': 'Agendamento', 'hora_execucao': '08:00',
+            'emails_destino': [], **campos,
+        }
+
+    def test_configuracoes_que_nunca_executam(self):
+        CASOS = [
+            ({'frequencia': 'SEMANAL'}, 'dias_semana'),
+            ({'frequencia': 'SEMANAL', 'dias_semana': []}, 'dias_semana'),
+            ({'frequencia': 'SEMANAL', 'dias_semana': [7]}, 'dias_semana'),
+            ({'frequencia': 'SEMANAL', 'dias_semana': ['1']}, 'dias_semana'),
+            ({'frequencia': 'MENSAL'}, 'dia_mes'),
+            ({'frequencia': 'MENSAL', 'dia_mes': 32}, 'dia_mes'),
+            # Envio por email ainda não existe
+            ({'frequencia': 'DIARIO', 'enviar_email': True}, 'enviar_email'),
+        ]
+        for campos, campo_erro in CASOS:
+            with self.subTest(campos=campos):
+                serializer = AgendamentoSerializer(data=self._dados(**campos))
+                self.assertFalse(serializer.is_valid())
+                self.assertIn(campo_erro, serializer.errors)
+
+    def test_configuracoes_validas(self):
+        for campos in ({'frequencia': 'DIARIO'}, {'frequencia': 'SEMANAL', 'dias_semana': [0, 6]},
+                       {'frequencia': 'MENSAL', 'dia_mes': 31}):
+            with self.subTest(campos=campos):
+                serializer = AgendamentoSerializer(data=self._dados(**campos))
+                self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_atualizacao_parcial_usa_valores_gravados(self):
+        agendamento = Agendamento.objects.create(
+            empresa=self.empresa, relatorio=self.relatorio, criado_por=self.admin,
+            nome='Semanal', frequencia='SEMANAL', dias_semana=[1], hora_execucao=time(8, 0)
+        )
+        serializer = AgendamentoSerializer(agendamento, data={'dias_semana': []}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('dias_semana', serializer.errors)
+
+
+class ReservarVencidosTest(TransactionTestCase):
+    """Vários processos do agendador não podem reservar o mesmo agendamento"""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        self.admin = Usuario.objects.create_user('admin@empresa.com', self.empresa, 'senha', nome='Admin', role='ADMIN')
+        conexao = Conexao.objects.create(
+            empresa=self.empresa, nome='Conexão', tipo='POSTGRESQL', host='localhost',
+            porta=5432, database='db', usuario='u', senha_encriptada=''
+        )
+        self.relatorio = Relatorio.objects.create(
+            empresa=self.empresa, conexao=conexao, nome='Vendas', query_sql='SELECT 1', criado_por=self.admin
+        )
+        self.agora = datetime(2025, 1, 15, 12, 0, tzinfo=dt_timezone.utc)
+
+    def _agendamento(self, nome, minutos_vencido, **campos):
+        campos.setdefault('frequencia', 'DIARIO')
+        return Agendamento.objects.create(
+            empresa=self.empresa, relatorio=self.relatorio, criado_por=self.admin, nome=nome,
+            hora_execucao=time(8, 0), proxima_execucao=self.agora - timedelta(minutes=minutos_vencido),
+            **campos
+        )
+
+    def test_reserva_concorrente_nao_repete(self):
+        agendamentos = [self._agendamento(f'Agendamento {i}', i + 1) for i in range(3)]
+        reservados_pela_thread = []
+
+        def outro_processo():
+            try:
+                reservados_pela_thread.extend(a.pk for a in reservar_vencidos(10, agora=self.agora))
+            finally:
+                connection.close()
+
+        # Este "processo" reserva um e segura o bloqueio enquanto o outro roda
+        with transaction.atomic():
+            reservados = [a.pk for a in reservar_vencidos(1, agora=self.agora)]
+            thread = threading.Thread(target=outro_processo)
+            thread.start()
+            thread.join(10)
+
+        self.assertEqual(len(reservados), 1)
+        self.assertEqual(len(reservados_pela_thread), 2)
+        self.assertCountEqual(reservados + reservados_pela_thread, [a.pk for a in agendamentos])
+
+        # Já avançados: uma nova rodada no mesmo instante não encontra nada
+        self.assertEqual(reservar_vencidos(10, agora=self.agora), [])
+        for agendamento in Agendamento.objects.all():
+            self.assertEqual(agendamento.ultima_execucao, self.agora)
+            self.assertGreater(agendamento.proxima_execucao, self.agora)
+
+    def test_configuracao_que_nunca_executa_e_registrada(self):
+        agendamento = self._agendamento('Sem dias', 1, frequencia='SEMANAL', dias_semana=[])
+        with self.assertLogs('services.agendador', 'WARNING') as logs:
+            self.assertEqual(len(reservar_vencidos(10, agora=self.agora)), 1)
+        self.assertIn(str(agendamento.pk), logs.output[0])
+        agendamento.refresh_from_db()
+        self.assertIsNone(agendamento.proxima_execucao)
+
+
+@override_settings(DB_POOL_ATIVO=False)
+class ExecutarAgendamentoTest(TestCase):
+    """A execução agendada guarda o resultado completo, consultável depois"""
+
+    @classmethod
+    def setUpTestData(cls):
+        banco = connection.settings_dict
+        cls.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        cls.admin = Usuario.objects.create_user('admin@empresa.com', cls.empresa, 'senha', nome='Admin', role='ADMIN')
+        conexao = Conexao.objects.create(
+            empresa=cls.empresa, nome='Banco de testes', tipo='POSTGRESQL',
+            host=banco['HOST'] or 'localhost', porta=int(banco['PORT'] or 5432),
+            database=banco['NAME'], usuario=banco['USER'],
+            senha_encriptada=crypto.encrypt(banco['PASSWORD'] or '', empresa_id=cls.empresa.id),
+        )
+        relatorio = Relatorio.objects.create(
+            empresa=cls.empresa, conexao=conexao, nome='Série', criado_por=cls.admin,
+            query_sql='SELECT n FROM generate_series(1, 2500) AS n', limite_linhas_tela=100
+        )
+        cls.agendamento = Agendamento.objects.create(
+            empresa=cls.empresa, relatorio=relatorio, criado_por=cls.admin,
+            nome='Diário', frequencia='DIARIO', hora_execucao=time(8, 0)
+        )
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = diretorio.name
+        configuracao = override_settings(SPILL_DIR=self.diretorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_resultado_completo_ligado_ao_historico(self):
+        execucao_agendada = executar(self.agendamento)
+
+        self.assertTrue(execucao_agendada.sucesso, execucao_agendada.erro)
+        execucao = execucao_agendada.execucao
+        execucao.refresh_from_db()
+        self.assertEqual(execucao.qtd_linhas, 2500)
+        # Todas as linhas, não só o limite de tela
+        pagina = result_spill.ler_pagina(execucao.arquivo_resultado, 2499, 10)
+        self.assertEqual(pagina['linhas'], [[2500]])
+
+    def test_limpeza_mantem_resultados_agendados(self):
+        arquivo = executar(self.agendamento).execucao.arquivo_resultado
+
+        call_command('limpar_resultados', ttl=-1, stdout=StringIO())
+        self.assertEqual(os.listdir(self.diretorio), [arquivo])
+
+        call_command('limpar_resultados', ttl=-1, ttl_agendamentos=-1, stdout=StringIO())
+        self.assertEqual(os.listdir(self.diretorio), [])
@@ -7,6 +7,7 @@ from django.utils import timezone
 from .models import Agendamento, ExecucaoAgendada
 from .serializers import AgendamentoSerializer, ExecucaoAgendadaSerializer
 from core.permissions import IsTecnicoOrAdmin
+from services import agendador, execucao_assincrona
 
 class AgendamentoViewSet(viewsets.ModelViewSet):
     serializer_class = AgendamentoSerializer
@@ -15,6 +16,13 @@ class AgendamentoViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # Filtra agendamentos apenas da empresa do usuário
         return Agendamento.objects.filter(empresa=self.request.user.empresa).order_by('-criado_em')
+
+    def perform_create(self, serializer):
+        agendador.reagendar(serializer.save())
+
+    def perform_update(self, serializer):
+        # Frequência, horário ou dias podem ter mudado
+        agendador.reagendar(serializer.save())
     
     @action(detail=True, methods=['post'])
     def pausar(self, request, pk=None):
@@ -28,24 +36,27 @@ class AgendamentoViewSet(viewsets.ModelViewSet):
         agendamento = self.get_object()
         agendamento.ativo = True
         agendamento.save()
+        # Execuções perdidas enquanto pausado não são repetidas
+        agendador.reagendar(agendamento)
         return Response({'status': 'Agendamento retomado com sucesso'})
         
     @action(detail=True, methods=['post'])
     def executar_agora(self, request, pk=None):
         """
-        Gatilho para execução imediata (manual).
-        Em um cenário real com Celery, isso dispararia a task.
-        Por enquanto, vamos simular ou criar o registro de execução.
+        Gatilho para execução imediata (manual), em segundo plano.
+        Não altera proxima_execucao; o andamento fica no histórico do
+        agendamento (execucao_agendada_id).
         """
         agendamento = self.get_object()
-        
-        # TODO: Integrar com a task do Celery na Fase 3
-        # executar_relatorio_task.delay(agendamento.id)
-        
+
+        execucao_agendada = ExecucaoAgendada.objects.create(agendamento=agendamento)
+        execucao_assincrona.enviar(agendador.executar, agendamento, execucao_agendada)
+
         return Response({
-            'status': 'Execução iniciada', 
-            'message': 'O relatório será gerado e enviado por email em instantes.'
-        })
+            'status': 'Execução iniciada',
+            'message': 'O relatório será gerado em instantes.',
+            'execucao_agendada_id': str(execucao_agendada.id),
+        }, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=True, methods=['get'])
     def historico(self, request, pk=None):
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conexoes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conexao',
+            name='timeout_query_segundos',
+            field=models.IntegerField(default=300, help_text='Tempo máximo de execução das queries em segundos (0 = sem limite)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conexoes', '0002_conexao_timeout_query_segundos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conexao',
+            name='max_execucoes_simultaneas',
+            field=models.IntegerField(default=5, help_text='Queries de relatórios ao mesmo tempo nesta conexão (0 = sem limite)'),
+        ),
+    ]
@@ -34,6 +34,14 @@ class Conexao(models.Model):
     usuario = models.CharField(max_length=255, help_text="Usuário do banco")
     senha_encriptada = models.TextField(help_text="Senha criptografada (AES)")
     ativo = models.BooleanField(default=True, help_text="Conexão ativa?")
+    timeout_query_segundos = models.IntegerField(
+        default=300,
+        help_text="Tempo máximo de execução das queries em segundos (0 = sem limite)"
+    )
+    max_execucoes_simultaneas = models.IntegerField(
+        default=5,
+        help_text="Queries de relatórios ao mesmo tempo nesta conexão (0 = sem limite)"
+    )
 
     # Campos de teste de conexão
     ultimo_teste_em = models.DateTimeField(
@@ -3,7 +3,7 @@ Serializers para o app de conexões.
 """
 from rest_framework import serializers
 from .models import Conexao
-from core.crypto import encrypt
+from core.crypto import encrypt, invalidar_cache
 
 
 class ConexaoSerializer(serializers.ModelSerializer):
@@ -32,6 +32,8 @@ class ConexaoSerializer(serializers.ModelSerializer):
             'usuario',
             'senha',  # write-only
             'ativo',
+            'timeout_query_segundos',
+            'max_execucoes_simultaneas',
             'ultimo_teste_em',
             'ultimo_teste_ok',
             'criado_em',
@@ -43,8 +45,9 @@ class ConexaoSerializer(serializers.ModelSerializer):
         Cria conexão criptografando a senha e associando à empresa do usuário.
         """
         senha = validated_data.pop('senha')
-        validated_data['senha_encriptada'] = encrypt(senha)
-        validated_data['empresa_id'] = self.context['request'].user.empresa_id
+        empresa_id = self.context['request'].user.empresa_id
+        validated_data['senha_encriptada'] = encrypt(senha, empresa_id=empresa_id)
+        validated_data['empresa_id'] = empresa_id
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
@@ -53,9 +56,22 @@ class ConexaoSerializer(serializers.ModelSerializer):
         """
         senha = validated_data.pop('senha', None)
         if senha:
-            validated_data['senha_encriptada'] = encrypt(senha)
+            invalidar_cache(instance.senha_encriptada)
+            validated_data['senha_encriptada'] = encrypt(senha, empresa_id=instance.empresa_id)
         return super().update(instance, validated_data)
 
+    def validate_timeout_query_segundos(self, value):
+        """Timeout não pode ser negativo"""
+        if value < 0:
+            raise serializers.ValidationError('O timeout não pode ser negativo')
+        return value
+
+    def validate_max_execucoes_simultaneas(self, value):
+        """Limite não pode ser negativo"""
+        if value < 0:
+            raise serializers.ValidationError('O limite não pode ser negativo')
+        return value
+
 
 class TestarConexaoSerializer(serializers.Serializer):
     """
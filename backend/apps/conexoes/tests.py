@@ -1,3 +1,173 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from django.test import SimpleTestCase
+from services.connection_pool import ConnectionPool, PoolManager
+from services.database_connector import DatabaseConnector
 
-# Create your tests here.
+
+class ConexaoFalsa:
+    """Conexão de banco mínima para o pool (conta rollback/close)"""
+
+    def __init__(self, numero: int, valida: bool = True):
+        self.numero = numero
+        self.valida = valida
+        self.fechada = False
+        self.falhar_rollback = False
+
+    def cursor(self):
+        if not self.valida:
+            raise ConnectionError('conexão perdida')
+        return SimpleNamespace(execute=lambda sql: None, fetchall=lambda: [(1,)], close=lambda: None)
+
+    def rollback(self):
+        if self.falhar_rollback:
+            raise ConnectionError('conexão perdida')
+
+    def close(self):
+        self.fechada = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def _pool(self, **config):
+        self.abertas = []
+
+        def fabrica():
+            conn = ConexaoFalsa(len(self.abertas) + 1)
+            self.abertas.append(conn)
+            return conn
+        return ConnectionPool(fabrica, **config)
+
+    def test_reaproveita_conexao_devolvida(self):
+        pool = self._pool()
+        with pool.obter() as conn:
+            primeira = conn.numero
+        with pool.obter() as conn:
+            self.assertEqual(conn.numero, primeira)
+
+        estatisticas = pool.estatisticas()
+        self.assertEqual(estatisticas['criadas'], 1)
+        self.assertEqual(estatisticas['emprestimos'], 2)
+        self.assertEqual(estatisticas['ociosas'], 1)
+
+    def test_close_repetido_devolve_uma_vez(self):
+        pool = self._pool()
+        conn = pool.obter()
+        conn.close()
+        conn.close()
+        self.assertEqual(pool.estatisticas()['emprestadas'], 0)
+        self.assertEqual(pool.estatisticas()['ociosas'], 1)
+        with self.assertRaises(RuntimeError):
+            conn.cursor()
+
+    def test_esgotado_aguarda_ate_timeout(self):
+        pool = self._pool(max_tamanho=1, timeout_espera=0.05)
+        conn = pool.obter()
+        with self.assertRaises(TimeoutError):
+            pool.obter()
+        self.assertEqual(pool.estatisticas()['esperas'], 1)
+        conn.close()
+        pool.obter().close()
+
+    def test_conexao_invalidada_e_fechada(self):
+        pool = self._pool()
+        conn = pool.obter()
+        conn.invalidar()
+        conn.close()
+
+        self.assertTrue(self.abertas[0].fechada)
+        self.assertEqual(pool.estatisticas()['ociosas'], 0)
+        with pool.obter() as nova:
+            self.assertEqual(nova.numero, 2)
+
+    def test_falha_no_rollback_descarta(self):
+        pool = self._pool()
+        conn = pool.obter()
+        self.abertas[0].falhar_rollback = True
+        conn.close()
+        self.assertTrue(self.abertas[0].fechada)
+        self.assertEqual(pool.estatisticas()['descartadas'], 1)
+
+    def test_conexao_morta_e_trocada_ao_emprestar(self):
+        pool = self._pool()
+        pool.obter().close()
+        self.abertas[0].valida = False
+
+        with pool.obter() as conn:
+            self.assertEqual(conn.numero, 2)
+        self.assertTrue(self.abertas[0].fechada)
+        self.assertEqual(pool.estatisticas()['falhas_validacao'], 1)
+
+    def test_ociosas_expiradas_respeitam_minimo(self):
+        pool = self._pool(min_tamanho=1, tempo_ocioso_max=0)
+        a, b = pool.obter(), pool.obter()
+        a.close()
+        b.close()
+
+        pool.obter().close()
+        self.assertEqual([conn.fechada for conn in self.abertas], [True, False])
+
+    def test_timeout_chega_na_conexao_real(self):
+        pool = self._pool()
+        connector = DatabaseConnector.__new__(DatabaseConnector)
+        connector.conexao = SimpleNamespace(tipo='SQLSERVER')
+
+        conn = pool.obter()
+        connector.aplicar_timeout(conn, 15)
+        self.assertEqual(self.abertas[0].timeout, 15)
+        self.assertEqual(conn.timeout, 15)
+        self.assertNotIn('timeout', vars(conn))
+
+        connector.restaurar_timeout(conn)
+        self.assertEqual(self.abertas[0].timeout, 0)
+        conn.close()
+        with self.assertRaises(RuntimeError):
+            conn.timeout = 5
+
+    def test_fechar_pool(self):
+        pool = self._pool()
+        emprestada = pool.obter()
+        pool.obter().close()
+        pool.fechar()
+
+        self.assertTrue(self.abertas[1].fechada)
+        emprestada.close()
+        self.assertTrue(self.abertas[0].fechada)
+        with self.assertRaises(RuntimeError):
+            pool.obter()
+
+
+class PoolManagerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.manager = PoolManager()
+        self.editada_em = datetime(2026, 1, 1, 12, 0)
+
+    def _conexao(self, atualizado_em):
+        return SimpleNamespace(id='conexao-1', atualizado_em=atualizado_em)
+
+    def _obter(self, atualizado_em):
+        return self.manager.obter_pool(self._conexao(atualizado_em), lambda: ConexaoFalsa(1))
+
+    def test_mesma_versao_reaproveita_pool(self):
+        self.assertIs(self._obter(self.editada_em), self._obter(self.editada_em))
+
+    def test_versao_mais_recente_substitui_pool(self):
+        antigo = self._obter(self.editada_em)
+        novo = self._obter(self.editada_em + timedelta(seconds=1))
+
+        self.assertIsNot(novo, antigo)
+        with self.assertRaises(RuntimeError):
+            antigo.obter()
+
+    def test_versao_mais_antiga_usa_pool_atual(self):
+        atual = self._obter(self.editada_em)
+        for _ in range(3):
+            self.assertIs(self._obter(self.editada_em - timedelta(minutes=5)), atual)
+            self.assertIs(self._obter(self.editada_em), atual)
+
+    def test_invalidar(self):
+        pool = self._obter(self.editada_em)
+        self.manager.invalidar('conexao-1')
+        self.assertIsNone(self.manager.estatisticas('conexao-1'))
+        self.assertIsNot(self._obter(self.editada_em), pool)
@@ -12,6 +12,7 @@ from .serializers import ConexaoSerializer, TestarConexaoSerializer
 from core.mixins import EmpresaQuerySetMixin
 from core.permissions import IsTecnicoOrAdmin
 from services.database_connector import DatabaseConnector, test_connection_params
+from services.connection_pool import pool_manager
 
 
 class ConexaoViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
@@ -26,6 +27,7 @@ class ConexaoViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
     - DELETE /api/conexoes/{id}/ - Remove conexão
     - POST /api/conexoes/testar/ - Testa conexão antes de salvar
     - POST /api/conexoes/{id}/testar_existente/ - Testa conexão já salva
+    - GET /api/conexoes/{id}/pool/ - Estatísticas do pool de conexões
 
     Permissões:
     - Apenas ADMIN e TECNICO podem gerenciar conexões
@@ -102,15 +104,49 @@ class ConexaoViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
             'mensagem': mensagem
         }, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['get'], url_path='pool')
+    def pool(self, request, pk=None):
+        """
+        Estatísticas do pool de conexões desta conexão (no processo atual).
+
+        GET /api/conexoes/{id}/pool/
+
+        Response:
+        {
+            "emprestadas": 1,
+            "ociosas": 2,
+            "max_tamanho": 5,
+            "min_tamanho": 0,
+            "criadas": 3,
+            "emprestimos": 120,
+            "esperas": 0,
+            "descartadas": 0,
+            "falhas_validacao": 0
+        }
+        """
+        conexao = self.get_object()
+        estatisticas = pool_manager.estatisticas(conexao.id)
+
+        if estatisticas is None:
+            return Response({'mensagem': 'Pool ainda não criado neste processo'})
+
+        return Response(estatisticas)
+
     def perform_create(self, serializer):
         """Hook para ações ao criar conexão"""
         conexao = serializer.save()
         # Log ou auditoria pode ser adicionado aqui
 
+    def perform_update(self, serializer):
+        """Descarta o pool antigo para não reutilizar credenciais desatualizadas"""
+        conexao = serializer.save()
+        pool_manager.invalidar(conexao.id)
+
     def perform_destroy(self, instance):
         """
         Hook para validações ao deletar conexão.
         Futuramente: verificar se há relatórios usando esta conexão.
         """
         # TODO: Verificar se há relatórios ativos usando esta conexão
+        pool_manager.invalidar(instance.id)
         instance.delete()
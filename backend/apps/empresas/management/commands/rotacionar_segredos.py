@@ -0,0 +1,54 @@
+"""
+Recriptografa as senhas guardadas (conexões e SMTP) com a chave atual.
+Textos gerados com o salt padrão ou com uma chave de
+ENCRYPTION_KEYS_ANTIGAS passam para ENCRYPTION_KEY com o salt da empresa;
+depois de rodar, as chaves antigas podem sair da configuração.
+
+Uso:
+    python manage.py rotacionar_segredos --simular
+    python manage.py rotacionar_segredos
+"""
+from cryptography.fernet import InvalidToken
+from django.core.management.base import BaseCommand
+from core.crypto import rotacionar
+from apps.conexoes.models import Conexao
+from apps.empresas.models import ConfiguracaoEmpresa
+
+
+class Command(BaseCommand):
+    help = 'Recriptografa senhas de conexões e SMTP com a chave atual (ENCRYPTION_KEY)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Só verifica se todas as senhas podem ser lidas'
+        )
+
+    def handle(self, *args, **options):
+        alvos = [
+            (Conexao.objects.exclude(senha_encriptada=''), 'senha_encriptada'),
+            (ConfiguracaoEmpresa.objects.exclude(smtp_senha=''), 'smtp_senha'),
+        ]
+        rotacionados = falhas = 0
+
+        for queryset, campo in alvos:
+            for objeto in queryset.only('pk', 'empresa_id', campo).iterator():
+                try:
+                    token = rotacionar(getattr(objeto, campo), objeto.empresa_id)
+                except InvalidToken:
+                    falhas += 1
+                    self.stderr.write(
+                        f'{queryset.model.__name__} {objeto.pk}: {campo} não pode ser lido '
+                        f'com ENCRYPTION_KEY nem com ENCRYPTION_KEYS_ANTIGAS'
+                    )
+                    continue
+
+                if not options['simular']:
+                    # Sem save(): o texto não muda, então atualizado_em (e o pool) também não
+                    queryset.model.objects.filter(pk=objeto.pk).update(**{campo: token})
+                rotacionados += 1
+
+        acao = 'podem ser rotacionado(s)' if options['simular'] else 'rotacionado(s)'
+        estilo = self.style.SUCCESS if not falhas else self.style.WARNING
+        self.stdout.write(estilo(f'{rotacionados} segredo(s) {acao}, {falhas} ilegível(is)'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('empresas', '0003_add_configuracao_empresa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='max_execucoes_simultaneas',
+            field=models.IntegerField(default=10, help_text='Execuções de relatórios ao mesmo tempo (0 = sem limite)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('empresas', '0004_empresa_max_execucoes_simultaneas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='retencao_historico_meses',
+            field=models.IntegerField(blank=True, help_text='Meses de histórico de execuções mantidos (vazio = padrão do sistema, 0 = sem limite)', null=True),
+        ),
+    ]
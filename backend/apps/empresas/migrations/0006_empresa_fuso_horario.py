@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:30
+
+import apps.empresas.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('empresas', '0005_empresa_retencao_historico_meses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='fuso_horario',
+            field=models.CharField(blank=True, help_text='Fuso horário dos agendamentos, ex.: America/Manaus (vazio = TIME_ZONE do sistema)', max_length=64, validators=[apps.empresas.models.validar_fuso_horario]),
+        ),
+    ]
@@ -1,7 +1,15 @@
 import uuid
+import zoneinfo
+from django.core.exceptions import ValidationError
 from django.db import models
 
 
+def validar_fuso_horario(valor: str):
+    """Aceita nomes da base IANA (ex.: America/Sao_Paulo)"""
+    if valor and valor not in zoneinfo.available_timezones():
+        raise ValidationError(f'Fuso horário desconhecido: {valor}')
+
+
 class Empresa(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     nome = models.CharField(max_length=255)
@@ -11,6 +19,18 @@ class Empresa(models.Model):
     max_usuarios = models.IntegerField(default=10)
     max_conexoes = models.IntegerField(default=5)
     max_relatorios = models.IntegerField(default=50)
+    max_execucoes_simultaneas = models.IntegerField(
+        default=10,
+        help_text="Execuções de relatórios ao mesmo tempo (0 = sem limite)"
+    )
+    retencao_historico_meses = models.IntegerField(
+        null=True, blank=True,
+        help_text="Meses de histórico de execuções mantidos (vazio = padrão do sistema, 0 = sem limite)"
+    )
+    fuso_horario = models.CharField(
+        max_length=64, blank=True, validators=[validar_fuso_horario],
+        help_text="Fuso horário dos agendamentos, ex.: America/Manaus (vazio = TIME_ZONE do sistema)"
+    )
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
@@ -65,9 +85,11 @@ class ConfiguracaoEmpresa(models.Model):
     
     def set_smtp_senha(self, senha: str):
         """Criptografa e salva a senha SMTP"""
-        from core.crypto import encrypt
+        from core.crypto import encrypt, invalidar_cache
+        if self.smtp_senha:
+            invalidar_cache(self.smtp_senha)
         if senha:
-            self.smtp_senha = encrypt(senha)
+            self.smtp_senha = encrypt(senha, empresa_id=self.empresa_id)
         else:
             self.smtp_senha = ''
     
@@ -75,7 +97,7 @@ class ConfiguracaoEmpresa(models.Model):
         """Descriptografa e retorna a senha SMTP"""
         from core.crypto import decrypt
         if self.smtp_senha:
-            return decrypt(self.smtp_senha)
+            return decrypt(self.smtp_senha, empresa_id=self.empresa_id)
         return ''
     
     @property
@@ -1,3 +1,112 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
+from cryptography.fernet import InvalidToken
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from core import crypto
+from apps.conexoes.models import Conexao
+from .models import ConfiguracaoEmpresa, Empresa
 
-# Create your tests here.
+
+@override_settings(ENCRYPTION_KEY='chave-atual', ENCRYPTION_KEYS_ANTIGAS=[], CRYPTO_CACHE_TTL_SEGUNDOS=300)
+class CryptoTest(SimpleTestCase):
+
+    def setUp(self):
+        crypto.invalidar_cache()
+
+    def test_chave_derivada_uma_vez(self):
+        crypto._derivar_fernet.cache_clear()
+        for _ in range(5):
+            crypto.encrypt('senha', empresa_id='empresa-1')
+        self.assertEqual(crypto._derivar_fernet.cache_info().misses, 1)
+
+    def test_decrypt_usa_cache_ate_invalidar(self):
+        token = crypto.encrypt('senha', empresa_id='empresa-1')
+        self.assertEqual(crypto.decrypt(token, empresa_id='empresa-1'), 'senha')
+
+        with mock.patch.object(crypto, 'get_multi_fernet', side_effect=AssertionError) as multi:
+            self.assertEqual(crypto.decrypt(token, empresa_id='empresa-1'), 'senha')
+            self.assertFalse(multi.called)
+
+            crypto.invalidar_cache(token)
+            with self.assertRaises(AssertionError):
+                crypto.decrypt(token, empresa_id='empresa-1')
+
+    def test_cache_expira(self):
+        token = crypto.encrypt('senha')
+        with mock.patch.object(crypto.time, 'monotonic', return_value=0):
+            crypto.decrypt(token)
+        with mock.patch.object(crypto.time, 'monotonic', return_value=301), \
+                mock.patch.object(crypto, 'get_multi_fernet', wraps=crypto.get_multi_fernet) as multi:
+            crypto.decrypt(token)
+            self.assertTrue(multi.called)
+
+    @override_settings(CRYPTO_CACHE_TTL_SEGUNDOS=0)
+    def test_cache_desativado(self):
+        crypto.decrypt(crypto.encrypt('senha'))
+        self.assertEqual(crypto._cache_decrypt, {})
+
+    def test_empresa_le_texto_do_salt_padrao_e_rotaciona(self):
+        legado = crypto.encrypt('senha')
+        self.assertEqual(crypto.decrypt(legado, empresa_id='empresa-1'), 'senha')
+
+        token = crypto.rotacionar(legado, 'empresa-1')
+        self.assertEqual(crypto.get_fernet('empresa-1').decrypt(token.encode()), b'senha')
+        with self.assertRaises(InvalidToken):
+            crypto.decrypt(token, empresa_id='empresa-2')
+
+    def test_chave_antiga(self):
+        with override_settings(ENCRYPTION_KEY='chave-antiga'):
+            antigo = crypto.encrypt('senha', empresa_id='empresa-1')
+
+        with self.assertRaises(InvalidToken):
+            crypto.decrypt(antigo, empresa_id='empresa-1')
+        with override_settings(ENCRYPTION_KEYS_ANTIGAS=['chave-antiga']):
+            self.assertEqual(crypto.decrypt(antigo, empresa_id='empresa-1'), 'senha')
+            token = crypto.rotacionar(antigo, 'empresa-1')
+        self.assertEqual(crypto.decrypt(token, empresa_id='empresa-1'), 'senha')
+
+
+@override_settings(ENCRYPTION_KEY='chave-atual', ENCRYPTION_KEYS_ANTIGAS=['chave-antiga'])
+class RotacionarSegredosTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        with override_settings(ENCRYPTION_KEY='chave-antiga'):
+            cls.conexao = Conexao.objects.create(
+                empresa=cls.empresa, nome='Conexão', tipo='POSTGRESQL', host='localhost',
+                porta=5432, database='db', usuario='u', senha_encriptada=crypto.encrypt('banco')
+            )
+            cls.configuracao = ConfiguracaoEmpresa.objects.create(
+                empresa=cls.empresa, smtp_senha=crypto.encrypt('smtp', empresa_id=cls.empresa.id)
+            )
+
+    def setUp(self):
+        crypto.invalidar_cache()
+
+    def _rodar(self, *args):
+        saida = StringIO()
+        call_command('rotacionar_segredos', *args, stdout=saida, stderr=StringIO())
+        return saida.getvalue()
+
+    def test_simular_nao_altera(self):
+        antes = self.conexao.senha_encriptada
+        self.assertIn('2 segredo(s) podem ser rotacionado(s)', self._rodar('--simular'))
+        self.conexao.refresh_from_db()
+        self.assertEqual(self.conexao.senha_encriptada, antes)
+
+    def test_rotaciona_para_chave_atual(self):
+        self.assertIn('2 segredo(s) rotacionado(s), 0 ilegível(is)', self._rodar())
+
+        self.conexao.refresh_from_db()
+        self.configuracao.refresh_from_db()
+        with override_settings(ENCRYPTION_KEYS_ANTIGAS=[]):
+            fernet = crypto.get_fernet(self.empresa.id)
+            self.assertEqual(fernet.decrypt(self.conexao.senha_encriptada.encode()), b'banco')
+            self.assertEqual(self.configuracao.get_smtp_senha(), 'smtp')
+
+    def test_ilegivel_e_informado(self):
+        with override_settings(ENCRYPTION_KEY='outra-chave'):
+            Conexao.objects.filter(pk=self.conexao.pk).update(senha_encriptada=crypto.encrypt('x'))
+        self.assertIn('1 segredo(s) rotacionado(s), 1 ilegível(is)', self._rodar())
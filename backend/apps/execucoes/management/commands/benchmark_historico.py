@@ -0,0 +1,170 @@
+"""
+Benchmark da listagem do histórico de execuções (PostgreSQL).
+Cria uma empresa temporária com N execuções (INSERT ... SELECT
+generate_series), compara a listagem antiga (as 100 mais recentes, sem
+paginação) com a paginação por cursor e desfaz tudo ao final (transação
+com rollback).
+
+Uso:
+    python manage.py benchmark_historico --execucoes 5000000 --repeticoes 20
+"""
+import statistics
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.empresas.models import Empresa
+from apps.usuarios.models import Usuario
+from apps.conexoes.models import Conexao
+from apps.relatorios.models import Relatorio
+from apps.execucoes.models import Execucao
+from apps.execucoes.serializers import ExecucaoSerializer
+from apps.execucoes.views import HistoricoViewSet
+
+QTD_RELATORIOS = 50
+QTD_USUARIOS = 20
+
+
+class Command(BaseCommand):
+    help = 'Compara a listagem antiga do histórico com a paginação por cursor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--execucoes', type=int, default=5_000_000, help='Execuções a criar')
+        parser.add_argument('--dias', type=int, default=365, help='Período coberto pelas execuções')
+        parser.add_argument('--repeticoes', type=int, default=20, help='Execuções por cenário')
+        parser.add_argument('--limite', type=int, default=100, help='Itens por página')
+        parser.add_argument('--paginas', type=int, default=200, help='Profundidade da página "funda"')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O benchmark exige PostgreSQL')
+
+        with transaction.atomic():
+            empresa, admin, relatorio = self._popular(options['execucoes'], options['dias'])
+            limite = options['limite']
+            repeticoes = options['repeticoes']
+
+            antiga = (
+                Execucao.objects.filter(empresa=empresa)
+                .select_related('relatorio', 'usuario')[:limite]
+            )
+            self._medir('antiga (sem paginação)', repeticoes,
+                        lambda: ExecucaoSerializer(antiga, many=True).data)
+
+            self._medir('cursor: primeira página', repeticoes,
+                        lambda: self._listar(admin, {'limite': limite}))
+
+            cursor = self._avancar(admin, limite, options['paginas'])
+            if cursor:
+                self._medir(f'cursor: página {options["paginas"] + 1}', repeticoes,
+                            lambda: self._listar(admin, {'limite': limite, 'cursor': cursor}))
+
+            self._medir('cursor: por relatório', repeticoes,
+                        lambda: self._listar(admin, {'limite': limite, 'relatorio_id': relatorio.id}))
+
+            self._medir('cursor: por relatório + período', repeticoes,
+                        lambda: self._listar(admin, {
+                            'limite': limite, 'relatorio_id': relatorio.id,
+                            'iniciado_de': '2000-01-01', 'iniciado_ate': time.strftime('%Y-%m-%d'),
+                        }))
+
+            # Nada do benchmark permanece no banco
+            transaction.set_rollback(True)
+
+    def _popular(self, quantidade: int, dias: int):
+        inicio = time.perf_counter()
+        sufixo = uuid.uuid4().hex[:8]
+        empresa = Empresa.objects.create(
+            nome=f'Benchmark {sufixo}', slug=f'benchmark-{sufixo}', max_relatorios=QTD_RELATORIOS
+        )
+        usuarios = [
+            Usuario.objects.create_user(
+                f'benchmark-{sufixo}-{i}@exemplo.com', empresa, None,
+                nome=f'Benchmark {i}', role='ADMIN' if i == 0 else 'USUARIO'
+            )
+            for i in range(QTD_USUARIOS)
+        ]
+        conexao = Conexao.objects.create(
+            empresa=empresa, nome='Benchmark', tipo='POSTGRESQL', host='localhost',
+            porta=5432, database='benchmark', usuario='benchmark', senha_encriptada=''
+        )
+        relatorios = Relatorio.objects.bulk_create([
+            Relatorio(
+                empresa=empresa, conexao=conexao, criado_por=usuarios[0],
+                nome=f'Relatório {i}', query_sql='SELECT 1'
+            )
+            for i in range(QTD_RELATORIOS)
+        ])
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO execucoes (
+                    id, empresa_id, relatorio_id, usuario_id, iniciado_em, finalizado_em,
+                    tempo_execucao_ms, sucesso, status, progresso, qtd_linhas,
+                    exportou, cache_hit, sessao_banco, arquivo_resultado, coalescida
+                )
+                SELECT
+                    gen_random_uuid(), %s,
+                    (%s::uuid[])[1 + n %% %s],
+                    (%s::uuid[])[1 + n %% %s],
+                    now() - make_interval(secs => n * (%s * 86400.0 / %s)),
+                    now() - make_interval(secs => n * (%s * 86400.0 / %s)) + interval '1 second',
+                    1000, n %% 20 <> 0,
+                    CASE WHEN n %% 20 <> 0 THEN 'CONCLUIDO' ELSE 'ERRO' END,
+                    100, 100, false, false, '', '', false
+                FROM generate_series(1, %s) AS n
+                """,
+                [
+                    empresa.id,
+                    [str(r.id) for r in relatorios], QTD_RELATORIOS,
+                    [str(u.id) for u in usuarios], QTD_USUARIOS,
+                    dias, quantidade, dias, quantidade,
+                    quantidade,
+                ]
+            )
+            cursor.execute('ANALYZE execucoes')
+
+        self.stdout.write(
+            f'{quantidade} execuções criadas em {time.perf_counter() - inicio:.1f}s'
+        )
+        return empresa, usuarios[0], relatorios[0]
+
+    def _listar(self, usuario, params: dict):
+        request = APIRequestFactory().get('/api/historico/', params)
+        force_authenticate(request, user=usuario)
+        resposta = HistoricoViewSet.as_view({'get': 'list'})(request)
+        if resposta.status_code != 200:
+            raise CommandError(f'Listagem falhou ({resposta.status_code}): {resposta.data}')
+        return resposta.data
+
+    def _avancar(self, usuario, limite: int, paginas: int):
+        """Percorre as primeiras páginas e devolve o cursor da seguinte"""
+        cursor = None
+        for _ in range(paginas):
+            params = {'limite': limite}
+            if cursor:
+                params['cursor'] = cursor
+            cursor = self._listar(usuario, params)['proximo_cursor']
+            if not cursor:
+                break
+        return cursor
+
+    def _medir(self, nome: str, repeticoes: int, funcao):
+        tempos = []
+        queries = 0
+        for _ in range(repeticoes):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                funcao()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            queries = len(capturadas)
+
+        tempos.sort()
+        p95 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+        self.stdout.write(
+            f'{nome:<40} {queries:>3} queries  '
+            f'mediana {statistics.median(tempos):8.1f} ms  p95 {p95:8.1f} ms'
+        )
@@ -0,0 +1,69 @@
+"""
+Mantém as partições mensais do histórico de execuções.
+Cria as partições dos próximos meses e aplica a retenção por empresa
+(consolida em execucoes_resumo_hora, desanexa/arquiva partições antigas e
+apaga linhas de empresas com retenção menor).
+Executar periodicamente (ex.: cron diário).
+
+Uso:
+    python manage.py gerenciar_particoes --simular
+    python manage.py gerenciar_particoes --apagar
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from services import particoes
+
+
+class Command(BaseCommand):
+    help = 'Cria partições futuras de execucoes/execucoes_agendadas e aplica a retenção'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses-futuros',
+            type=int,
+            default=settings.HISTORICO_PARTICOES_FUTURAS,
+            help='Meses à frente com partição criada'
+        )
+        parser.add_argument(
+            '--apagar',
+            action='store_true',
+            help=f'Apaga as partições expiradas em vez de movê-las para o schema '
+                 f'"{settings.HISTORICO_SCHEMA_ARQUIVO}"'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Só mostra o que seria removido'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=particoes.LOTE_EXCLUSAO,
+            help='Linhas apagadas por comando na retenção por empresa'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O particionamento exige PostgreSQL')
+
+        plano = particoes.planejar_retencao()
+        for tabela, nome, mes in plano['particoes']:
+            self.stdout.write(f'Partição expirada: {nome} ({mes:%m/%Y})')
+        for empresa_id, corte in plano['empresas']:
+            self.stdout.write(f'Empresa {empresa_id}: execuções antes de {corte:%d/%m/%Y}')
+
+        if options['simular']:
+            return
+
+        criadas = particoes.garantir_particoes(options['meses_futuros'])
+        for nome in criadas:
+            self.stdout.write(f'Partição criada: {nome}')
+
+        resultado = particoes.aplicar_retencao(plano, apagar=options['apagar'], lote=options['lote'])
+        linhas = sum(resultado['linhas'].values())
+        acao = 'apagada(s)' if options['apagar'] else 'arquivada(s)'
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(criadas)} partição(ões) criada(s), '
+            f'{len(resultado["particoes"])} {acao}, {linhas} execução(ões) apagada(s)'
+        ))
@@ -0,0 +1,63 @@
+"""
+Remove resultados de execuções paginadas gravados em disco após o TTL e
+encerra as execuções abandonadas (processo reiniciado no meio da execução).
+Resultados de execuções agendadas são mantidos por
+AGENDAMENTO_RESULTADO_TTL_SEGUNDOS.
+Executar periodicamente (ex.: cron a cada 15 minutos).
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.agendamentos.models import ExecucaoAgendada
+from apps.execucoes.models import Execucao
+from services import execucao_assincrona, result_spill
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove arquivos de resultado (SPILL_DIR) mais antigos que SPILL_TTL_SEGUNDOS '
+        'e marca como ERRO execuções pendentes há mais de EXECUCAO_ABANDONADA_SEGUNDOS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ttl',
+            type=int,
+            default=settings.SPILL_TTL_SEGUNDOS,
+            help='Idade máxima dos arquivos em segundos'
+        )
+        parser.add_argument(
+            '--ttl-agendamentos',
+            type=int,
+            default=settings.AGENDAMENTO_RESULTADO_TTL_SEGUNDOS,
+            help='Idade máxima em segundos dos resultados de execuções agendadas'
+        )
+        parser.add_argument(
+            '--abandonadas',
+            type=int,
+            default=settings.EXECUCAO_ABANDONADA_SEGUNDOS,
+            help='Idade em segundos a partir da qual uma execução PENDENTE/EXECUTANDO é encerrada'
+        )
+
+    def handle(self, *args, **options):
+        removidos = result_spill.limpar_expirados(
+            options['ttl'], preservar=self._resultados_agendados(options['ttl_agendamentos'])
+        )
+        self.stdout.write(self.style.SUCCESS(f'{removidos} arquivo(s) de resultado removido(s)'))
+
+        encerradas = execucao_assincrona.encerrar_abandonadas(options['abandonadas'])
+        self.stdout.write(self.style.SUCCESS(f'{encerradas} execução(ões) abandonada(s) encerrada(s)'))
+
+    @staticmethod
+    def _resultados_agendados(ttl_segundos: int) -> set:
+        """Arquivos de execuções agendadas ainda dentro da retenção"""
+        recentes = ExecucaoAgendada.objects.filter(
+            iniciado_em__gte=timezone.now() - timedelta(seconds=ttl_segundos),
+            execucao__isnull=False,
+        ).values('execucao_id')
+        return set(
+            Execucao.objects.filter(pk__in=recentes)
+            .exclude(arquivo_resultado='')
+            .values_list('arquivo_resultado', flat=True)
+        )
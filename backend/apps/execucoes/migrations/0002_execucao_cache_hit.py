@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execucoes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='execucao',
+            name='cache_hit',
+            field=models.BooleanField(default=False),
+        ),
+    ]
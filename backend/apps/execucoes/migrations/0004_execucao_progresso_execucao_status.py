@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:54
+
+from django.db import migrations, models
+
+
+def preencher_status(apps, schema_editor):
+    """Execuções anteriores já terminaram: status conforme sucesso"""
+    Execucao = apps.get_model('execucoes', 'Execucao')
+    Execucao.objects.filter(sucesso=True).update(status='CONCLUIDO', progresso=100)
+    Execucao.objects.filter(sucesso=False).update(status='ERRO')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execucoes', '0003_execucao_coalescida'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='execucao',
+            name='progresso',
+            field=models.IntegerField(default=0, help_text='Percentual concluído (0-100)'),
+        ),
+        migrations.AddField(
+            model_name='execucao',
+            name='status',
+            field=models.CharField(choices=[('PENDENTE', 'Pendente'), ('EXECUTANDO', 'Executando'), ('CONCLUIDO', 'Concluído'), ('ERRO', 'Erro')], default='PENDENTE', max_length=20),
+        ),
+        migrations.RunPython(preencher_status, migrations.RunPython.noop),
+    ]
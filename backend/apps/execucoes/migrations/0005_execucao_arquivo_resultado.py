@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execucoes', '0004_execucao_progresso_execucao_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='execucao',
+            name='arquivo_resultado',
+            field=models.CharField(blank=True, default='', help_text='Resultado completo gravado em disco (execução paginada)', max_length=100),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execucoes', '0005_execucao_arquivo_resultado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='execucao',
+            name='sessao_banco',
+            field=models.CharField(blank=True, default='', help_text='Identificador da sessão no banco do cliente (usado para cancelar)', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='execucao',
+            name='status',
+            field=models.CharField(choices=[('PENDENTE', 'Pendente'), ('EXECUTANDO', 'Executando'), ('CONCLUIDO', 'Concluído'), ('ERRO', 'Erro'), ('CANCELADO', 'Cancelado'), ('TIMEOUT', 'Tempo esgotado')], default='PENDENTE', max_length=20),
+        ),
+    ]
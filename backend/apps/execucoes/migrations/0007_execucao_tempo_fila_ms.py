@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execucoes', '0006_execucao_sessao_banco_alter_execucao_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='execucao',
+            name='tempo_fila_ms',
+            field=models.IntegerField(help_text='Espera por vaga de execução (controle de admissão)', null=True),
+        ),
+    ]
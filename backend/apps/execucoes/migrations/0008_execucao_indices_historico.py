@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('empresas', '0004_empresa_max_execucoes_simultaneas'),
+        ('execucoes', '0007_execucao_tempo_fila_ms'),
+        ('relatorios', '0008_relatorio_busca'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='execucao',
+            index=models.Index(fields=['empresa', 'iniciado_em'], name='execucoes_empresa_inicio'),
+        ),
+        migrations.AddIndex(
+            model_name='execucao',
+            index=models.Index(fields=['empresa', 'relatorio', 'iniciado_em'], name='execucoes_relatorio_inicio'),
+        ),
+        migrations.AddIndex(
+            model_name='execucao',
+            index=models.Index(fields=['empresa', 'usuario', 'iniciado_em'], name='execucoes_usuario_inicio'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('empresas', '0005_empresa_retencao_historico_meses'),
+        ('execucoes', '0008_execucao_indices_historico'),
+        ('relatorios', '0008_relatorio_busca'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoExecucaoHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField()),
+                ('total', models.IntegerField(default=0)),
+                ('erros', models.IntegerField(default=0)),
+                ('cache_hits', models.IntegerField(default=0)),
+                ('exportacoes', models.IntegerField(default=0)),
+                ('linhas', models.BigIntegerField(default=0)),
+                ('tempo_total_ms', models.BigIntegerField(default=0)),
+                ('tempo_max_ms', models.IntegerField(null=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='empresas.empresa')),
+                ('relatorio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='relatorios.relatorio')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'execucoes_resumo_hora',
+                'indexes': [models.Index(fields=['empresa', 'hora'], name='execucoes_resumo_empresa_hora')],
+                'constraints': [models.UniqueConstraint(fields=('empresa', 'relatorio', 'usuario', 'hora'), name='execucoes_resumo_hora_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+import re
+from datetime import datetime
+from django.db import migrations
+from django.utils import timezone
+
+# DDL congelada desta migration (services.particoes mantém só as partições
+# mensais e a retenção; garantir_particoes cria os meses seguintes)
+TABELA = 'execucoes'
+COLUNA = 'iniciado_em'
+MESES_FUTUROS = 3
+
+
+def _mes(indice: int) -> datetime:
+    return timezone.make_aware(datetime(indice // 12, indice % 12 + 1, 1))
+
+
+def particionar_execucoes(apps, schema_editor):
+    """Converte execucoes em tabela particionada por mês (iniciado_em)"""
+    conexao = schema_editor.connection
+    if conexao.vendor != 'postgresql':
+        return
+    q = conexao.ops.quote_name
+    antiga = f'{TABELA}_antiga'
+
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABELA])
+        if cursor.fetchone() == ('p',):
+            return
+
+        cursor.execute(f'ALTER TABLE {q(TABELA)} RENAME TO {q(antiga)}')
+        cursor.execute(
+            "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+            "WHERE indrelid = %s::regclass AND NOT indisprimary",
+            [antiga]
+        )
+        indices = [linha[0] for linha in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [antiga]
+        )
+        chaves_estrangeiras = cursor.fetchall()
+
+        cursor.execute(
+            f'CREATE TABLE {q(TABELA)} (LIKE {q(antiga)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ({q(COLUNA)})'
+        )
+
+        # Uma partição por mês, do mais antigo até MESES_FUTUROS à frente
+        cursor.execute(f'SELECT min({q(COLUNA)}) FROM {q(antiga)}')
+        primeiro = cursor.fetchone()[0]
+        agora = timezone.localtime(timezone.now())
+        ultimo = agora.year * 12 + agora.month - 1 + MESES_FUTUROS
+        desde = timezone.localtime(primeiro) if primeiro else agora
+        for indice in range(desde.year * 12 + desde.month - 1, ultimo + 1):
+            inicio, fim = _mes(indice), _mes(indice + 1)
+            cursor.execute(
+                f"CREATE TABLE {q(f'{TABELA}_p{inicio:%Y_%m}')} PARTITION OF {q(TABELA)} "
+                f"FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fim.isoformat()}')"
+            )
+        cursor.execute(f'CREATE TABLE {q(TABELA + "_padrao")} PARTITION OF {q(TABELA)} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {q(TABELA)} SELECT * FROM {q(antiga)}')
+        cursor.execute(f'DROP TABLE {q(antiga)}')
+
+        # Índices e FKs com os mesmos nomes, para migrations futuras
+        cursor.execute(
+            f'ALTER TABLE {q(TABELA)} ADD CONSTRAINT {q(TABELA + "_pkey")} '
+            f'PRIMARY KEY (id, {q(COLUNA)})'
+        )
+        origem = re.compile(r' ON (?:\S+\.)?"?%s"? ' % re.escape(antiga))
+        for definicao in indices:
+            cursor.execute(origem.sub(f' ON {q(TABELA)} ', definicao, count=1))
+        for nome, definicao in chaves_estrangeiras:
+            cursor.execute(f'ALTER TABLE {q(TABELA)} ADD CONSTRAINT {q(nome)} {definicao}')
+
+        cursor.execute(f'ANALYZE {q(TABELA)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execucoes', '0009_resumo_execucao_hora'),
+        # A FK de execucoes_agendadas precisa sair antes da troca da tabela
+        ('agendamentos', '0002_execucao_sem_constraint'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar_execucoes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execucoes', '0010_particionar_execucoes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='execucao',
+            name='iniciado_em',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:26
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+# Faixas do histograma no momento desta migration (services.estatisticas.LIMITES_MS)
+LIMITES_MS = sorted({round(5 * 1.25 ** i) for i in range(61)})
+
+# Resumo por hora de todas as execuções finalizadas; o histograma tem uma
+# posição por faixa (-1 = sem tempo_execucao_ms, fora do histograma)
+SQL_PREENCHER = """
+    WITH faixas AS (
+        SELECT
+            empresa_id, relatorio_id, usuario_id, date_trunc('hour', iniciado_em) AS hora,
+            coalesce(width_bucket(tempo_execucao_ms, %s::integer[]), -1) AS faixa,
+            count(*) AS total,
+            count(*) FILTER (WHERE NOT sucesso) AS erros,
+            count(*) FILTER (WHERE cache_hit) AS cache_hits,
+            count(*) FILTER (WHERE exportou) AS exportacoes,
+            sum(qtd_linhas) AS linhas,
+            sum(tempo_execucao_ms) AS tempo_total_ms,
+            max(tempo_execucao_ms) AS tempo_max_ms
+        FROM execucoes
+        WHERE finalizado_em IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5
+    )
+    INSERT INTO execucoes_resumo_hora (
+        empresa_id, relatorio_id, usuario_id, hora, total, erros, cache_hits,
+        exportacoes, linhas, tempo_total_ms, tempo_max_ms, histograma
+    )
+    SELECT
+        h.empresa_id, h.relatorio_id, h.usuario_id, h.hora,
+        sum(f.total), sum(f.erros), sum(f.cache_hits), sum(f.exportacoes),
+        coalesce(sum(f.linhas), 0), coalesce(sum(f.tempo_total_ms), 0), max(f.tempo_max_ms),
+        array_agg(coalesce(f.total, 0) ORDER BY i.faixa) FILTER (WHERE i.faixa >= 0)
+    FROM (SELECT DISTINCT empresa_id, relatorio_id, usuario_id, hora FROM faixas) h
+    CROSS JOIN generate_series(-1, %s) AS i(faixa)
+    LEFT JOIN faixas f
+        ON f.empresa_id = h.empresa_id AND f.relatorio_id = h.relatorio_id
+        AND f.usuario_id = h.usuario_id AND f.hora = h.hora AND f.faixa = i.faixa
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (empresa_id, relatorio_id, usuario_id, hora) DO UPDATE SET
+        total = EXCLUDED.total,
+        erros = EXCLUDED.erros,
+        cache_hits = EXCLUDED.cache_hits,
+        exportacoes = EXCLUDED.exportacoes,
+        linhas = EXCLUDED.linhas,
+        tempo_total_ms = EXCLUDED.tempo_total_ms,
+        tempo_max_ms = EXCLUDED.tempo_max_ms,
+        histograma = EXCLUDED.histograma
+"""
+
+
+def preencher_resumo(apps, schema_editor):
+    """Recalcula o resumo (com histograma) a partir das execuções existentes"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(SQL_PREENCHER, [LIMITES_MS, len(LIMITES_MS)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execucoes', '0011_execucao_iniciado_em_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumoexecucaohora',
+            name='histograma',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, help_text='Execuções por faixa de tempo (services.estatisticas.LIMITES_MS)', size=None),
+        ),
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
@@ -1,25 +1,98 @@
 import uuid
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
+from django.utils import timezone
 
 
 class Execucao(models.Model):
+    class Status(models.TextChoices):
+        PENDENTE = 'PENDENTE', 'Pendente'
+        EXECUTANDO = 'EXECUTANDO', 'Executando'
+        CONCLUIDO = 'CONCLUIDO', 'Concluído'
+        ERRO = 'ERRO', 'Erro'
+        CANCELADO = 'CANCELADO', 'Cancelado'
+        TIMEOUT = 'TIMEOUT', 'Tempo esgotado'
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     empresa = models.ForeignKey('empresas.Empresa', on_delete=models.CASCADE)
     relatorio = models.ForeignKey('relatorios.Relatorio', on_delete=models.CASCADE)
     usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE)
     filtros_usados = models.JSONField(null=True, blank=True)
-    iniciado_em = models.DateTimeField(auto_now_add=True)
+    # Definido na criação da instância: o registro pode ser gravado só ao final
+    iniciado_em = models.DateTimeField(default=timezone.now, editable=False)
     finalizado_em = models.DateTimeField(null=True)
     tempo_execucao_ms = models.IntegerField(null=True)
+    tempo_fila_ms = models.IntegerField(null=True, help_text='Espera por vaga de execução (controle de admissão)')
     sucesso = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDENTE)
+    progresso = models.IntegerField(default=0, help_text='Percentual concluído (0-100)')
     erro = models.TextField(null=True, blank=True)
     qtd_linhas = models.IntegerField(null=True)
     exportou = models.BooleanField(default=False)
     exportado_em = models.DateTimeField(null=True)
+    cache_hit = models.BooleanField(default=False)
+    sessao_banco = models.CharField(
+        max_length=50, blank=True, default='',
+        help_text='Identificador da sessão no banco do cliente (usado para cancelar)'
+    )
+    arquivo_resultado = models.CharField(
+        max_length=100, blank=True, default='',
+        help_text='Resultado completo gravado em disco (execução paginada)'
+    )
+    coalescida = models.BooleanField(default=False)
 
     class Meta:
         db_table = 'execucoes'
+        # Particionada por mês em iniciado_em; no banco a PK é (id, iniciado_em)
+        # (ver services/particoes.py e o comando gerenciar_particoes)
         ordering = ['-iniciado_em']
+        # Histórico paginado por (iniciado_em, id) dentro de cada filtro suportado
+        indexes = [
+            models.Index(fields=['empresa', 'iniciado_em'], name='execucoes_empresa_inicio'),
+            models.Index(fields=['empresa', 'relatorio', 'iniciado_em'], name='execucoes_relatorio_inicio'),
+            models.Index(fields=['empresa', 'usuario', 'iniciado_em'], name='execucoes_usuario_inicio'),
+        ]
 
     def __str__(self):
         return f"Execução {self.id} - {self.relatorio.nome}"
+
+
+class ResumoExecucaoHora(models.Model):
+    """
+    Execuções agregadas por hora, relatório e usuário.
+
+    Mantido pelo gravador de auditoria a cada execução finalizada e
+    recalculado a partir de execucoes antes que as linhas saiam pela retenção
+    (ver services/estatisticas.py e services/particoes.py), então as
+    estatísticas continuam disponíveis depois que as partições antigas são
+    removidas.
+    """
+    empresa = models.ForeignKey('empresas.Empresa', on_delete=models.CASCADE)
+    relatorio = models.ForeignKey('relatorios.Relatorio', on_delete=models.CASCADE)
+    usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE)
+    hora = models.DateTimeField()
+    total = models.IntegerField(default=0)
+    erros = models.IntegerField(default=0)
+    cache_hits = models.IntegerField(default=0)
+    exportacoes = models.IntegerField(default=0)
+    linhas = models.BigIntegerField(default=0)
+    tempo_total_ms = models.BigIntegerField(default=0)
+    tempo_max_ms = models.IntegerField(null=True)
+    histograma = ArrayField(
+        models.IntegerField(), default=list,
+        help_text='Execuções por faixa de tempo (services.estatisticas.LIMITES_MS)'
+    )
+
+    class Meta:
+        db_table = 'execucoes_resumo_hora'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['empresa', 'relatorio', 'usuario', 'hora'], name='execucoes_resumo_hora_unico'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['empresa', 'hora'], name='execucoes_resumo_empresa_hora'),
+        ]
+
+    def __str__(self):
+        return f"Resumo {self.relatorio_id} {self.hora:%Y-%m-%d %H}h"
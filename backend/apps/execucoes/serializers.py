@@ -2,6 +2,7 @@
 Serializers para a API de Execuções/Histórico.
 """
 from rest_framework import serializers
+from services.result_query import FUNCOES_AGREGACAO, OPERADORES
 from .models import Execucao
 
 
@@ -16,7 +17,39 @@ class ExecucaoSerializer(serializers.ModelSerializer):
         model = Execucao
         fields = [
             'id', 'relatorio_id', 'relatorio_nome', 'usuario_nome', 'usuario_email',
-            'filtros_usados', 'iniciado_em', 'finalizado_em', 'tempo_execucao_ms',
-            'sucesso', 'erro', 'qtd_linhas', 'exportou', 'exportado_em'
+            'filtros_usados', 'iniciado_em', 'finalizado_em', 'tempo_execucao_ms', 'tempo_fila_ms',
+            'sucesso', 'status', 'progresso', 'erro', 'qtd_linhas', 'exportou', 'exportado_em', 'cache_hit',
+            'coalescida'
         ]
         read_only_fields = ['id']
+
+
+class OrdenacaoSerializer(serializers.Serializer):
+    coluna = serializers.CharField()
+    direcao = serializers.ChoiceField(choices=['asc', 'desc'], required=False, default='asc')
+
+
+class FiltroResultadoSerializer(serializers.Serializer):
+    coluna = serializers.CharField()
+    operador = serializers.ChoiceField(choices=OPERADORES)
+    valor = serializers.JSONField(required=False, allow_null=True)
+
+
+class AgregacaoSerializer(serializers.Serializer):
+    funcao = serializers.ChoiceField(choices=list(FUNCOES_AGREGACAO))
+    coluna = serializers.CharField(required=False, allow_blank=True)
+
+
+class ConsultarResultadoSerializer(serializers.Serializer):
+    """Serializer para consultas sobre o resultado gravado de uma execução"""
+    ordenacao = OrdenacaoSerializer(many=True, required=False, default=list)
+    filtros = FiltroResultadoSerializer(many=True, required=False, default=list)
+    agrupar_por = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    agregacoes = AgregacaoSerializer(many=True, required=False, default=list)
+    offset = serializers.IntegerField(required=False, default=0, min_value=0)
+    limit = serializers.IntegerField(required=False, default=100, min_value=1, max_value=10000)
+    formato_dados = serializers.ChoiceField(
+        choices=['colunar', 'registros'],
+        required=False,
+        default='colunar'
+    )
@@ -1,3 +1,796 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from apps.agendamentos.models import Agendamento, ExecucaoAgendada
+from apps.conexoes.models import Conexao
+from apps.empresas.models import Empresa
+from apps.relatorios.models import Relatorio
+from apps.usuarios.models import Usuario
+from core import crypto
+from core.pagination import KeysetPagination
+from services.admissao import ControleAdmissao, FilaCheia, LimiteConcorrencia
+from services.auditoria import GravadorAuditoria
+from services.coalescing import Coalescedor
+from services.execucoes_ativas import ExecucaoCancelada
+from services.query_executor import QueryExecutor
+from services.result_cache import ResultCache
+from services import execucao_assincrona, particoes, result_query, result_spill
+from .models import Execucao, ResumoExecucaoHora
 
-# Create your tests here.
+
+class ResultadoAssincronoTest(SimpleTestCase):
+    """O resultado assíncrono precisa ser lido por qualquer processo, não só pelo que executou"""
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = diretorio.name
+        configuracao = override_settings(SPILL_DIR=self.diretorio, EXECUCAO_RESULTADO_TTL_SEGUNDOS=60)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_resultado_nao_depende_do_cache(self):
+        execucao_id = uuid.uuid4()
+        execucao_assincrona.salvar_resultado(execucao_id, {
+            'sucesso': True,
+            'colunas': ['valor', 'dia'],
+            'linhas': [[Decimal('1.50'), date(2024, 1, 31)]],
+        })
+        cache.clear()
+
+        self.assertEqual(execucao_assincrona.obter_resultado(str(execucao_id)), {
+            'sucesso': True,
+            'colunas': ['valor', 'dia'],
+            'linhas': [[1.5, '2024-01-31']],
+        })
+
+    def test_inexistente(self):
+        self.assertIsNone(execucao_assincrona.obter_resultado(uuid.uuid4()))
+
+    def test_expirado(self):
+        execucao_id = uuid.uuid4()
+        execucao_assincrona.salvar_resultado(execucao_id, {'sucesso': True})
+        agora = result_spill.time.time()
+        with mock.patch.object(result_spill.time, 'time', return_value=agora + 61):
+            self.assertIsNone(execucao_assincrona.obter_resultado(execucao_id))
+
+    def test_limpeza_remove_respostas_antigas(self):
+        execucao_assincrona.salvar_resultado(uuid.uuid4(), {'sucesso': True})
+        self.assertEqual(result_spill.limpar_expirados(ttl_segundos=-1), 1)
+        self.assertEqual(os.listdir(self.diretorio), [])
+
+
+class CursorFalso:
+    """Cursor mínimo para result_spill.gravar"""
+
+    description = None
+
+    def __init__(self, linhas: list):
+        self._linhas = list(linhas)
+
+    def fetchmany(self, quantidade: int) -> list:
+        lote, self._linhas = self._linhas[:quantidade], self._linhas[quantidade:]
+        return lote
+
+
+class ResultSpillTest(SimpleTestCase):
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(SPILL_DIR=diretorio.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_lote_seguinte_com_mais_casas_decimais(self):
+        # numeric sem escala (CursorFalso.description = None): o primeiro lote tem uma casa
+        linhas = [(Decimal('1.5'),), (Decimal('2'),), (Decimal('10') / Decimal('3'),)]
+        nome, total = result_spill.gravar(uuid.uuid4(), CursorFalso(linhas), ['valor'], tamanho_lote=2)
+        self.assertEqual(total, 3)
+
+        pagina = result_spill.ler_pagina(nome, 0, 10)
+        self.assertEqual([linha[0] for linha in pagina['linhas']], [
+            Decimal('1.5'), Decimal('2'), Decimal('3.333333333333333333')
+        ])
+
+
+class ResultCachePaginadoTest(SimpleTestCase):
+    """Resultado paginado em cache não pode sobreviver ao arquivo em disco"""
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(SPILL_DIR=diretorio.name, SPILL_TTL_SEGUNDOS=60)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.addCleanup(cache.clear)
+
+        relatorio = SimpleNamespace(id=uuid.uuid4(), conexao_id=uuid.uuid4(), cache_ttl_segundos=3600)
+        self.cache = ResultCache(relatorio)
+        self.chave = self.cache.chave('SELECT 1', paginado=True)
+        self.arquivo, _ = result_spill.gravar(uuid.uuid4(), CursorFalso([(1,)]), ['x'])
+
+    def test_ttl_limitado_ao_do_arquivo(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as gravar:
+            self.assertTrue(self.cache.salvar(self.chave, {'total_linhas': 1, 'arquivo_resultado': self.arquivo}))
+        self.assertEqual(gravar.call_args_list[0], mock.call(self.chave, mock.ANY, 60))
+
+    def test_arquivo_removido_nao_e_servido(self):
+        self.cache.salvar(self.chave, {'total_linhas': 1, 'arquivo_resultado': self.arquivo})
+        self.assertIsNotNone(self.cache.obter(self.chave))
+
+        result_spill.remover(self.arquivo)
+        self.assertIsNone(self.cache.obter(self.chave))
+
+
+class ResultQueryTest(SimpleTestCase):
+    """Filtros, ordenação e paginação sobre o resultado gravado em disco"""
+
+    LINHAS = [
+        ('SP', 'Ana', 10, date(2024, 1, 5)),
+        ('RJ', 'Bruno', None, date(2024, 2, 1)),
+        ('SP', 'Carla', 30, date(2024, 3, 10)),
+        ('MG', 'Daniel', 20, date(2024, 1, 20)),
+        ('RJ', 'Elisa', 5, date(2024, 4, 2)),
+    ]
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(SPILL_DIR=diretorio.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.nome, _ = result_spill.gravar(
+            1, CursorFalso(self.LINHAS), ['uf', 'nome', 'valor', 'dia'], tamanho_lote=2
+        )
+
+    def _nomes(self, **kwargs) -> list:
+        resultado = result_query.consultar(self.nome, formato_dados='registros', **kwargs)
+        return [linha['nome'] for linha in resultado['dados']]
+
+    def test_filtros(self):
+        CASOS = [
+            ({'coluna': 'uf', 'operador': 'igual', 'valor': 'SP'}, ['Ana', 'Carla']),
+            ({'coluna': 'uf', 'operador': 'diferente', 'valor': 'SP'}, ['Bruno', 'Daniel', 'Elisa']),
+            ({'coluna': 'valor', 'operador': 'maior', 'valor': 10}, ['Carla', 'Daniel']),
+            ({'coluna': 'valor', 'operador': 'menor_igual', 'valor': 10}, ['Ana', 'Elisa']),
+            ({'coluna': 'valor', 'operador': 'entre', 'valor': [5, 20]}, ['Ana', 'Daniel', 'Elisa']),
+            ({'coluna': 'uf', 'operador': 'em', 'valor': ['MG', 'RJ']}, ['Bruno', 'Daniel', 'Elisa']),
+            ({'coluna': 'nome', 'operador': 'contem', 'valor': 'AR'}, ['Carla']),
+            ({'coluna': 'nome', 'operador': 'comeca_com', 'valor': 'd'}, ['Daniel']),
+            ({'coluna': 'valor', 'operador': 'nulo'}, ['Bruno']),
+            ({'coluna': 'valor', 'operador': 'nao_nulo'}, ['Ana', 'Carla', 'Daniel', 'Elisa']),
+            ({'coluna': 'dia', 'operador': 'maior_igual', 'valor': '2024-03-01'}, ['Carla', 'Elisa']),
+        ]
+        for filtro, esperado in CASOS:
+            with self.subTest(filtro=filtro):
+                self.assertEqual(self._nomes(filtros=[filtro]), esperado)
+
+    def test_filtros_combinados_com_e(self):
+        filtros = [
+            {'coluna': 'uf', 'operador': 'igual', 'valor': 'RJ'},
+            {'coluna': 'valor', 'operador': 'nao_nulo'},
+        ]
+        self.assertEqual(self._nomes(filtros=filtros), ['Elisa'])
+
+    def test_filtro_invalido(self):
+        CASOS = [
+            {'coluna': 'inexistente', 'operador': 'igual', 'valor': 1},
+            {'coluna': 'uf', 'operador': 'parecido', 'valor': 'SP'},
+            {'coluna': 'valor', 'operador': 'entre', 'valor': 10},
+            {'coluna': 'valor', 'operador': 'em', 'valor': 10},
+            {'coluna': 'valor', 'operador': 'igual', 'valor': 'dez'},
+        ]
+        for filtro in CASOS:
+            with self.subTest(filtro=filtro), self.assertRaises(ValueError):
+                result_query.consultar(self.nome, filtros=[filtro])
+
+    def test_ordenacao_com_nulos_ao_final(self):
+        CASOS = [
+            ([{'coluna': 'valor'}], ['Elisa', 'Ana', 'Daniel', 'Carla', 'Bruno']),
+            ([{'coluna': 'valor', 'direcao': 'desc'}], ['Carla', 'Daniel', 'Ana', 'Elisa', 'Bruno']),
+            ([{'coluna': 'uf'}, {'coluna': 'dia', 'direcao': 'desc'}], ['Daniel', 'Elisa', 'Bruno', 'Carla', 'Ana']),
+        ]
+        for ordenacao, esperado in CASOS:
+            with self.subTest(ordenacao=ordenacao):
+                self.assertEqual(self._nomes(ordenacao=ordenacao), esperado)
+
+    def test_pagina_depois_de_filtrar_e_ordenar(self):
+        resultado = result_query.consultar(
+            self.nome,
+            filtros=[{'coluna': 'valor', 'operador': 'nao_nulo'}],
+            ordenacao=[{'coluna': 'valor', 'direcao': 'desc'}],
+            offset=1, limite=2,
+        )
+        self.assertEqual(resultado['colunas'], ['uf', 'nome', 'valor', 'dia'])
+        self.assertEqual([linha[1] for linha in resultado['linhas']], ['Daniel', 'Ana'])
+        self.assertEqual((resultado['offset'], resultado['limite'], resultado['total_linhas']), (1, 2, 4))
+
+    def test_pagina_alem_do_fim(self):
+        resultado = result_query.consultar(self.nome, offset=10, limite=5)
+        self.assertEqual(resultado['linhas'], [])
+        self.assertEqual(resultado['total_linhas'], 5)
+
+    def test_agrupamento(self):
+        resultado = result_query.consultar(
+            self.nome,
+            agrupar_por=['uf'],
+            agregacoes=[{'funcao': 'soma', 'coluna': 'valor'}, {'funcao': 'contagem'}],
+            ordenacao=[{'coluna': 'uf'}],
+        )
+        self.assertEqual(resultado['colunas'], ['uf', 'soma_valor', 'contagem'])
+        self.assertEqual(resultado['linhas'], [['MG', 20, 1], ['RJ', 5, 2], ['SP', 40, 2]])
+        self.assertEqual(resultado['total_linhas'], 3)
+
+    def test_resultado_expirado(self):
+        result_spill.remover(self.nome)
+        with self.assertRaises(result_spill.ResultadoExpirado):
+            result_query.consultar(self.nome)
+
+
+@override_settings(COALESCING_ATIVO=True, COALESCING_ENTRE_PROCESSOS=False)
+class CoalescedorTest(SimpleTestCase):
+
+    def setUp(self):
+        self.coalescedor = Coalescedor()
+        self.liberar_lider = threading.Event()
+        self.liberar_seguidoras = threading.Event()
+
+    def _lider(self, erro: Exception):
+        def executar():
+            self.liberar_lider.wait(10)
+            raise erro
+        return executar
+
+    def _seguidoras(self, quantidade: int) -> tuple[list, list]:
+        """Inicia seguidoras e aguarda todas estarem esperando a líder"""
+        resultados, execucoes = [], []
+
+        def seguir(numero):
+            def executar():
+                execucoes.append(numero)
+                self.liberar_seguidoras.wait(10)
+                return {'linhas': numero}
+            try:
+                resultados.append(self.coalescedor.executar('chave', executar))
+            except Exception as e:
+                resultados.append(e)
+
+        threads = [threading.Thread(target=seguir, args=(i,)) for i in range(quantidade)]
+        for thread in threads:
+            thread.start()
+        self._esperar_seguidoras(quantidade)
+        return threads, resultados, execucoes
+
+    def _esperar_seguidoras(self, quantidade: int):
+        """Aguarda `quantidade` threads esperando o voo atual da chave"""
+        for _ in range(500):
+            voo = self.coalescedor._voos.get('chave')
+            if voo is not None and len(voo.concluido._cond._waiters) == quantidade:
+                return
+            time.sleep(0.01)
+        self.fail(f'{quantidade} seguidoras não chegaram a aguardar')
+
+    def _executar_lider(self, erro: Exception):
+        lider = threading.Thread(
+            target=lambda: self.assertRaises(type(erro), self.coalescedor.executar, 'chave', self._lider(erro))
+        )
+        lider.start()
+        for _ in range(500):
+            if 'chave' in self.coalescedor._voos:
+                break
+            time.sleep(0.01)
+        return lider
+
+    def test_cancelamento_da_lider_nao_cancela_as_seguidoras(self):
+        lider = self._executar_lider(ExecucaoCancelada('Execução cancelada pelo usuário'))
+        threads, resultados, execucoes = self._seguidoras(3)
+
+        self.liberar_lider.set()
+        lider.join(10)
+        # A nova líder só termina depois que as outras duas passaram a aguardá-la
+        self._esperar_seguidoras(2)
+        self.liberar_seguidoras.set()
+        for thread in threads:
+            thread.join(10)
+
+        # Uma seguidora assume como líder; as outras recebem o resultado dela
+        self.assertEqual(len(execucoes), 1)
+        self.assertEqual(len(resultados), 3)
+        self.assertEqual(sorted(coalescida for _, coalescida in resultados), [False, True, True])
+        self.assertEqual({resultado['linhas'] for resultado, _ in resultados}, set(execucoes))
+
+    def test_erro_da_lider_e_repassado(self):
+        lider = self._executar_lider(RuntimeError('conexão recusada'))
+        threads, resultados, execucoes = self._seguidoras(2)
+
+        self.liberar_lider.set()
+        for thread in [lider, *threads]:
+            thread.join(10)
+
+        self.assertEqual(execucoes, [])
+        self.assertEqual([str(erro) for erro in resultados], ['conexão recusada'] * 2)
+
+
+class LimiteConcorrenciaTest(SimpleTestCase):
+
+    def _esperar_na_fila(self, limite, quantidade: int):
+        """Aguarda até `quantidade` threads entrarem na fila"""
+        for _ in range(200):
+            with limite._cond:
+                if len(limite._fila) >= quantidade:
+                    return
+            time.sleep(0.01)
+        self.fail('Threads não entraram na fila')
+
+    def test_sem_limite(self):
+        limite = LimiteConcorrencia(max_ativas=0, max_fila=0)
+        for _ in range(10):
+            limite.adquirir(timeout=0)
+        self.assertEqual(limite._ativas, 10)
+
+    def test_fila_cheia_recusa_na_hora(self):
+        limite = LimiteConcorrencia(max_ativas=1, max_fila=0)
+        limite.adquirir(timeout=0)
+        with self.assertRaisesRegex(FilaCheia, 'Limite'):
+            limite.adquirir(timeout=10)
+
+    def test_espera_esgotada_sai_da_fila(self):
+        limite = LimiteConcorrencia(max_ativas=1, max_fila=1)
+        limite.adquirir(timeout=0)
+        with self.assertRaisesRegex(FilaCheia, 'esgotado'):
+            limite.adquirir(timeout=0.01)
+        self.assertEqual(len(limite._fila), 0)
+        self.assertEqual(limite._ativas, 1)
+
+    def test_fila_por_ordem_de_chegada(self):
+        limite = LimiteConcorrencia(max_ativas=1, max_fila=3)
+        limite.adquirir(timeout=0)
+        ordem = []
+
+        def entrar(nome):
+            limite.adquirir(timeout=5)
+            ordem.append(nome)
+            limite.liberar()
+
+        threads = []
+        for posicao, nome in enumerate(['a', 'b', 'c'], start=1):
+            thread = threading.Thread(target=entrar, args=(nome,))
+            thread.start()
+            threads.append(thread)
+            self._esperar_na_fila(limite, posicao)
+
+        limite.liberar()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(ordem, ['a', 'b', 'c'])
+        self.assertEqual(limite._ativas, 0)
+
+    def test_aumentar_limite_admite_fila(self):
+        limite = LimiteConcorrencia(max_ativas=1, max_fila=1)
+        limite.adquirir(timeout=0)
+        thread = threading.Thread(target=limite.adquirir, args=(5,))
+        thread.start()
+        self._esperar_na_fila(limite, 1)
+
+        limite.atualizar(2)
+        thread.join(5)
+        self.assertEqual(limite._ativas, 2)
+
+
+@override_settings(ADMISSAO_MAX_FILA=0, ADMISSAO_TIMEOUT_FILA_SEGUNDOS=0)
+class ControleAdmissaoTest(SimpleTestCase):
+
+    def setUp(self):
+        self.controle = ControleAdmissao()
+        self.empresa = SimpleNamespace(id=1, max_execucoes_simultaneas=2)
+        self.conexao = SimpleNamespace(id=1, max_execucoes_simultaneas=1)
+        self.outra_conexao = SimpleNamespace(id=2, max_execucoes_simultaneas=1)
+
+    def test_limite_da_conexao(self):
+        with self.controle.admitir(self.empresa, self.conexao):
+            with self.assertRaises(FilaCheia):
+                with self.controle.admitir(self.empresa, self.conexao):
+                    pass
+            with self.controle.admitir(self.empresa, self.outra_conexao):
+                pass
+
+    def test_limite_da_empresa(self):
+        terceira = SimpleNamespace(id=3, max_execucoes_simultaneas=0)
+        with self.controle.admitir(self.empresa, self.conexao), \
+                self.controle.admitir(self.empresa, self.outra_conexao):
+            with self.assertRaises(FilaCheia):
+                with self.controle.admitir(self.empresa, terceira):
+                    pass
+
+    def test_recusa_na_conexao_libera_vaga_da_empresa(self):
+        with self.controle.admitir(self.empresa, self.conexao):
+            with self.assertRaises(FilaCheia):
+                with self.controle.admitir(self.empresa, self.conexao):
+                    pass
+        self.assertEqual(self.controle._limite('empresa:1', 2)._ativas, 0)
+        self.assertEqual(self.controle._limite('conexao:1', 1)._ativas, 0)
+
+
+class KeysetCursorTest(SimpleTestCase):
+
+    def test_ida_e_volta(self):
+        data = datetime(2024, 3, 10, 14, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        id_ = uuid.uuid4()
+        cursor = KeysetPagination._codificar(data, id_)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(KeysetPagination._decodificar(cursor), (data, id_))
+
+    def test_cursor_invalido(self):
+        CASOS = [
+            'nao-e-base64!',
+            'W10',  # []
+            KeysetPagination._codificar(datetime(2024, 1, 1), 'nao-e-uuid'),
+            'WyJvbnRlbSIsICIxIl0',  # ["ontem", "1"]
+        ]
+        for cursor in CASOS:
+            with self.subTest(cursor=cursor), self.assertRaises(ValidationError):
+                KeysetPagination._decodificar(cursor)
+
+
+class HistoricoPaginacaoTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        cls.admin = Usuario.objects.create_user('admin@empresa.com', cls.empresa, 'senha', nome='Admin', role='ADMIN')
+        cls.ana = Usuario.objects.create_user('ana@empresa.com', cls.empresa, 'senha', nome='Ana', role='USUARIO')
+        conexao = Conexao.objects.create(
+            empresa=cls.empresa, nome='Conexão', tipo='POSTGRESQL', host='localhost',
+            porta=5432, database='db', usuario='u', senha_encriptada=''
+        )
+        vendas, estoque = [
+            Relatorio.objects.create(
+                empresa=cls.empresa, conexao=conexao, nome=nome, query_sql='SELECT 1', criado_por=cls.admin
+            )
+            for nome in ('Vendas', 'Estoque')
+        ]
+        inicio = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        # Mesmo iniciado_em em pares: o desempate por id não pode repetir nem pular linhas
+        Execucao.objects.bulk_create([
+            Execucao(
+                empresa=cls.empresa,
+                relatorio=vendas if i % 3 else estoque,
+                usuario=cls.ana if i % 2 else cls.admin,
+                iniciado_em=inicio + timedelta(minutes=i // 2),
+                sucesso=i % 4 != 0,
+            )
+            for i in range(30)
+        ])
+
+    def _percorrer(self, **params) -> list:
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        ids, cursor = [], None
+        while True:
+            pagina = client.get('/api/historico/', {**params, 'limite': 4, **({'cursor': cursor} if cursor else {})}).json()
+            ids += [item['id'] for item in pagina['resultados']]
+            if not pagina['possui_mais']:
+                return ids
+            cursor = pagina['proximo_cursor']
+
+    def _esperado(self, qs) -> list:
+        return [str(id_) for id_ in qs.order_by('-iniciado_em', '-id').values_list('id', flat=True)]
+
+    def test_percorre_todas_as_paginas(self):
+        self.assertEqual(self._percorrer(), self._esperado(Execucao.objects.all()))
+
+    def test_filtros_valem_para_todo_o_historico(self):
+        CASOS = [
+            ({'sucesso': 'false'}, Execucao.objects.filter(sucesso=False)),
+            ({'busca': 'estoq'}, Execucao.objects.filter(relatorio__nome='Estoque')),
+            ({'busca': 'ANA'}, Execucao.objects.filter(usuario=self.ana)),
+            ({'busca': 'vendas', 'sucesso': 'true'}, Execucao.objects.filter(relatorio__nome='Vendas', sucesso=True)),
+        ]
+        for params, qs in CASOS:
+            with self.subTest(params=params):
+                self.assertEqual(self._percorrer(**params), self._esperado(qs))
+
+
+class EstatisticasLimiteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        cls.admin = Usuario.objects.create_user('admin@empresa.com', cls.empresa, 'senha', nome='Admin', role='ADMIN')
+
+    def test_limite_aplicado_pela_ordenacao_pedida(self):
+        # Os maiores totais estão nos períodos mais recentes
+        itens = [
+            {'chave': uuid.uuid4(), 'periodo': date(2024, 1, dia), 'total': dia * 10}
+            for dia in range(1, 6)
+        ]
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with mock.patch('apps.execucoes.views.estatisticas.consultar', return_value=itens):
+            resposta = client.get('/api/historico/estatisticas/', {'ordenar': '-total', 'limite': 2})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(
+            [(item['periodo'], item['total']) for item in resposta.json()['resultados']],
+            [('2024-01-04', 40), ('2024-01-05', 50)]
+        )
+
+
+class ExecucaoAbandonadaTest(TestCase):
+    """Execuções assíncronas sempre chegam a um estado final"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        cls.admin = Usuario.objects.create_user('admin@empresa.com', cls.empresa, 'senha', nome='Admin', role='ADMIN')
+        conexao = Conexao.objects.create(
+            empresa=cls.empresa, nome='Conexão', tipo='POSTGRESQL', host='localhost',
+            porta=5432, database='db', usuario='u', senha_encriptada=''
+        )
+        cls.relatorio = Relatorio.objects.create(
+            empresa=cls.empresa, conexao=conexao, nome='Vendas', query_sql='SELECT 1', criado_por=cls.admin
+        )
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(SPILL_DIR=diretorio.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def _execucao(self, status, iniciado_em=None):
+        return Execucao.objects.create(
+            empresa=self.empresa, relatorio=self.relatorio, usuario=self.admin,
+            status=status, iniciado_em=iniciado_em or datetime.now(dt_timezone.utc)
+        )
+
+    def test_falha_fora_da_query_encerra_com_erro(self):
+        execucao = self._execucao(Execucao.Status.PENDENTE)
+        executor = QueryExecutor(self.relatorio)
+        opcoes = executor._opcoes(None, True, 'colunar', False)
+
+        with mock.patch.object(QueryExecutor, '_processar', side_effect=RuntimeError('cache indisponível')), \
+                self.assertLogs('services.query_executor', 'ERROR'):
+            executor._executar_em_segundo_plano(execucao, None, opcoes)
+
+        execucao.refresh_from_db()
+        self.assertEqual(execucao.status, Execucao.Status.ERRO)
+        self.assertIsNotNone(execucao.finalizado_em)
+        resultado = execucao_assincrona.obter_resultado(execucao.id)
+        self.assertEqual(resultado['status'], Execucao.Status.ERRO)
+        self.assertEqual(resultado['erro'], 'cache indisponível')
+
+    def test_limpar_resultados_encerra_abandonadas(self):
+        antiga = datetime.now(dt_timezone.utc) - timedelta(hours=2)
+        pendente = self._execucao(Execucao.Status.PENDENTE, antiga)
+        executando = self._execucao(Execucao.Status.EXECUTANDO, antiga)
+        concluida = self._execucao(Execucao.Status.CONCLUIDO, antiga)
+        recente = self._execucao(Execucao.Status.EXECUTANDO)
+
+        call_command('limpar_resultados', abandonadas=3600, stdout=StringIO())
+
+        status = dict(Execucao.objects.values_list('pk', 'status'))
+        self.assertEqual(status, {
+            pendente.pk: Execucao.Status.ERRO,
+            executando.pk: Execucao.Status.ERRO,
+            concluida.pk: Execucao.Status.CONCLUIDO,
+            recente.pk: Execucao.Status.EXECUTANDO,
+        })
+
+
+class ParticoesRetencaoTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        cls.admin = Usuario.objects.create_user('admin@empresa.com', cls.empresa, 'senha', nome='Admin', role='ADMIN')
+        conexao = Conexao.objects.create(
+            empresa=cls.empresa, nome='Conexão', tipo='POSTGRESQL', host='localhost',
+            porta=5432, database='db', usuario='u', senha_encriptada=''
+        )
+        cls.relatorio = Relatorio.objects.create(
+            empresa=cls.empresa, conexao=conexao, nome='Vendas', query_sql='SELECT 1', criado_por=cls.admin
+        )
+        cls.agendamento = Agendamento.objects.create(
+            empresa=cls.empresa, relatorio=cls.relatorio, criado_por=cls.admin,
+            nome='Diário', frequencia='DIARIO', hora_execucao='08:00'
+        )
+
+    def _execucao(self, iniciado_em):
+        return Execucao.objects.create(
+            empresa=self.empresa, relatorio=self.relatorio, usuario=self.admin, iniciado_em=iniciado_em
+        )
+
+    def test_retencao_por_empresa_anula_referencias(self):
+        corte = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        antiga = self._execucao(corte - timedelta(days=10))
+        recente = self._execucao(corte + timedelta(days=10))
+        # Registrado depois do corte, mas apontando para a execução apagada
+        agendada_antiga = ExecucaoAgendada.objects.create(agendamento=self.agendamento, execucao=antiga)
+        agendada_recente = ExecucaoAgendada.objects.create(agendamento=self.agendamento, execucao=recente)
+
+        resultado = particoes.aplicar_retencao({'particoes': [], 'empresas': [(self.empresa.id, corte)]}, lote=1)
+
+        self.assertEqual(resultado['linhas'], {self.empresa.id: 1})
+        self.assertFalse(Execucao.objects.filter(pk=antiga.pk).exists())
+        agendada_antiga.refresh_from_db()
+        agendada_recente.refresh_from_db()
+        self.assertIsNone(agendada_antiga.execucao_id)
+        self.assertEqual(agendada_recente.execucao_id, recente.pk)
+
+    def test_particao_desanexada_anula_referencias(self):
+        mes = particoes.inicio_mes(datetime(2099, 1, 15, tzinfo=dt_timezone.utc))
+        nome = particoes.nome_particao('execucoes', mes)
+        with connection.cursor() as cursor:
+            particoes.criar_particao(cursor, 'execucoes', mes)
+        execucao = self._execucao(mes + timedelta(days=5))
+        agendada = ExecucaoAgendada.objects.create(agendamento=self.agendamento, execucao=execucao)
+        with connection.cursor() as cursor:
+            # FKs adiadas até o commit impediriam o DROP dentro da transação do teste
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        plano = {'particoes': [('execucoes', nome, mes)], 'empresas': []}
+        self.assertEqual(particoes.aplicar_retencao(plano, apagar=True)['particoes'], [nome])
+
+        self.assertFalse(Execucao.objects.filter(pk=execucao.pk).exists())
+        agendada.refresh_from_db()
+        self.assertIsNone(agendada.execucao_id)
+
+    def test_criar_particao_move_linhas_da_padrao(self):
+        mes = particoes.inicio_mes(datetime(2098, 6, 15, tzinfo=dt_timezone.utc))
+        execucao = self._execucao(mes + timedelta(days=3))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM execucoes_padrao WHERE id = %s', [execucao.pk])
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+            particoes.criar_particao(cursor, 'execucoes', mes)
+
+            nome = particoes.nome_particao('execucoes', mes)
+            cursor.execute(f'SELECT count(*) FROM {nome} WHERE id = %s', [execucao.pk])
+            self.assertEqual(cursor.fetchone()[0], 1)
+            self.assertIn(nome, particoes.listar_particoes(cursor, 'execucoes'))
+        self.assertTrue(Execucao.objects.filter(pk=execucao.pk).exists())
+
+
+@override_settings(DB_POOL_ATIVO=False, AUDITORIA_BUFFER_ATIVO=True, AUDITORIA_INTERVALO_SEGUNDOS=3600)
+class ExecucaoSincronaTest(TransactionTestCase):
+    """
+    Execuções síncronas contra o próprio banco de testes (PostgreSQL).
+    TransactionTestCase: a execução roda em outra thread, com outra conexão.
+    """
+
+    def setUp(self):
+        banco = connection.settings_dict
+        self.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        self.admin = Usuario.objects.create_user('admin@empresa.com', self.empresa, 'senha', nome='Admin', role='ADMIN')
+        self.conexao = Conexao.objects.create(
+            empresa=self.empresa, nome='Banco de testes', tipo='POSTGRESQL',
+            host=banco['HOST'] or 'localhost', porta=int(banco['PORT'] or 5432),
+            database=banco['NAME'], usuario=banco['USER'],
+            senha_encriptada=crypto.encrypt(banco['PASSWORD'] or '', empresa_id=self.empresa.id),
+        )
+        self.gravador = GravadorAuditoria()
+        self.addCleanup(self.gravador.encerrar)
+        substituir = mock.patch('services.query_executor.gravador', self.gravador)
+        substituir.start()
+        self.addCleanup(substituir.stop)
+
+    def _relatorio(self, query_sql: str):
+        return Relatorio.objects.create(
+            empresa=self.empresa, conexao=self.conexao, nome=query_sql[:50],
+            query_sql=query_sql, criado_por=self.admin
+        )
+
+    def test_estado_final_gravado_em_lote(self):
+        executor = QueryExecutor(self._relatorio('SELECT 1 AS x'))
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = executor.executar(usuario=self.admin)
+        self.assertTrue(resultado['sucesso'])
+
+        # Uma única gravação na requisição: o INSERT já leva a sessão no banco
+        gravacoes = [c['sql'] for c in consultas if c['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(gravacoes), 1)
+        self.assertTrue(gravacoes[0].startswith('INSERT INTO "execucoes"'))
+
+        # O estado final espera a descarga do buffer
+        execucao = Execucao.objects.get(pk=resultado['execucao_id'])
+        self.assertEqual(execucao.status, Execucao.Status.EXECUTANDO)
+        self.assertNotEqual(execucao.sessao_banco, '')
+
+        self.assertEqual(self.gravador.descarregar(), 1)
+        execucao.refresh_from_db()
+        self.assertEqual(execucao.status, Execucao.Status.CONCLUIDO)
+        self.assertEqual(execucao.qtd_linhas, 1)
+        self.assertEqual(sum(ResumoExecucaoHora.objects.values_list('total', flat=True)), 1)
+
+    def test_cancelar_durante_a_execucao(self):
+        relatorio = self._relatorio('SELECT pg_sleep(30) AS espera')
+        resultados = []
+
+        def executar():
+            try:
+                resultados.append(QueryExecutor(relatorio).executar(usuario=self.admin))
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=executar)
+        thread.start()
+        self.addCleanup(thread.join, 30)
+
+        execucao = None
+        for _ in range(500):
+            execucao = Execucao.objects.filter(relatorio=relatorio).exclude(sessao_banco='').first()
+            if execucao:
+                break
+            time.sleep(0.01)
+        self.assertIsNotNone(execucao, 'A execução não foi gravada no início')
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        detalhe = client.get(f'/api/historico/{execucao.pk}/status/')
+        self.assertEqual(detalhe.status_code, 200)
+        self.assertEqual(detalhe.json()['status'], Execucao.Status.EXECUTANDO)
+
+        resposta = client.post(f'/api/historico/{execucao.pk}/cancelar/')
+        self.assertEqual(resposta.status_code, 200)
+        thread.join(30)
+        self.assertEqual(resultados[0]['status'], Execucao.Status.CANCELADO)
+
+        self.gravador.descarregar()
+        execucao.refresh_from_db()
+        self.assertEqual(execucao.status, Execucao.Status.CANCELADO)
+
+    def test_cancelamento_antes_da_descarga_prevalece(self):
+        resultado = QueryExecutor(self._relatorio('SELECT 1 AS x')).executar(usuario=self.admin)
+        Execucao.objects.filter(pk=resultado['execucao_id']).update(status=Execucao.Status.CANCELADO)
+
+        self.assertEqual(self.gravador.descarregar(), 0)
+        execucao = Execucao.objects.get(pk=resultado['execucao_id'])
+        self.assertEqual(execucao.status, Execucao.Status.CANCELADO)
+        self.assertFalse(ResumoExecucaoHora.objects.exists())
+
+    def _execucao(self, relatorio, **campos):
+        return Execucao(
+            empresa=self.empresa, relatorio=relatorio, usuario=self.admin,
+            status=Execucao.Status.CONCLUIDO, sucesso=True, **campos
+        )
+
+    @override_settings(AUDITORIA_LOTE=2, AUDITORIA_INTERVALO_SEGUNDOS=0.05)
+    def test_lote_cheio_e_descarregado_pela_thread(self):
+        relatorio = self._relatorio('SELECT 1')
+        self.gravador.registrar(self._execucao(relatorio))
+        self.gravador.registrar(self._execucao(relatorio))
+        for _ in range(500):
+            if Execucao.objects.filter(relatorio=relatorio).count() == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(Execucao.objects.filter(relatorio=relatorio).count(), 2)
+
+    def test_falha_no_lote_grava_uma_a_uma(self):
+        relatorio = self._relatorio('SELECT 1')
+        valida = self._execucao(relatorio)
+        # Relatório inexistente: a FK só falha no commit do lote
+        invalida = self._execucao(relatorio)
+        invalida.relatorio_id = uuid.uuid4()
+        self.gravador.registrar(valida)
+        self.gravador.registrar(invalida)
+
+        with self.assertLogs('services.auditoria', 'ERROR'):
+            self.assertEqual(self.gravador.descarregar(), 1)
+        self.assertEqual(list(Execucao.objects.values_list('pk', flat=True)), [valida.pk])
+        self.assertEqual(sum(ResumoExecucaoHora.objects.values_list('total', flat=True)), 1)
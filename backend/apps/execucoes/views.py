@@ -1,16 +1,45 @@
 """
 Views para a API de Execuções/Histórico.
 """
-from rest_framework import viewsets
+import math
+from datetime import datetime, time, timedelta
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from services import estatisticas, execucao_assincrona, execucoes_ativas, result_query, result_spill
+from services.database_connector import DatabaseConnector
+from core.pagination import KeysetPagination
 from .models import Execucao
-from .serializers import ExecucaoSerializer
+from .serializers import ConsultarResultadoSerializer, ExecucaoSerializer
 
 
 class HistoricoViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet para consulta de histórico de execuções"""
+    """
+    ViewSet para consulta de histórico de execuções.
+
+    A listagem é paginada por cursor (ver core.pagination.KeysetPagination),
+    do mais recente para o mais antigo.
+
+    Filtros (query params): relatorio_id, usuario_id (ADMIN/TECNICO), sucesso,
+    busca (trecho do nome do relatório ou do usuário), iniciado_de e
+    iniciado_ate (data ou data/hora ISO; data final inclusiva).
+    Os filtros valem para todo o histórico, antes da paginação.
+    """
     serializer_class = ExecucaoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    MAX_LINHAS_PAGINA = 10000
+    MAX_ITENS_ESTATISTICAS = 1000
+    ORDENACOES_ESTATISTICAS = (
+        'total', 'erros', 'taxa_erro', 'cache_hits', 'exportacoes', 'linhas',
+        'tempo_medio_ms', 'tempo_max_ms', 'p50_ms', 'p95_ms', 'p99_ms',
+    )
 
     def get_queryset(self):
         """Retorna execuções filtradas por permissões do usuário"""
@@ -34,5 +63,298 @@ class HistoricoViewSet(viewsets.ReadOnlyModelViewSet):
         if sucesso is not None:
             qs = qs.filter(sucesso=sucesso == 'true')
 
-        # Limitar a 100 registros mais recentes
-        return qs.select_related('relatorio', 'usuario')[:100]
+        busca = self.request.query_params.get('busca', '').strip()
+        if busca:
+            qs = qs.filter(Q(relatorio__nome__icontains=busca) | Q(usuario__nome__icontains=busca))
+
+        iniciado_de = self._parametro_data('iniciado_de')
+        if iniciado_de:
+            qs = qs.filter(iniciado_em__gte=iniciado_de)
+
+        iniciado_ate = self._parametro_data('iniciado_ate', fim_do_dia=True)
+        if iniciado_ate:
+            qs = qs.filter(iniciado_em__lt=iniciado_ate)
+
+        return qs.select_related('relatorio', 'usuario')
+
+    def _parametro_data(self, nome: str, fim_do_dia: bool = False):
+        """
+        Lê uma data (YYYY-MM-DD) ou data/hora ISO do query param.
+        Para datas com fim_do_dia=True, retorna o início do dia seguinte
+        (limite exclusivo que inclui o dia inteiro).
+        """
+        valor = self.request.query_params.get(nome)
+        if not valor:
+            return None
+
+        try:
+            # parse_datetime também aceita 'YYYY-MM-DD', então a data vem primeiro
+            data = parse_date(valor)
+            data_hora = parse_datetime(valor) if data is None else None
+        except ValueError:
+            data = data_hora = None
+
+        if data is not None:
+            if fim_do_dia:
+                data += timedelta(days=1)
+            return timezone.make_aware(datetime.combine(data, time.min))
+
+        if data_hora is None:
+            raise ValidationError({nome: 'Use o formato YYYY-MM-DD ou data/hora ISO'})
+        if timezone.is_naive(data_hora):
+            data_hora = timezone.make_aware(data_hora)
+        return data_hora
+
+    @action(detail=False, methods=['get'])
+    def estatisticas(self, request):
+        """
+        Estatísticas de execução (quantidade, taxa de erro, p50/p95/p99 de
+        tempo_execucao_ms, linhas e exportações) a partir do resumo por hora,
+        sem ler o histórico (ver services/estatisticas.py).
+
+        Query params:
+            agrupar_por: empresa, relatorio (padrão), usuario ou conexao
+            intervalo: hora, dia (padrão), semana, mes ou total
+            iniciado_de, iniciado_ate: Período (padrão: últimos 7 dias)
+            relatorio_id, usuario_id (ADMIN/TECNICO), conexao_id: Filtros
+            ordenar: Campo da ordenação, '-' para decrescente (padrão: -total)
+            limite: Máximo de itens (padrão e máximo: MAX_ITENS_ESTATISTICAS);
+                os primeiros pela ordenação, apresentados por período
+        """
+        user = request.user
+        params = request.query_params
+
+        agrupar_por = params.get('agrupar_por', 'relatorio')
+        if agrupar_por not in estatisticas.AGRUPAMENTOS:
+            raise ValidationError({'agrupar_por': f'Use {", ".join(estatisticas.AGRUPAMENTOS)}'})
+        intervalo = params.get('intervalo', 'dia')
+        if intervalo not in estatisticas.INTERVALOS:
+            raise ValidationError({'intervalo': f'Use {", ".join(estatisticas.INTERVALOS)}'})
+        ordenar = params.get('ordenar', '-total')
+        if ordenar.lstrip('-') not in self.ORDENACOES_ESTATISTICAS:
+            raise ValidationError({'ordenar': f'Use {", ".join(self.ORDENACOES_ESTATISTICAS)}'})
+        try:
+            limite = int(params.get('limite', self.MAX_ITENS_ESTATISTICAS))
+        except ValueError:
+            raise ValidationError({'limite': 'Deve ser um número'})
+        limite = min(max(limite, 1), self.MAX_ITENS_ESTATISTICAS)
+
+        fim = self._parametro_data('iniciado_ate', fim_do_dia=True) or timezone.now()
+        inicio = self._parametro_data('iniciado_de') or fim - timedelta(days=7)
+
+        # Usuário comum só vê suas próprias execuções
+        usuario_id = params.get('usuario_id') if user.role in ['ADMIN', 'TECNICO'] else user.id
+
+        itens = estatisticas.consultar(
+            user.empresa_id, inicio, fim,
+            agrupar_por=agrupar_por,
+            intervalo=intervalo,
+            relatorio_id=params.get('relatorio_id'),
+            usuario_id=usuario_id,
+            conexao_id=params.get('conexao_id'),
+        )
+
+        # Os `limite` primeiros pelo campo pedido (vazios por último); havendo
+        # intervalo, apresentados por período (sort estável mantém a ordem no período)
+        campo = ordenar.lstrip('-')
+        sinal = -1 if ordenar.startswith('-') else 1
+        itens.sort(key=lambda item: (item[campo] is None, sinal * (item[campo] or 0)))
+        itens = itens[:limite]
+        if intervalo != 'total':
+            itens.sort(key=lambda item: item['periodo'])
+
+        nomes = self._nomes_estatisticas(agrupar_por, {item['chave'] for item in itens})
+        for item in itens:
+            item['nome'] = nomes.get(item['chave'], '')
+
+        return Response({
+            'agrupar_por': agrupar_por,
+            'intervalo': intervalo,
+            'iniciado_de': inicio,
+            'iniciado_ate': fim,
+            'resultados': itens,
+        })
+
+    @staticmethod
+    def _nomes_estatisticas(agrupar_por: str, chaves: set) -> dict:
+        """Nomes das chaves do agrupamento (uma query)"""
+        from apps.empresas.models import Empresa
+        from apps.usuarios.models import Usuario
+        from apps.conexoes.models import Conexao
+        from apps.relatorios.models import Relatorio
+
+        modelo = {
+            'empresa': Empresa, 'relatorio': Relatorio, 'usuario': Usuario, 'conexao': Conexao,
+        }[agrupar_por]
+        return dict(modelo.objects.filter(pk__in=chaves).values_list('pk', 'nome'))
+
+    @action(detail=True, methods=['get'], url_path='status')
+    def status_execucao(self, request, pk=None):
+        """
+        Acompanha uma execução (assíncrona ou não).
+
+        Query params:
+            pagina: Página do resultado (a partir de 1)
+            tamanho_pagina: Linhas por página (padrão: todas)
+
+        Quando a execução termina, 'resultado' traz a página pedida no mesmo
+        formato de /relatorios/{id}/executar/ (None se expirou).
+        """
+        execucao = self.get_object()
+
+        resposta = {
+            'id': str(execucao.id),
+            'status': execucao.status,
+            'progresso': execucao.progresso,
+            'sucesso': execucao.sucesso,
+            'erro': execucao.erro,
+            'tempo_execucao_ms': execucao.tempo_execucao_ms,
+            'iniciado_em': execucao.iniciado_em,
+            'finalizado_em': execucao.finalizado_em,
+            'resultado': None,
+        }
+
+        if execucao.status in (Execucao.Status.PENDENTE, Execucao.Status.EXECUTANDO):
+            return Response(resposta)
+
+        resultado = execucao_assincrona.obter_resultado(execucao.id)
+        if resultado is None or not resultado.get('sucesso'):
+            resposta['resultado'] = resultado
+            return Response(resposta)
+
+        try:
+            pagina = max(int(request.query_params.get('pagina', 1)), 1)
+            tamanho_pagina = int(request.query_params.get('tamanho_pagina', 0))
+        except ValueError:
+            return Response(
+                {'erro': 'pagina e tamanho_pagina devem ser números'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resposta['resultado'] = self._paginar(resultado, pagina, tamanho_pagina)
+        return Response(resposta)
+
+    @action(detail=True, methods=['post'])
+    def cancelar(self, request, pk=None):
+        """
+        Cancela uma execução pendente ou em andamento.
+        A query é interrompida no banco do cliente, mesmo que esteja
+        rodando em outro processo (pela sessão gravada na execução).
+        """
+        execucao = self.get_object()
+
+        atualizadas = Execucao.objects.filter(
+            pk=execucao.pk,
+            status__in=[Execucao.Status.PENDENTE, Execucao.Status.EXECUTANDO]
+        ).update(status=Execucao.Status.CANCELADO)
+
+        if not atualizadas:
+            return Response(
+                {'erro': 'A execução já foi finalizada'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not execucoes_ativas.cancelar(execucao.id):
+            execucao.refresh_from_db(fields=['sessao_banco'])
+            if execucao.sessao_banco:
+                try:
+                    DatabaseConnector(execucao.relatorio.conexao).cancelar_sessao(execucao.sessao_banco)
+                except Exception as e:
+                    return Response(
+                        {'erro': f'Execução marcada como cancelada, mas a query não pôde ser interrompida: {e}'},
+                        status=status.HTTP_502_BAD_GATEWAY
+                    )
+
+        return Response({'success': True, 'status': Execucao.Status.CANCELADO})
+
+    @action(detail=True, methods=['get'])
+    def pagina(self, request, pk=None):
+        """
+        Página do resultado completo de uma execução paginada
+        (executar com paginado=true), sem executar a query novamente.
+
+        Query params:
+            offset: Primeira linha (a partir de 0)
+            limit: Quantidade de linhas (máximo MAX_LINHAS_PAGINA)
+            formato_dados: 'colunar' (padrão) ou 'registros'
+        """
+        execucao = self.get_object()
+
+        if not execucao.arquivo_resultado:
+            return Response(
+                {'erro': 'Esta execução não possui resultado paginado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+            limit = int(request.query_params.get('limit', execucao.relatorio.limite_linhas_tela))
+        except ValueError:
+            return Response(
+                {'erro': 'offset e limit devem ser números'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = min(max(limit, 1), self.MAX_LINHAS_PAGINA)
+        formato_dados = request.query_params.get('formato_dados', 'colunar')
+
+        try:
+            resultado = result_spill.ler_pagina(execucao.arquivo_resultado, offset, limit, formato_dados)
+        except result_spill.ResultadoExpirado as e:
+            return Response({'erro': str(e)}, status=status.HTTP_410_GONE)
+
+        return Response({'formato_dados': formato_dados, **resultado})
+
+    @action(detail=True, methods=['post'])
+    def consultar(self, request, pk=None):
+        """
+        Ordena, filtra, agrupa e agrega o resultado completo de uma execução
+        paginada (executar com paginado=true) e retorna a página pedida.
+        Não executa a query novamente no banco do cliente.
+        """
+        execucao = self.get_object()
+
+        if not execucao.arquivo_resultado:
+            return Response(
+                {'erro': 'Esta execução não possui resultado paginado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        serializer = ConsultarResultadoSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        dados = serializer.validated_data
+
+        try:
+            resultado = result_query.consultar(
+                execucao.arquivo_resultado,
+                ordenacao=dados['ordenacao'],
+                filtros=dados['filtros'],
+                agrupar_por=dados['agrupar_por'],
+                agregacoes=dados['agregacoes'],
+                offset=dados['offset'],
+                limite=dados['limit'],
+                formato_dados=dados['formato_dados']
+            )
+        except result_spill.ResultadoExpirado as e:
+            return Response({'erro': str(e)}, status=status.HTTP_410_GONE)
+        except ValueError as e:
+            return Response({'erro': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'formato_dados': dados['formato_dados'], **resultado})
+
+    @staticmethod
+    def _paginar(resultado: dict, pagina: int, tamanho_pagina: int) -> dict:
+        """Recorta as linhas (ou dados, no formato registros) do resultado"""
+        campo = 'dados' if resultado.get('formato_dados') == 'registros' else 'linhas'
+        linhas = resultado.get(campo, [])
+
+        if tamanho_pagina <= 0:
+            return {**resultado, 'pagina': 1, 'total_paginas': 1}
+
+        inicio = (pagina - 1) * tamanho_pagina
+        return {
+            **resultado,
+            campo: linhas[inicio:inicio + tamanho_pagina],
+            'pagina': pagina,
+            'tamanho_pagina': tamanho_pagina,
+            'total_paginas': max(math.ceil(len(linhas) / tamanho_pagina), 1),
+        }
@@ -0,0 +1,117 @@
+"""
+Benchmark da busca no catálogo de relatórios (PostgreSQL).
+Cria uma empresa temporária com N relatórios, compara a busca antiga
+(icontains em nome/descrição) com services.busca_relatorios e desfaz tudo
+ao final (transação com rollback).
+
+Uso:
+    python manage.py benchmark_busca --relatorios 50000 --repeticoes 20
+"""
+import random
+import statistics
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from apps.empresas.models import Empresa
+from apps.usuarios.models import Usuario
+from apps.conexoes.models import Conexao
+from apps.relatorios.models import Relatorio
+from services.busca_relatorios import atualizar_busca, buscar
+
+ASSUNTOS = [
+    'Vendas', 'Faturamento', 'Estoque', 'Comissões', 'Inadimplência', 'Devoluções',
+    'Produção', 'Compras', 'Folha de Pagamento', 'Contas a Receber', 'Contas a Pagar',
+    'Logística', 'Manutenção', 'Atendimento', 'Orçamento', 'Metas',
+]
+RECORTES = ['por Região', 'por Vendedor', 'por Filial', 'Mensal', 'Diário', 'por Produto', 'por Cliente']
+TABELAS = ['vendas', 'itens_pedido', 'clientes', 'produtos', 'estoque', 'titulos', 'funcionarios', 'filiais']
+
+TERMOS_PADRAO = ['vendas', 'comissao vendedor', 'inadimplencia', 'faturamneto', 'itens_pedido', 'região']
+
+
+class Command(BaseCommand):
+    help = 'Compara a busca de relatórios antiga (icontains) com a busca full-text/trigramas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--relatorios', type=int, default=50000, help='Relatórios a criar')
+        parser.add_argument('--repeticoes', type=int, default=20, help='Execuções por termo')
+        parser.add_argument('--termo', action='append', dest='termos', help='Termo a buscar (repetível)')
+        parser.add_argument('--explain', action='store_true', help='Mostra o plano da busca nova')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O benchmark exige PostgreSQL')
+
+        with transaction.atomic():
+            empresa = self._popular(options['relatorios'])
+            base = Relatorio.objects.filter(empresa=empresa, ativo=True)
+
+            for termo in options['termos'] or TERMOS_PADRAO:
+                antiga = base.filter(Q(nome__icontains=termo) | Q(descricao__icontains=termo))
+                nova = buscar(base, termo)
+
+                self._medir(f'{termo!r} icontains', antiga, options['repeticoes'])
+                self._medir(f'{termo!r} busca', nova, options['repeticoes'])
+
+                if options['explain']:
+                    self.stdout.write(nova[:50].explain(analyze=True))
+
+            # Nada do benchmark permanece no banco
+            transaction.set_rollback(True)
+
+    def _popular(self, quantidade: int):
+        inicio = time.perf_counter()
+        sufixo = uuid.uuid4().hex[:8]
+        empresa = Empresa.objects.create(
+            nome=f'Benchmark {sufixo}', slug=f'benchmark-{sufixo}', max_relatorios=quantidade
+        )
+        usuario = Usuario.objects.create_user(
+            f'benchmark-{sufixo}@exemplo.com', empresa, None, nome='Benchmark', role='ADMIN'
+        )
+        conexao = Conexao.objects.create(
+            empresa=empresa, nome='Benchmark', tipo='POSTGRESQL', host='localhost',
+            porta=5432, database='benchmark', usuario='benchmark', senha_encriptada=''
+        )
+
+        aleatorio = random.Random(42)
+        relatorios = []
+        for i in range(quantidade):
+            assunto = aleatorio.choice(ASSUNTOS)
+            recorte = aleatorio.choice(RECORTES)
+            tabela, juncao = aleatorio.sample(TABELAS, 2)
+            relatorios.append(Relatorio(
+                empresa=empresa, conexao=conexao, criado_por=usuario,
+                nome=f'{assunto} {recorte} {i}',
+                descricao=f'Relatório de {assunto.lower()} {recorte.lower()} gerado para o benchmark',
+                query_sql=f'SELECT * FROM dbo.{tabela} t JOIN dbo.{juncao} j ON j.id = t.{juncao}_id',
+            ))
+
+        Relatorio.objects.bulk_create(relatorios, batch_size=5000)
+        atualizar_busca(relatorios, tamanho_lote=2000)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE relatorios')
+
+        self.stdout.write(
+            f'{quantidade} relatórios criados em {time.perf_counter() - inicio:.1f}s'
+        )
+        return empresa
+
+    def _medir(self, nome: str, qs, repeticoes: int):
+        tempos = []
+        encontrados = 0
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            # Primeira página (como na listagem) + total
+            list(qs[:50])
+            encontrados = qs.count()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+
+        tempos.sort()
+        p95 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+        self.stdout.write(
+            f'{nome:<40} {encontrados:>7} encontrados  '
+            f'mediana {statistics.median(tempos):8.1f} ms  p95 {p95:8.1f} ms'
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relatorios', '0005_filtro_formato_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relatorio',
+            name='cache_ttl_segundos',
+            field=models.IntegerField(default=0, help_text='Tempo de cache do resultado em segundos (0 = sem cache)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relatorios', '0006_relatorio_cache_ttl_segundos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relatorio',
+            name='timeout_segundos',
+            field=models.IntegerField(blank=True, help_text='Tempo máximo de execução em segundos (vazio = timeout da conexão, 0 = sem limite)', null=True),
+        ),
+    ]
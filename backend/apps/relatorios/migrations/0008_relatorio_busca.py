@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:11
+
+import re
+import unicodedata
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models import Value
+
+# Cópia de services.busca_relatorios no momento desta migration: a
+# migration não pode mudar de comportamento se o serviço mudar depois
+_COMENTARIO_LINHA = re.compile(r'--[^\n]*')
+_COMENTARIO_BLOCO = re.compile(r'/\*.*?\*/', re.DOTALL)
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_TABELA = re.compile(r'\b(?:FROM|JOIN)\s+([\w\.\[\]"`]+)', re.IGNORECASE)
+
+
+def _normalizar(texto):
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def _extrair_tabelas(query_sql):
+    query = _COMENTARIO_BLOCO.sub(' ', query_sql or '')
+    query = _COMENTARIO_LINHA.sub(' ', query)
+    query = _LITERAL.sub("''", query)
+
+    tabelas = []
+    for nome in _TABELA.findall(query):
+        tabela = _normalizar(re.sub(r'[\[\]"`]', '', nome).split('.')[-1])
+        if tabela and tabela not in tabelas:
+            tabelas.append(tabela)
+    return tabelas
+
+
+def _vetor_busca(relatorio):
+    return (
+        SearchVector(Value(_normalizar(relatorio.nome)), weight='A', config='portuguese')
+        + SearchVector(Value(_normalizar(relatorio.descricao)), weight='B', config='portuguese')
+        + SearchVector(Value(' '.join(_extrair_tabelas(relatorio.query_sql))), weight='C', config='portuguese')
+    )
+
+
+def preencher_busca(apps, schema_editor):
+    """Calcula nome_normalizado e busca_vetor dos relatórios existentes"""
+    Relatorio = apps.get_model('relatorios', 'Relatorio')
+    relatorios = Relatorio.objects.only('id', 'nome', 'descricao', 'query_sql').iterator(chunk_size=1000)
+    lote = []
+    for relatorio in relatorios:
+        relatorio.nome_normalizado = _normalizar(relatorio.nome)
+        relatorio.busca_vetor = _vetor_busca(relatorio)
+        lote.append(relatorio)
+        if len(lote) == 1000:
+            Relatorio.objects.bulk_update(lote, ['nome_normalizado', 'busca_vetor'])
+            lote = []
+    if lote:
+        Relatorio.objects.bulk_update(lote, ['nome_normalizado', 'busca_vetor'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conexoes', '0003_conexao_max_execucoes_simultaneas'),
+        ('empresas', '0004_empresa_max_execucoes_simultaneas'),
+        ('relatorios', '0007_relatorio_timeout_segundos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='relatorio',
+            name='busca_vetor',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='relatorio',
+            name='nome_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='relatorio',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busca_vetor'], name='relatorios_busca_vetor_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='relatorio',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nome_normalizado'], name='relatorios_nome_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(preencher_busca, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 import uuid
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 
@@ -32,17 +34,53 @@ class Relatorio(models.Model):
     ativo = models.BooleanField(default=True)
     limite_linhas_tela = models.IntegerField(default=1000)
     permite_exportar = models.BooleanField(default=True)
+    cache_ttl_segundos = models.IntegerField(default=0, help_text='Tempo de cache do resultado em segundos (0 = sem cache)')
+    timeout_segundos = models.IntegerField(
+        null=True, blank=True,
+        help_text='Tempo máximo de execução em segundos (vazio = timeout da conexão, 0 = sem limite)'
+    )
     criado_por = models.ForeignKey('usuarios.Usuario', on_delete=models.PROTECT)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
+    # Busca no catálogo (mantidos por services.busca_relatorios)
+    nome_normalizado = models.CharField(max_length=255, blank=True, editable=False)
+    busca_vetor = SearchVectorField(null=True, editable=False)
+
+    # Campos que compõem a busca
+    CAMPOS_BUSCA = {'nome', 'descricao', 'query_sql'}
 
     class Meta:
         db_table = 'relatorios'
         unique_together = ['empresa', 'nome']
+        indexes = [
+            GinIndex(fields=['busca_vetor'], name='relatorios_busca_vetor_gin'),
+            GinIndex(fields=['nome_normalizado'], name='relatorios_nome_trgm', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return f"{self.nome} ({self.empresa.nome})"
 
+    def save(self, *args, **kwargs):
+        """
+        Salva recalculando os campos de busca no mesmo INSERT/UPDATE
+        quando nome/descrição/query mudarem
+        """
+        update_fields = kwargs.get('update_fields')
+        recalcular = update_fields is None or self.CAMPOS_BUSCA & set(update_fields)
+        if recalcular:
+            from services.busca_relatorios import normalizar, vetor_busca
+            self.nome_normalizado = normalizar(self.nome)
+            self.busca_vetor = vetor_busca(self.nome, self.descricao, self.query_sql)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'nome_normalizado', 'busca_vetor'}
+
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            if recalcular:
+                # Não deixa a expressão na instância: o valor é lido do banco se acessado
+                del self.busca_vetor
+
 
 class Filtro(models.Model):
     """
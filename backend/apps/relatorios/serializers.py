@@ -4,6 +4,8 @@ Serializers para a API de Relatórios.
 from rest_framework import serializers
 from .models import Relatorio, Filtro, Pasta, Favorito
 from services.query_validator import validar_query
+from services import query_template
+from services.permissoes import verificar_permissao
 
 
 class RelatorioSerializer(serializers.ModelSerializer):
@@ -15,7 +17,7 @@ class RelatorioSerializer(serializers.ModelSerializer):
         model = Relatorio
         fields = [
             'id', 'nome', 'descricao', 'pasta', 'conexao', 'conexao_nome',
-            'query_sql', 'ativo', 'limite_linhas_tela',
+            'query_sql', 'ativo', 'limite_linhas_tela', 'cache_ttl_segundos', 'timeout_segundos',
             'permite_exportar', 'pode_exportar', 'criado_em'
         ]
         read_only_fields = ['id', 'criado_em', 'pode_exportar']
@@ -32,9 +34,23 @@ class RelatorioSerializer(serializers.ModelSerializer):
         if user.role in ['ADMIN', 'TECNICO']:
             return True
 
-        # Buscar permissão explícita
-        perm = obj.permissoes.filter(usuario=user).first()
-        return perm and perm.nivel == 'EXPORTAR' if perm else False
+        # Nível anotado pelo RelatorioViewSet.get_queryset (evita uma query por relatório)
+        if hasattr(obj, 'nivel_permissao'):
+            return obj.nivel_permissao == 'EXPORTAR'
+
+        return verificar_permissao(obj.id, user)['pode_exportar']
+
+    def validate_cache_ttl_segundos(self, value):
+        """TTL do cache não pode ser negativo"""
+        if value < 0:
+            raise serializers.ValidationError('O tempo de cache não pode ser negativo')
+        return value
+
+    def validate_timeout_segundos(self, value):
+        """Timeout não pode ser negativo"""
+        if value is not None and value < 0:
+            raise serializers.ValidationError('O timeout não pode ser negativo')
+        return value
 
     def validate_query_sql(self, value):
         """Valida se a query é segura (apenas SELECT)"""
@@ -53,6 +69,24 @@ class RelatorioSerializer(serializers.ModelSerializer):
 class ExecutarRelatorioSerializer(serializers.Serializer):
     """Serializer para execução de relatórios"""
     filtros = serializers.DictField(required=False, default=dict)
+    contar_total = serializers.BooleanField(required=False, default=True)
+    formato_dados = serializers.ChoiceField(
+        choices=['colunar', 'registros'],
+        required=False,
+        default='colunar'
+    )
+    assincrono = serializers.BooleanField(required=False, default=False)
+    paginado = serializers.BooleanField(required=False, default=False)
+
+
+class ExportarRelatorioSerializer(serializers.Serializer):
+    """Serializer para exportação de relatórios"""
+    filtros = serializers.DictField(required=False, default=dict)
+    formato = serializers.ChoiceField(
+        choices=['xlsx', 'csv', 'csv.gz', 'parquet', 'arrow'],
+        required=False,
+        default='xlsx'
+    )
 
 
 class FiltroSerializer(serializers.ModelSerializer):
@@ -95,6 +129,7 @@ class SalvarFiltrosSerializer(serializers.Serializer):
     def save(self, relatorio):
         """
         Substitui todos os filtros do relatório pelos novos.
+        Atualiza Relatorio.atualizado_em, que versiona o template da query.
 
         Args:
             relatorio: Instância de Relatorio
@@ -113,6 +148,9 @@ class SalvarFiltrosSerializer(serializers.Serializer):
                 **filtro_data_limpo
             )
 
+        relatorio.save(update_fields=['atualizado_em'])
+        query_template.invalidar(relatorio.id)
+
 
 class PastaSerializer(serializers.ModelSerializer):
     """Serializer para pastas de organização"""
@@ -125,11 +163,15 @@ class PastaSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'criado_em']
 
     def get_qtd_relatorios(self, obj):
-        """Retorna quantidade de relatórios na pasta"""
+        """Retorna quantidade de relatórios na pasta (anotada por PastaViewSet.get_queryset)"""
+        if hasattr(obj, 'qtd_relatorios'):
+            return obj.qtd_relatorios
         return obj.relatorios.filter(ativo=True).count()
 
     def get_qtd_subpastas(self, obj):
-        """Retorna quantidade de subpastas"""
+        """Retorna quantidade de subpastas (anotada por PastaViewSet.get_queryset)"""
+        if hasattr(obj, 'qtd_subpastas'):
+            return obj.qtd_subpastas
         return obj.subpastas.count()
 
 
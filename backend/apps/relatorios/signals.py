@@ -0,0 +1,19 @@
+"""
+Invalidação do cache de permissões (services/permissoes.py).
+Qualquer gravação ou remoção de Permissao (views, admin, shell ou cascata
+ao remover relatório/usuário) invalida o mapa do usuário afetado.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from services.permissoes import invalidar_permissoes
+from .models import Permissao
+
+
+@receiver(post_save, sender=Permissao, dispatch_uid='permissoes_invalidar_ao_salvar')
+@receiver(post_delete, sender=Permissao, dispatch_uid='permissoes_invalidar_ao_remover')
+def invalidar_cache_permissoes(sender, instance, **kwargs):
+    # Só após o commit: antes disso outro processo poderia recarregar e
+    # guardar no cache o mapa antigo com a versão nova
+    usuario_id = instance.usuario_id
+    transaction.on_commit(lambda: invalidar_permissoes(usuario_id))
@@ -1,3 +1,373 @@
-from django.test import TestCase
+import tempfile
+from decimal import Decimal
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from apps.empresas.models import Empresa
+from apps.usuarios.models import Usuario
+from apps.conexoes.models import Conexao
+from core import crypto
+from services.admissao import FilaCheia, controle_admissao
+from services.parquet_exporter import ParquetExporter
+from services.permissoes import carregar_permissoes, verificar_permissoes
+from services.query_limit import aplicar_limite, montar_query_contagem
+from .models import Relatorio, Permissao
+from .serializers import ExportarRelatorioSerializer
 
-# Create your tests here.
+
+class ListagemRelatoriosQueriesTest(TestCase):
+    """A listagem de relatórios não pode fazer uma query por relatório (N+1)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', slug='empresa', max_relatorios=100)
+        cls.admin = Usuario.objects.create_user('admin@empresa.com', cls.empresa, 'senha', nome='Admin', role='ADMIN')
+        cls.usuario = Usuario.objects.create_user('usuario@empresa.com', cls.empresa, 'senha', nome='Usuário', role='USUARIO')
+        cls.conexao = Conexao.objects.create(
+            empresa=cls.empresa, nome='Conexão', tipo='POSTGRESQL', host='localhost',
+            porta=5432, database='db', usuario='u', senha_encriptada=''
+        )
+
+    def _criar_relatorios(self, quantidade: int, inicio: int = 0):
+        for i in range(inicio, inicio + quantidade):
+            relatorio = Relatorio.objects.create(
+                empresa=self.empresa, conexao=self.conexao, nome=f'Relatório {i}',
+                query_sql='SELECT 1', criado_por=self.admin
+            )
+            nivel = 'EXPORTAR' if i % 2 else 'VISUALIZAR'
+            Permissao.objects.create(relatorio=relatorio, usuario=self.usuario, nivel=nivel)
+
+    def _listar(self):
+        client = APIClient()
+        client.force_authenticate(self.usuario)
+        return client.get('/api/relatorios/')
+
+    def test_quantidade_de_queries_nao_cresce_com_relatorios(self):
+        self._criar_relatorios(2)
+        with CaptureQueriesContext(connection) as queries:
+            resposta = self._listar()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json()), 2)
+
+        self._criar_relatorios(30, inicio=2)
+        with self.assertNumQueries(len(queries)):
+            resposta = self._listar()
+        self.assertEqual(len(resposta.json()), 32)
+
+    def test_pode_exportar_segue_nivel_da_permissao(self):
+        self._criar_relatorios(4)
+        pode_exportar = {item['nome']: item['pode_exportar'] for item in self._listar().json()}
+        self.assertEqual(pode_exportar, {
+            'Relatório 0': False,
+            'Relatório 1': True,
+            'Relatório 2': False,
+            'Relatório 3': True,
+        })
+
+    def test_relatorio_sem_permissao_nao_aparece(self):
+        Relatorio.objects.create(
+            empresa=self.empresa, conexao=self.conexao, nome='Sem permissão',
+            query_sql='SELECT 1', criado_por=self.admin
+        )
+        self._criar_relatorios(1)
+        nomes = [item['nome'] for item in self._listar().json()]
+        self.assertEqual(nomes, ['Relatório 0'])
+
+
+class AplicarLimiteTest(SimpleTestCase):
+    """O limite vai para o banco sem quebrar a sintaxe de cada dialeto"""
+
+    CASOS = [
+        # SQL Server: TOP no primeiro SELECT
+        ('SQLSERVER', 'SELECT a FROM t', 'SELECT TOP 11 a FROM t'),
+        ('SQLSERVER', 'select distinct a from t order by a', 'select distinct TOP 11 a from t order by a'),
+        ('SQLSERVER', 'SELECT a FROM t ORDER BY a;', 'SELECT TOP 11 a FROM t ORDER BY a'),
+        # SQL Server: subquery quando TOP direto não é possível
+        ('SQLSERVER', 'SELECT TOP 5 a FROM t ORDER BY a',
+         'SELECT TOP 11 * FROM (\nSELECT TOP 5 a FROM t ORDER BY a\n) AS subquery'),
+        ('SQLSERVER', 'SELECT a FROM t UNION SELECT a FROM u',
+         'SELECT TOP 11 * FROM (\nSELECT a FROM t UNION SELECT a FROM u\n) AS subquery'),
+        ('SQLSERVER', 'SELECT a FROM t ORDER BY a OFFSET 10 ROWS FETCH NEXT 5 ROWS ONLY',
+         'SELECT TOP 11 * FROM (\nSELECT a FROM t ORDER BY a OFFSET 10 ROWS FETCH NEXT 5 ROWS ONLY\n) AS subquery'),
+        # ORDER BY em UNION não é aceito na subquery: fica sem limite no banco
+        ('SQLSERVER', 'SELECT a FROM t UNION SELECT a FROM u ORDER BY a',
+         'SELECT a FROM t UNION SELECT a FROM u ORDER BY a'),
+        # Palavras-chave em comentários, literais e identificadores são ignoradas
+        ('SQLSERVER', "-- SELECT TOP 1\nSELECT 'UNION' AS x, [offset] FROM t /* OFFSET */",
+         "-- SELECT TOP 1\nSELECT TOP 11 'UNION' AS x, [offset] FROM t"),
+        ('SQLSERVER', 'SELECT a FROM t WHERE b IN (SELECT TOP 1 b FROM u UNION SELECT 2)',
+         'SELECT TOP 11 a FROM t WHERE b IN (SELECT TOP 1 b FROM u UNION SELECT 2)'),
+        # PostgreSQL
+        ('POSTGRESQL', 'SELECT a FROM t;', 'SELECT a FROM t\nLIMIT 11'),
+        ('POSTGRESQL', 'SELECT DISTINCT a FROM t ORDER BY a', 'SELECT DISTINCT a FROM t ORDER BY a\nLIMIT 11'),
+        ('POSTGRESQL', 'SELECT a FROM t UNION SELECT a FROM u ORDER BY a',
+         'SELECT a FROM t UNION SELECT a FROM u ORDER BY a\nLIMIT 11'),
+        ('POSTGRESQL', 'SELECT a FROM t ORDER BY a LIMIT 5',
+         'SELECT * FROM (\nSELECT a FROM t ORDER BY a LIMIT 5\n) AS subquery LIMIT 11'),
+        ('POSTGRESQL', 'SELECT a FROM t OFFSET 5',
+         'SELECT * FROM (\nSELECT a FROM t OFFSET 5\n) AS subquery LIMIT 11'),
+        ('POSTGRESQL', 'SELECT a FROM t FETCH FIRST 5 ROWS ONLY',
+         'SELECT * FROM (\nSELECT a FROM t FETCH FIRST 5 ROWS ONLY\n) AS subquery LIMIT 11'),
+        ('POSTGRESQL', 'SELECT a FROM t FOR UPDATE',
+         'SELECT * FROM (\nSELECT a FROM t FOR UPDATE\n) AS subquery LIMIT 11'),
+        ('POSTGRESQL', "SELECT 'limit 1' AS x, \"offset\" FROM t -- LIMIT 2",
+         "SELECT 'limit 1' AS x, \"offset\" FROM t\nLIMIT 11"),
+        ('POSTGRESQL', "SELECT 'it''s; LIMIT 1' FROM t", "SELECT 'it''s; LIMIT 1' FROM t\nLIMIT 11"),
+        # Literal no fim da query não é confundido com espaço à direita
+        ('POSTGRESQL', "SELECT a FROM t WHERE b = 'x' ;", "SELECT a FROM t WHERE b = 'x'\nLIMIT 11"),
+        # MySQL
+        ('MYSQL', 'SELECT `limit` FROM t', 'SELECT `limit` FROM t\nLIMIT 11'),
+        ('MYSQL', 'SELECT a FROM (SELECT a FROM t LIMIT 3) s', 'SELECT a FROM (SELECT a FROM t LIMIT 3) s\nLIMIT 11'),
+        ('MYSQL', 'SELECT a FROM t LIMIT 5, 10',
+         'SELECT * FROM (\nSELECT a FROM t LIMIT 5, 10\n) AS subquery LIMIT 11'),
+        ('MYSQL', 'SELECT a FROM t FOR UPDATE',
+         'SELECT * FROM (\nSELECT a FROM t FOR UPDATE\n) AS subquery LIMIT 11'),
+    ]
+
+    def test_casos(self):
+        for tipo_banco, query, esperado in self.CASOS:
+            with self.subTest(tipo_banco=tipo_banco, query=query):
+                self.assertEqual(aplicar_limite(query, tipo_banco, 11), esperado)
+
+    def test_tipo_desconhecido_mantem_query(self):
+        self.assertEqual(aplicar_limite('SELECT a FROM t;', 'ORACLE', 11), 'SELECT a FROM t')
+
+
+class MontarQueryContagemTest(SimpleTestCase):
+    CASOS = [
+        ('SELECT a FROM t ORDER BY a', 'SELECT COUNT(*) FROM (\nSELECT a FROM t\n) AS subquery'),
+        # O ORDER BY define quais linhas o LIMIT/OFFSET pega: fica
+        ('SELECT a FROM t ORDER BY a LIMIT 5',
+         'SELECT COUNT(*) FROM (\nSELECT a FROM t ORDER BY a LIMIT 5\n) AS subquery'),
+        ('SELECT a FROM t ORDER BY a OFFSET 10 ROWS FETCH NEXT 5 ROWS ONLY',
+         'SELECT COUNT(*) FROM (\nSELECT a FROM t ORDER BY a OFFSET 10 ROWS FETCH NEXT 5 ROWS ONLY\n) AS subquery'),
+        ("SELECT a FROM t WHERE b = 'ORDER BY' -- fim\n;",
+         "SELECT COUNT(*) FROM (\nSELECT a FROM t WHERE b = 'ORDER BY'\n) AS subquery"),
+    ]
+
+    def test_casos(self):
+        for query, esperado in self.CASOS:
+            with self.subTest(query=query):
+                self.assertEqual(montar_query_contagem(query), esperado)
+
+
+class ExportarRelatorioSerializerTest(SimpleTestCase):
+
+    def test_aceita_so_filtros_e_formato(self):
+        serializer = ExportarRelatorioSerializer(data={'formato': 'parquet', 'paginado': True})
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data, {'filtros': {}, 'formato': 'parquet'})
+
+
+class CursorLotes:
+    """Cursor mínimo para os exportadores: numeric sem escala informada"""
+
+    def __init__(self, linhas: list):
+        self._linhas = list(linhas)
+        self.description = [('valor', None, None, None, None, None, None)]
+
+    def fetchmany(self, quantidade: int) -> list:
+        lote, self._linhas = self._linhas[:quantidade], self._linhas[quantidade:]
+        return lote
+
+
+class ParquetExporterTest(SimpleTestCase):
+
+    def test_lote_seguinte_com_mais_casas_decimais(self):
+        # O primeiro lote tem uma casa; os seguintes, como a/b, têm mais
+        linhas = [(Decimal('1.5'),), (Decimal('2'),), (Decimal('0.33333333333333333333'),), (None,)]
+        for formato in ('parquet', 'arrow'):
+            with self.subTest(formato=formato), tempfile.TemporaryFile() as arquivo:
+                exportador = ParquetExporter(formato)
+                exportador.TAMANHO_LOTE = 2
+                self.assertEqual(exportador._escrever(arquivo, CursorLotes(linhas), ['valor']), 4)
+
+                arquivo.seek(0)
+                if formato == 'parquet':
+                    tabela = pq.read_table(arquivo)
+                else:
+                    tabela = pa.ipc.open_file(arquivo).read_all()
+                self.assertEqual(tabela.column('valor').to_pylist(), [
+                    Decimal('1.5'), Decimal('2'), Decimal('0.333333333333333333'), None
+                ])
+
+
+@override_settings(DB_POOL_ATIVO=False, ADMISSAO_MAX_FILA=0, AUDITORIA_BUFFER_ATIVO=False)
+class ExportarAdmissaoTest(TestCase):
+    """Exportações ocupam vagas do limite de execuções simultâneas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        banco = connection.settings_dict
+        cls.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        cls.admin = Usuario.objects.create_user('admin@empresa.com', cls.empresa, 'senha', nome='Admin', role='ADMIN')
+        cls.conexao = Conexao.objects.create(
+            empresa=cls.empresa, nome='Banco de testes', tipo='POSTGRESQL',
+            host=banco['HOST'] or 'localhost', porta=int(banco['PORT'] or 5432),
+            database=banco['NAME'], usuario=banco['USER'],
+            senha_encriptada=crypto.encrypt(banco['PASSWORD'] or '', empresa_id=cls.empresa.id),
+            max_execucoes_simultaneas=1,
+        )
+        cls.relatorio = Relatorio.objects.create(
+            empresa=cls.empresa, conexao=cls.conexao, nome='Série', criado_por=cls.admin,
+            query_sql='SELECT n FROM generate_series(1, 3) AS n'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _exportar(self, formato: str):
+        return self.client.post(
+            f'/api/relatorios/{self.relatorio.pk}/exportar/', {'formato': formato}, format='json'
+        )
+
+    def test_sem_vaga_na_conexao_responde_429(self):
+        with controle_admissao.admitir(self.empresa, self.conexao):
+            for formato in ('xlsx', 'csv', 'parquet', 'arrow'):
+                with self.subTest(formato=formato):
+                    self.assertEqual(self._exportar(formato).status_code, 429)
+
+    def test_vaga_liberada_ao_fim_do_download(self):
+        resposta = self._exportar('csv')
+        self.assertEqual(resposta.status_code, 200)
+        # Cursor ainda aberto: a vaga continua ocupada até o fim do download
+        with self.assertRaises(FilaCheia), controle_admissao.admitir(self.empresa, self.conexao):
+            pass
+
+        self.assertEqual(b''.join(resposta.streaming_content).decode('utf-8-sig').split(), ['n', '1', '2', '3'])
+        with controle_admissao.admitir(self.empresa, self.conexao):
+            pass
+
+
+class PermissoesCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        cls.admin = Usuario.objects.create_user('admin@empresa.com', cls.empresa, 'senha', nome='Admin', role='ADMIN')
+        cls.usuario = Usuario.objects.create_user('usuario@empresa.com', cls.empresa, 'senha', nome='Usuário', role='USUARIO')
+        cls.conexao = Conexao.objects.create(
+            empresa=cls.empresa, nome='Conexão', tipo='POSTGRESQL', host='localhost',
+            porta=5432, database='db', usuario='u', senha_encriptada=''
+        )
+        cls.relatorios = [
+            Relatorio.objects.create(
+                empresa=cls.empresa, conexao=cls.conexao, nome=f'Relatório {i}',
+                query_sql='SELECT 1', criado_por=cls.admin
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def _usuario(self):
+        """Nova instância do usuário, como em outra requisição"""
+        return Usuario.objects.get(pk=self.usuario.pk)
+
+    def _conceder(self, relatorio, nivel):
+        with self.captureOnCommitCallbacks(execute=True):
+            Permissao.objects.update_or_create(relatorio=relatorio, usuario=self.usuario, defaults={'nivel': nivel})
+
+    def test_carregar_permissoes(self):
+        self._conceder(self.relatorios[0], 'EXPORTAR')
+        self.assertEqual(carregar_permissoes(self._usuario()), {str(self.relatorios[0].pk): 'EXPORTAR'})
+
+        ids = [relatorio.pk for relatorio in self.relatorios]
+        self.assertEqual(verificar_permissoes(ids, self._usuario()), {
+            str(ids[0]): {'tem_acesso': True, 'pode_exportar': True},
+            str(ids[1]): {'tem_acesso': False, 'pode_exportar': False},
+        })
+        self.assertTrue(all(p['pode_exportar'] for p in verificar_permissoes(ids, self.admin).values()))
+
+    def test_memo_da_requisicao_e_cache_compartilhado(self):
+        usuario = self._usuario()
+        with self.assertNumQueries(1):
+            carregar_permissoes(usuario)
+        with self.assertNumQueries(0):
+            carregar_permissoes(usuario)
+
+        outra_requisicao = self._usuario()
+        with self.assertNumQueries(0):
+            carregar_permissoes(outra_requisicao)
+        self.assertIsNotNone(getattr(outra_requisicao, '_mapa_permissoes', None))
+
+    def test_salvar_permissao_invalida_cache(self):
+        carregar_permissoes(self._usuario())
+        self._conceder(self.relatorios[0], 'VISUALIZAR')
+        self.assertEqual(carregar_permissoes(self._usuario()), {str(self.relatorios[0].pk): 'VISUALIZAR'})
+
+        self._conceder(self.relatorios[0], 'EXPORTAR')
+        self.assertEqual(carregar_permissoes(self._usuario()), {str(self.relatorios[0].pk): 'EXPORTAR'})
+
+    def test_remover_permissao_invalida_cache(self):
+        self._conceder(self.relatorios[0], 'VISUALIZAR')
+        self._conceder(self.relatorios[1], 'VISUALIZAR')
+        carregar_permissoes(self._usuario())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Permissao.objects.filter(relatorio=self.relatorios[0], usuario=self.usuario).delete()
+        self.assertEqual(carregar_permissoes(self._usuario()), {str(self.relatorios[1].pk): 'VISUALIZAR'})
+
+        # Remoção em cascata (relatório excluído) também invalida
+        with self.captureOnCommitCallbacks(execute=True):
+            self.relatorios[1].delete()
+        self.assertEqual(carregar_permissoes(self._usuario()), {})
+
+    def test_invalida_so_apos_commit(self):
+        carregar_permissoes(self._usuario())
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Permissao.objects.create(relatorio=self.relatorios[0], usuario=self.usuario, nivel='VISUALIZAR')
+        self.assertEqual(carregar_permissoes(self._usuario()), {})
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(carregar_permissoes(self._usuario()), {str(self.relatorios[0].pk): 'VISUALIZAR'})
+
+
+class BuscaRelatoriosSaveTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', slug='empresa')
+        cls.admin = Usuario.objects.create_user('admin@empresa.com', cls.empresa, 'senha', nome='Admin', role='ADMIN')
+        cls.conexao = Conexao.objects.create(
+            empresa=cls.empresa, nome='Conexão', tipo='POSTGRESQL', host='localhost',
+            porta=5432, database='db', usuario='u', senha_encriptada=''
+        )
+
+    def _criar(self):
+        return Relatorio.objects.create(
+            empresa=self.empresa, conexao=self.conexao, nome='Vendas por Região',
+            query_sql='SELECT * FROM dbo.Pedidos', criado_por=self.admin
+        )
+
+    def test_campos_de_busca_gravados_no_insert(self):
+        with self.assertNumQueries(1):
+            relatorio = self._criar()
+        self.assertNotIn('busca_vetor', relatorio.__dict__)
+        self.assertEqual(relatorio.nome_normalizado, 'vendas por regiao')
+        self.assertIn("'ped':4C", relatorio.busca_vetor)
+
+    def test_alteracao_atualiza_busca_no_mesmo_update(self):
+        relatorio = self._criar()
+        relatorio.nome = 'Faturamento Mensal'
+        with self.assertNumQueries(1):
+            relatorio.save(update_fields=['nome'])
+        self.assertNotIn('busca_vetor', relatorio.__dict__)
+        self.assertEqual(relatorio.nome_normalizado, 'faturamento mensal')
+        self.assertIn("'fatur':1A", relatorio.busca_vetor)
+
+    def test_outros_campos_nao_recalculam(self):
+        relatorio = self._criar()
+        relatorio.busca_vetor
+        relatorio.ativo = False
+        with CaptureQueriesContext(connection) as queries:
+            relatorio.save(update_fields=['ativo'])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('busca_vetor', queries[0]['sql'])
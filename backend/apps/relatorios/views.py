@@ -1,17 +1,23 @@
 """
 Views para a API de Relatórios.
 """
+import hashlib
+import json
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, parse_etags, quote_etag
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 from django.db import models
+from django.db.models.functions import Coalesce
 from .models import Relatorio, Pasta, Favorito, Permissao
 from .serializers import (
     RelatorioSerializer,
     ExecutarRelatorioSerializer,
+    ExportarRelatorioSerializer,
     FiltroSerializer,
     SalvarFiltrosSerializer,
     RelatorioComFiltrosSerializer,
@@ -22,7 +28,13 @@ from core.mixins import EmpresaQuerySetMixin
 from core.permissions import IsTecnicoOrAdmin, IsAdmin
 from services.query_executor import QueryExecutor
 from services.excel_exporter import ExcelExporter
+from services.csv_exporter import CsvExporter
+from services.parquet_exporter import ParquetExporter
 from services.permissoes import verificar_permissao
+from services.result_cache import ResultCache
+from services import query_template
+from services.admissao import FilaCheia
+from services.busca_relatorios import buscar as buscar_relatorios
 
 
 class RelatorioViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
@@ -30,6 +42,14 @@ class RelatorioViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
     serializer_class = RelatorioSerializer
     permission_classes = [IsAuthenticated]
 
+    CONTENT_TYPES_EXPORTACAO = {
+        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'csv': 'text/csv; charset=utf-8',
+        'csv.gz': 'application/gzip',
+        'parquet': 'application/vnd.apache.parquet',
+        'arrow': 'application/vnd.apache.arrow.file',
+    }
+
     def get_serializer_class(self):
         """Usa RelatorioComFiltrosSerializer quando buscar um relatório específico"""
         if self.action == 'retrieve':
@@ -48,18 +68,20 @@ class RelatorioViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
         if user.role in ['ADMIN', 'TECNICO']:
             qs = qs.select_related('conexao')
         else:
-            # Usuário comum só vê relatórios com permissão explícita
-            qs = qs.filter(
-                permissoes__usuario=user
-            ).select_related('conexao').distinct()
-
-        # Filtro de busca por nome/descrição
+            # Usuário comum só vê relatórios com permissão explícita.
+            # O nível vem anotado na mesma query (lido por RelatorioSerializer.get_pode_exportar)
+            nivel = Permissao.objects.filter(
+                relatorio=models.OuterRef('pk'),
+                usuario=user
+            ).values('nivel')[:1]
+            qs = qs.annotate(
+                nivel_permissao=models.Subquery(nivel)
+            ).filter(nivel_permissao__isnull=False).select_related('conexao')
+
+        # Busca por nome, descrição e tabelas da query (ordenada por relevância)
         busca = self.request.query_params.get('busca')
         if busca:
-            qs = qs.filter(
-                models.Q(nome__icontains=busca) |
-                models.Q(descricao__icontains=busca)
-            )
+            qs = buscar_relatorios(qs, busca)
 
         # Filtro por pasta
         pasta_id = self.request.query_params.get('pasta_id')
@@ -74,6 +96,12 @@ class RelatorioViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
             return [IsAuthenticated(), IsTecnicoOrAdmin()]
         return super().get_permissions()
 
+    def perform_update(self, serializer):
+        """Alterar o relatório invalida os resultados e o template da query em cache"""
+        relatorio = serializer.save()
+        ResultCache(relatorio).invalidar()
+        query_template.invalidar(relatorio.id)
+
     @action(detail=True, methods=['post'])
     def executar(self, request, pk=None):
         """Executa o relatório e retorna dados"""
@@ -91,10 +119,25 @@ class RelatorioViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
 
         executor = QueryExecutor(relatorio)
-        resultado = executor.executar(
-            usuario=request.user,
-            filtros_valores=serializer.validated_data.get('filtros')
-        )
+        parametros = {
+            'usuario': request.user,
+            'filtros_valores': serializer.validated_data.get('filtros'),
+            'contar_total': serializer.validated_data.get('contar_total', True),
+            'formato_dados': serializer.validated_data.get('formato_dados', 'colunar'),
+            'paginado': serializer.validated_data.get('paginado', False),
+        }
+
+        # Modo assíncrono: retorna o execucao_id para acompanhar em /historico/{id}/status/
+        if serializer.validated_data.get('assincrono'):
+            resultado = executor.executar_assincrono(**parametros)
+            if not resultado['sucesso']:
+                return Response(resultado)
+            return Response(resultado, status=status.HTTP_202_ACCEPTED)
+
+        try:
+            resultado = executor.executar(**parametros)
+        except FilaCheia as e:
+            return Response({'sucesso': False, 'erro': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
 
         return Response(resultado)
 
@@ -104,16 +147,19 @@ class RelatorioViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
         relatorio = self.get_object()
 
         executor = QueryExecutor(relatorio)
-        resultado = executor.executar(
-            usuario=request.user,
-            limite=10
-        )
+        try:
+            resultado = executor.executar(
+                usuario=request.user,
+                limite=10
+            )
+        except FilaCheia as e:
+            return Response({'sucesso': False, 'erro': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
 
         return Response(resultado)
 
     @action(detail=True, methods=['post'])
     def exportar(self, request, pk=None):
-        """Exporta relatório para Excel"""
+        """Exporta relatório para Excel (xlsx), CSV (csv, csv.gz), Parquet ou Arrow"""
         relatorio = self.get_object()
 
         # Verificar permissão de exportar
@@ -131,29 +177,61 @@ class RelatorioViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
             )
 
         try:
-            # Pegar filtros do request
-            serializer = ExecutarRelatorioSerializer(data=request.data)
+            # Pegar filtros e formato do request
+            serializer = ExportarRelatorioSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
             filtros = serializer.validated_data.get('filtros', {})
-
-            exporter = ExcelExporter()
-            excel_file = exporter.exportar(relatorio, filtros=filtros)
+            formato = serializer.validated_data.get('formato', 'xlsx')
 
             timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{relatorio.nome}_{timestamp}.xlsx"
+            filename = f"{relatorio.nome}_{timestamp}.{formato}"
+
+            if formato in ('csv', 'csv.gz'):
+                exporter = CsvExporter(comprimir=formato == 'csv.gz')
+                conteudo = exporter.exportar(relatorio, filtros=filtros, usuario=request.user)
 
-            response = HttpResponse(
-                excel_file.read(),
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                response = StreamingHttpResponse(
+                    conteudo,
+                    content_type=self.CONTENT_TYPES_EXPORTACAO[formato]
+                )
+                response['Content-Disposition'] = content_disposition_header(True, filename)
+                return response
+
+            if formato in ('parquet', 'arrow'):
+                exporter = ParquetExporter(formato=formato)
+            else:
+                exporter = ExcelExporter()
+            arquivo = exporter.exportar(relatorio, filtros=filtros, usuario=request.user)
+
+            # FileResponse envia em blocos e fecha (remove) o arquivo temporário ao final
+            return FileResponse(
+                arquivo,
+                as_attachment=True,
+                filename=filename,
+                content_type=self.CONTENT_TYPES_EXPORTACAO[formato]
             )
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
+        except FilaCheia as e:
+            return Response({'erro': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
         except Exception as e:
             return Response(
                 {'erro': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=True, methods=['post'], url_path='limpar-cache')
+    def limpar_cache(self, request, pk=None):
+        """Invalida os resultados em cache do relatório"""
+        relatorio = self.get_object()
+
+        if request.user.role not in ['ADMIN', 'TECNICO']:
+            return Response(
+                {'erro': 'Você não tem permissão para limpar o cache deste relatório'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        ResultCache(relatorio).invalidar()
+        return Response({'success': True})
+
     @action(detail=True, methods=['get', 'put'], url_path='filtros')
     def filtros(self, request, pk=None):
         """
@@ -177,6 +255,7 @@ class RelatorioViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
             serializer = SalvarFiltrosSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
             serializer.save(relatorio)
+            ResultCache(relatorio).invalidar()
 
             return Response({'success': True})
 
@@ -262,23 +341,76 @@ class PastaViewSet(EmpresaQuerySetMixin, viewsets.ModelViewSet):
         return [IsAuthenticated()]
 
     def get_queryset(self):
-        """Retorna pastas da empresa do usuário"""
+        """
+        Retorna pastas da empresa do usuário, com qtd_relatorios e
+        qtd_subpastas anotadas (subqueries na mesma consulta)
+        """
         user = self.request.user
         qs = Pasta.objects.filter(empresa_id=user.empresa_id)
 
+        relatorios = Relatorio.objects.filter(pasta=models.OuterRef('pk'), ativo=True)
         if user.role not in ['ADMIN', 'TECNICO']:
             # Usuário comum só vê pastas que contêm relatórios que ele tem acesso
-            qs = qs.filter(
-                relatorios__permissoes__usuario=user,
-                relatorios__ativo=True
-            ).distinct()
+            relatorios = relatorios.filter(permissoes__usuario=user)
+            qs = qs.filter(models.Exists(relatorios))
 
-        return qs
+        return qs.annotate(
+            qtd_relatorios=self._contagem(relatorios, 'pasta'),
+            qtd_subpastas=self._contagem(
+                Pasta.objects.filter(pasta_pai=models.OuterRef('pk')), 'pasta_pai'
+            )
+        )
+
+    @staticmethod
+    def _contagem(qs, campo: str):
+        """COUNT(*) correlacionado agrupado por campo (0 quando não houver linhas)"""
+        contagem = qs.order_by().values(campo).annotate(total=models.Count('*')).values('total')
+        return Coalesce(models.Subquery(contagem), 0)
 
     def perform_create(self, serializer):
         """Cria pasta vinculada à empresa"""
         serializer.save(empresa_id=self.request.user.empresa_id)
 
+    @action(detail=False, methods=['get'])
+    def arvore(self, request):
+        """
+        Retorna todas as pastas visíveis já organizadas em árvore, em uma
+        única consulta. Cada nó tem qtd_relatorios, qtd_subpastas e subpastas.
+
+        Para usuário comum, pastas cujo pai não é visível aparecem na raiz.
+        Responde 304 quando o If-None-Match coincide com o ETag da árvore.
+        """
+        pastas = list(self.get_queryset().values(
+            'id', 'nome', 'pasta_pai', 'criado_em', 'qtd_relatorios'
+        ))
+
+        nos = {}
+        for pasta in pastas:
+            nos[pasta['id']] = {**pasta, 'qtd_subpastas': 0, 'subpastas': []}
+
+        raiz = []
+        for pasta in pastas:
+            no = nos[pasta['id']]
+            pai = nos.get(pasta['pasta_pai'])
+            if pai is None:
+                raiz.append(no)
+            else:
+                pai['subpastas'].append(no)
+                pai['qtd_subpastas'] += 1
+
+        conteudo = json.dumps(raiz, cls=DjangoJSONEncoder, sort_keys=True)
+        etag = quote_etag(hashlib.md5(conteudo.encode()).hexdigest())
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            resposta = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            resposta = Response(raiz)
+
+        resposta['ETag'] = etag
+        # Sempre revalidar: o navegador reaproveita a cópia local quando recebe 304
+        resposta['Cache-Control'] = 'private, no-cache'
+        return resposta
+
 
 class FavoritoViewSet(viewsets.ViewSet):
     """ViewSet para gerenciamento de favoritos"""
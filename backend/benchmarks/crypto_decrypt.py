@@ -0,0 +1,61 @@
+"""
+Micro-benchmark do custo por chamada de decrypt().
+
+Compara a derivação PBKDF2 a cada chamada (comportamento antigo)
+com a chave memorizada e com o cache de textos descriptografados.
+
+Uso (a partir de backend/):
+    python benchmarks/crypto_decrypt.py [iteracoes]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+django.setup()
+
+from django.conf import settings
+from core import crypto
+
+
+def medir(nome, funcao, iteracoes):
+    inicio = time.perf_counter()
+    for _ in range(iteracoes):
+        funcao()
+    ms = (time.perf_counter() - inicio) * 1000 / iteracoes
+    print(f"{nome:<40} {ms:>10.4f} ms/chamada")
+    return ms
+
+
+def main():
+    iteracoes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    if not settings.ENCRYPTION_KEY:
+        settings.ENCRYPTION_KEY = 'chave-benchmark'
+
+    token = crypto.encrypt('senha-do-banco')
+
+    def antes():
+        # Comportamento anterior: PBKDF2 a cada chamada
+        fernet = crypto._derivar_fernet.__wrapped__(settings.ENCRYPTION_KEY, crypto.SALT_PADRAO)
+        fernet.decrypt(token.encode()).decode()
+
+    def depois_sem_cache():
+        crypto.invalidar_cache()
+        crypto.decrypt(token)
+
+    def depois_com_cache():
+        crypto.decrypt(token)
+
+    print(f"📊 decrypt() - {iteracoes} iterações")
+    base = medir('Antes (PBKDF2 por chamada)', antes, iteracoes)
+    sem_cache = medir('Chave memorizada (sem cache de texto)', depois_sem_cache, iteracoes * 100)
+    com_cache = medir('Chave memorizada + cache de texto', depois_com_cache, iteracoes * 100)
+    print(f"✅ Ganho: {base / sem_cache:,.0f}x (chave) / {base / com_cache:,.0f}x (cache)")
+
+
+if __name__ == '__main__':
+    main()
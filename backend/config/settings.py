@@ -5,6 +5,7 @@ Django settings for ForgeReports project.
 from pathlib import Path
 from datetime import timedelta
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # Third party
     'rest_framework',
     'rest_framework_simplejwt',
@@ -146,6 +148,76 @@ SIMPLE_JWT = {
 
 # Encryption
 ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY', '')
+# Chaves anteriores (separadas por vírgula): só descriptografam, até rodar rotacionar_segredos
+ENCRYPTION_KEYS_ANTIGAS = [c for c in os.getenv('ENCRYPTION_KEYS_ANTIGAS', '').split(',') if c]
+# Tempo que senhas descriptografadas ficam em cache na memória (0 desativa)
+CRYPTO_CACHE_TTL_SEGUNDOS = int(os.getenv('CRYPTO_CACHE_TTL_SEGUNDOS', 300))
+
+# Cache (locmem por padrão; use Redis/arquivo para compartilhar entre processos)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'forgereports'),
+    }
+}
+
+# Cache de resultados de relatórios (ver Relatorio.cache_ttl_segundos)
+RESULT_CACHE_MAX_ITEM_BYTES = int(os.getenv('RESULT_CACHE_MAX_ITEM_BYTES', 5 * 1024 * 1024))
+RESULT_CACHE_MAX_BYTES_POR_RELATORIO = int(os.getenv('RESULT_CACHE_MAX_BYTES_POR_RELATORIO', 50 * 1024 * 1024))
+
+# Agrupamento de execuções idênticas simultâneas
+COALESCING_ATIVO = os.getenv('COALESCING_ATIVO', 'True') == 'True'
+# Entre processos usa advisory lock no PostgreSQL e exige CACHES compartilhado (ex.: Redis)
+COALESCING_ENTRE_PROCESSOS = os.getenv('COALESCING_ENTRE_PROCESSOS', 'False') == 'True'
+COALESCING_TIMEOUT_SEGUNDOS = int(os.getenv('COALESCING_TIMEOUT_SEGUNDOS', 300))
+COALESCING_RESULTADO_TTL_SEGUNDOS = int(os.getenv('COALESCING_RESULTADO_TTL_SEGUNDOS', 30))
+
+# Mapa de permissões por usuário em cache (ver services/permissoes.py)
+PERMISSOES_CACHE_TTL_SEGUNDOS = int(os.getenv('PERMISSOES_CACHE_TTL_SEGUNDOS', 300))
+
+# Queries de relatórios pré-processadas em memória (ver services/query_template.py)
+QUERY_TEMPLATE_CACHE_MAX = int(os.getenv('QUERY_TEMPLATE_CACHE_MAX', 1000))
+
+# Execução assíncrona de relatórios (pool de threads por processo)
+EXECUCAO_ASSINCRONA_WORKERS = int(os.getenv('EXECUCAO_ASSINCRONA_WORKERS', 4))
+EXECUCAO_RESULTADO_TTL_SEGUNDOS = int(os.getenv('EXECUCAO_RESULTADO_TTL_SEGUNDOS', 3600))
+# PENDENTE/EXECUTANDO há mais tempo que isso vira ERRO (limpar_resultados)
+EXECUCAO_ABANDONADA_SEGUNDOS = int(os.getenv('EXECUCAO_ABANDONADA_SEGUNDOS', 6 * 3600))
+
+# Resultados gravados em disco para paginação e execuções assíncronas
+# (ver services/result_spill.py); compartilhado entre os processos da aplicação
+SPILL_DIR = os.getenv('SPILL_DIR', os.path.join(tempfile.gettempdir(), 'forgereports-resultados'))
+SPILL_TTL_SEGUNDOS = int(os.getenv('SPILL_TTL_SEGUNDOS', 3600))
+
+# Controle de admissão (limites em Empresa/Conexao.max_execucoes_simultaneas, por processo)
+ADMISSAO_MAX_FILA = int(os.getenv('ADMISSAO_MAX_FILA', 20))
+ADMISSAO_TIMEOUT_FILA_SEGUNDOS = int(os.getenv('ADMISSAO_TIMEOUT_FILA_SEGUNDOS', 60))
+
+# Pool de conexões com bancos externos (por Conexao, por processo)
+DB_POOL_ATIVO = os.getenv('DB_POOL_ATIVO', 'True') == 'True'
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 0))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 5))
+DB_POOL_OCIOSO_MAX_SEGUNDOS = int(os.getenv('DB_POOL_OCIOSO_MAX_SEGUNDOS', 300))
+DB_POOL_TIMEOUT_ESPERA_SEGUNDOS = int(os.getenv('DB_POOL_TIMEOUT_ESPERA_SEGUNDOS', 30))
+DB_POOL_VALIDAR_APOS_SEGUNDOS = int(os.getenv('DB_POOL_VALIDAR_APOS_SEGUNDOS', 0))
+
+# Gravação do histórico de execuções em lote, fora da requisição (ver services/auditoria.py)
+AUDITORIA_BUFFER_ATIVO = os.getenv('AUDITORIA_BUFFER_ATIVO', 'True') == 'True'
+AUDITORIA_LOTE = int(os.getenv('AUDITORIA_LOTE', 200))
+AUDITORIA_INTERVALO_SEGUNDOS = float(os.getenv('AUDITORIA_INTERVALO_SEGUNDOS', 2))
+
+# Histórico de execuções particionado por mês (ver services/particoes.py)
+# Retenção em meses completos além do mês atual (0 = sem limite); Empresa.retencao_historico_meses sobrepõe
+HISTORICO_RETENCAO_MESES = int(os.getenv('HISTORICO_RETENCAO_MESES', 12))
+HISTORICO_PARTICOES_FUTURAS = int(os.getenv('HISTORICO_PARTICOES_FUTURAS', 3))
+# Schema que recebe as partições desanexadas (gerenciar_particoes sem --apagar)
+HISTORICO_SCHEMA_ARQUIVO = os.getenv('HISTORICO_SCHEMA_ARQUIVO', 'arquivo')
+
+# Agendador de relatórios (python manage.py run_scheduler, ver services/agendador.py)
+AGENDADOR_WORKERS = int(os.getenv('AGENDADOR_WORKERS', 4))
+AGENDADOR_INTERVALO_SEGUNDOS = float(os.getenv('AGENDADOR_INTERVALO_SEGUNDOS', 15))
+# Resultado das execuções agendadas em SPILL_DIR (em vez de SPILL_TTL_SEGUNDOS)
+AGENDAMENTO_RESULTADO_TTL_SEGUNDOS = int(os.getenv('AGENDAMENTO_RESULTADO_TTL_SEGUNDOS', 7 * 24 * 3600))
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -1,45 +1,151 @@
 """
 Módulo de criptografia para senhas de conexões de banco.
 Utiliza Fernet (AES) para criptografia simétrica.
+
+A derivação PBKDF2 (100.000 iterações) é feita uma única vez por
+(ENCRYPTION_KEY, salt) e memorizada; textos descriptografados ficam em
+um cache curto em memória para não repetir o trabalho a cada execução.
+
+Rotação: textos gerados com o salt padrão ou com chaves anteriores
+(ENCRYPTION_KEYS_ANTIGAS) continuam legíveis e são recriptografados com
+a chave atual da empresa por python manage.py rotacionar_segredos.
 """
 import base64
-from cryptography.fernet import Fernet
+import threading
+import time
+from functools import lru_cache
+from cryptography.fernet import Fernet, MultiFernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from django.conf import settings
 
+SALT_PADRAO = b'forgereports_salt'
+ITERACOES_KDF = 100000
 
-def get_fernet():
-    """Gera instância Fernet com chave derivada"""
-    if not settings.ENCRYPTION_KEY:
-        raise ValueError("ENCRYPTION_KEY não configurada no settings")
+# Cache de textos descriptografados: chave -> (texto, expira_em)
+_cache_decrypt = {}
+_cache_lock = threading.Lock()
+CACHE_MAX_ITENS = 256
 
-    key = settings.ENCRYPTION_KEY.encode()
 
-    # Derivar chave de 32 bytes usando PBKDF2
+@lru_cache(maxsize=64)
+def _derivar_fernet(encryption_key: str, salt: bytes) -> Fernet:
+    """Deriva a chave de 32 bytes via PBKDF2 (custoso, por isso memorizado)"""
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
-        salt=b'forgereports_salt',  # Salt fixo (em produção, considere salt por empresa)
-        iterations=100000,
+        salt=salt,
+        iterations=ITERACOES_KDF,
     )
-    derived_key = base64.urlsafe_b64encode(kdf.derive(key))
+    derived_key = base64.urlsafe_b64encode(kdf.derive(encryption_key.encode()))
     return Fernet(derived_key)
 
 
-def encrypt(text: str) -> str:
+def _salt_empresa(empresa_id) -> bytes:
+    """Salt específico da empresa"""
+    return SALT_PADRAO + b':' + str(empresa_id).encode()
+
+
+def get_fernet(empresa_id=None):
+    """
+    Retorna instância Fernet com chave derivada.
+
+    Args:
+        empresa_id: Se informado, usa o salt da empresa; senão o salt padrão
+    """
+    if not settings.ENCRYPTION_KEY:
+        raise ValueError("ENCRYPTION_KEY não configurada no settings")
+
+    salt = _salt_empresa(empresa_id) if empresa_id else SALT_PADRAO
+    return _derivar_fernet(settings.ENCRYPTION_KEY, salt)
+
+
+def get_multi_fernet(empresa_id=None) -> MultiFernet:
+    """
+    MultiFernet da empresa: criptografa com a chave atual (salt da empresa)
+    e ainda descriptografa textos gerados com o salt padrão e com as chaves
+    de ENCRYPTION_KEYS_ANTIGAS.
+    """
+    fernets = [get_fernet(empresa_id)]
+    salts = [_salt_empresa(empresa_id), SALT_PADRAO] if empresa_id else [SALT_PADRAO]
+    for chave in [settings.ENCRYPTION_KEY, *getattr(settings, 'ENCRYPTION_KEYS_ANTIGAS', [])]:
+        for salt in salts:
+            fernet = _derivar_fernet(chave, salt)
+            if fernet not in fernets:
+                fernets.append(fernet)
+    return MultiFernet(fernets)
+
+
+def encrypt(text: str, empresa_id=None) -> str:
     """Criptografa texto e retorna string base64"""
     if not text:
         return ''
 
-    f = get_fernet()
+    f = get_fernet(empresa_id)
     return f.encrypt(text.encode()).decode()
 
 
-def decrypt(encrypted_text: str) -> str:
-    """Descriptografa texto de string base64"""
+def decrypt(encrypted_text: str, empresa_id=None) -> str:
+    """
+    Descriptografa texto de string base64.
+    Resultados ficam em cache por CRYPTO_CACHE_TTL_SEGUNDOS.
+    """
     if not encrypted_text:
         return ''
 
-    f = get_fernet()
-    return f.decrypt(encrypted_text.encode()).decode()
+    chave = (settings.ENCRYPTION_KEY, str(empresa_id or ''), encrypted_text)
+    agora = time.monotonic()
+
+    with _cache_lock:
+        item = _cache_decrypt.get(chave)
+    if item and item[1] > agora:
+        return item[0]
+
+    text = get_multi_fernet(empresa_id).decrypt(encrypted_text.encode()).decode()
+
+    ttl = getattr(settings, 'CRYPTO_CACHE_TTL_SEGUNDOS', 300)
+    if ttl > 0:
+        with _cache_lock:
+            if len(_cache_decrypt) >= CACHE_MAX_ITENS:
+                _remover_expirados(agora)
+            if len(_cache_decrypt) >= CACHE_MAX_ITENS:
+                # Remove o item mais antigo (dicts mantêm ordem de inserção)
+                _cache_decrypt.pop(next(iter(_cache_decrypt)))
+            _cache_decrypt[chave] = (text, agora + ttl)
+
+    return text
+
+
+def rotacionar(encrypted_text: str, empresa_id) -> str:
+    """
+    Recriptografa um texto com a chave atual da empresa.
+    Aceita textos gerados com o salt padrão, com o salt da empresa ou com
+    uma chave de ENCRYPTION_KEYS_ANTIGAS.
+    """
+    if not encrypted_text:
+        return ''
+
+    token = get_multi_fernet(empresa_id).rotate(encrypted_text.encode()).decode()
+    invalidar_cache(encrypted_text)
+    return token
+
+
+def invalidar_cache(encrypted_text: str = None):
+    """
+    Remove textos descriptografados do cache.
+
+    Args:
+        encrypted_text: Texto criptografado a remover (None limpa tudo)
+    """
+    with _cache_lock:
+        if encrypted_text is None:
+            _cache_decrypt.clear()
+            return
+        for chave in [c for c in _cache_decrypt if c[2] == encrypted_text]:
+            del _cache_decrypt[chave]
+
+
+def _remover_expirados(agora: float):
+    """Remove itens expirados do cache (chamado com lock)"""
+    for chave in [c for c, (_, expira_em) in _cache_decrypt.items() if expira_em <= agora]:
+        del _cache_decrypt[chave]
@@ -0,0 +1,89 @@
+"""
+Paginação por cursor (keyset) para listagens grandes, como o histórico de
+execuções. O cursor é opaco para o cliente: base64 de [data, id] da última
+linha da página.
+"""
+import base64
+import json
+import uuid
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) em ordem decrescente de (campo_data, id).
+
+    Cada página filtra a partir da última linha da anterior em vez de usar
+    OFFSET, então o custo é o mesmo na primeira página ou na milésima,
+    desde que haja índice terminando em campo_data.
+
+    Query params:
+        limite: Itens por página (padrão: limite_padrao, máximo: limite_maximo)
+        cursor: Valor de proximo_cursor da página anterior
+
+    Resposta:
+        {'resultados': [...], 'proximo_cursor': str | None, 'possui_mais': bool}
+    """
+    campo_data = 'iniciado_em'
+    limite_padrao = 50
+    limite_maximo = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        limite = self._limite(request)
+        queryset = queryset.order_by(f'-{self.campo_data}', '-id')
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            data, id_ = self._decodificar(cursor)
+            queryset = queryset.filter(
+                Q(**{f'{self.campo_data}__lt': data})
+                | Q(**{self.campo_data: data, 'id__lt': id_})
+            )
+
+        # Uma linha a mais indica se existe próxima página
+        itens = list(queryset[:limite + 1])
+        self.possui_mais = len(itens) > limite
+        itens = itens[:limite]
+
+        self.proximo_cursor = None
+        if self.possui_mais:
+            ultimo = itens[-1]
+            self.proximo_cursor = self._codificar(getattr(ultimo, self.campo_data), ultimo.id)
+
+        return itens
+
+    def get_paginated_response(self, data):
+        return Response({
+            'resultados': data,
+            'proximo_cursor': self.proximo_cursor,
+            'possui_mais': self.possui_mais,
+        })
+
+    def _limite(self, request) -> int:
+        try:
+            limite = int(request.query_params.get('limite', self.limite_padrao))
+        except ValueError:
+            raise ValidationError({'limite': 'Deve ser um número'})
+        return min(max(limite, 1), self.limite_maximo)
+
+    @staticmethod
+    def _codificar(data, id_) -> str:
+        conteudo = json.dumps([data.isoformat(), str(id_)])
+        return base64.urlsafe_b64encode(conteudo.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def _decodificar(cursor: str):
+        try:
+            preenchimento = '=' * (-len(cursor) % 4)
+            data, id_ = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+            data = parse_datetime(data)
+            id_ = uuid.UUID(id_)
+        except (ValueError, TypeError):
+            raise ValidationError({'cursor': 'Cursor inválido'})
+        if data is None:
+            raise ValidationError({'cursor': 'Cursor inválido'})
+        return data, id_
@@ -0,0 +1,135 @@
+"""
+Controle de admissão de execuções de relatórios.
+Limita quantas queries rodam ao mesmo tempo por Empresa e por Conexao,
+com fila de espera FIFO limitada.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from django.conf import settings
+
+
+class FilaCheia(Exception):
+    """Limite de execuções simultâneas atingido e fila de espera cheia (ou espera esgotada)"""
+
+
+class LimiteConcorrencia:
+    """
+    Semáforo com fila FIFO limitada.
+
+    - Até max_ativas execuções simultâneas (0 = sem limite)
+    - Excedentes aguardam por ordem de chegada, até max_fila na fila
+    - Com a fila cheia, a entrada é recusada na hora
+    """
+
+    def __init__(self, max_ativas: int, max_fila: int):
+        self.max_ativas = max_ativas
+        self.max_fila = max_fila
+        self._ativas = 0
+        self._fila = deque()
+        self._cond = threading.Condition()
+
+    def _tem_vaga(self) -> bool:
+        return self.max_ativas <= 0 or self._ativas < self.max_ativas
+
+    def adquirir(self, timeout: float):
+        """
+        Ocupa uma vaga, aguardando na fila se necessário.
+
+        Raises:
+            FilaCheia: Se a fila estiver cheia ou a espera passar de timeout
+        """
+        with self._cond:
+            if self._tem_vaga() and not self._fila:
+                self._ativas += 1
+                return
+
+            if len(self._fila) >= self.max_fila:
+                raise FilaCheia('Limite de execuções simultâneas atingido. Tente novamente em instantes.')
+
+            senha = object()
+            self._fila.append(senha)
+            try:
+                admitido = self._cond.wait_for(
+                    lambda: self._fila[0] is senha and self._tem_vaga(),
+                    timeout
+                )
+                if not admitido:
+                    raise FilaCheia('Tempo de espera na fila de execução esgotado. Tente novamente em instantes.')
+                self._ativas += 1
+            finally:
+                self._fila.remove(senha)
+                # O próximo da fila pode ter vaga agora
+                self._cond.notify_all()
+
+    def liberar(self):
+        """Libera a vaga e acorda a fila"""
+        with self._cond:
+            self._ativas -= 1
+            self._cond.notify_all()
+
+    def atualizar(self, max_ativas: int):
+        """Aplica alteração do limite configurado"""
+        with self._cond:
+            if max_ativas != self.max_ativas:
+                self.max_ativas = max_ativas
+                self._cond.notify_all()
+
+
+class ControleAdmissao:
+    """
+    Limites por Empresa (Empresa.max_execucoes_simultaneas) e por Conexao
+    (Conexao.max_execucoes_simultaneas). Os limites valem por processo,
+    como o pool de conexões.
+    """
+
+    def __init__(self):
+        self._limites = {}
+        self._lock = threading.Lock()
+
+    def _limite(self, chave: str, max_ativas: int) -> LimiteConcorrencia:
+        with self._lock:
+            limite = self._limites.get(chave)
+            if limite is None:
+                limite = self._limites[chave] = LimiteConcorrencia(
+                    max_ativas,
+                    getattr(settings, 'ADMISSAO_MAX_FILA', 20)
+                )
+        limite.atualizar(max_ativas)
+        return limite
+
+    @contextmanager
+    def admitir(self, empresa, conexao):
+        """
+        Ocupa uma vaga da empresa e uma da conexão durante o bloco with.
+        A vaga da empresa é sempre obtida primeiro, evitando impasse.
+
+        Yields:
+            Tempo de espera na fila em milissegundos
+
+        Raises:
+            FilaCheia: Se alguma das filas estiver cheia ou a espera esgotar
+        """
+        timeout = getattr(settings, 'ADMISSAO_TIMEOUT_FILA_SEGUNDOS', 60)
+        limite_empresa = self._limite(f'empresa:{empresa.id}', empresa.max_execucoes_simultaneas)
+        limite_conexao = self._limite(f'conexao:{conexao.id}', conexao.max_execucoes_simultaneas)
+
+        inicio = time.monotonic()
+        limite_empresa.adquirir(timeout)
+        try:
+            restante = max(timeout - (time.monotonic() - inicio), 0)
+            limite_conexao.adquirir(restante)
+        except BaseException:
+            limite_empresa.liberar()
+            raise
+
+        try:
+            yield int((time.monotonic() - inicio) * 1000)
+        finally:
+            limite_conexao.liberar()
+            limite_empresa.liberar()
+
+
+# Instância única por processo
+controle_admissao = ControleAdmissao()
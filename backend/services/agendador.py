@@ -0,0 +1,237 @@
+"""
+Agendador de relatórios (Agendamento).
+
+A próxima execução é calculada no fuso da empresa (Empresa.fuso_horario,
+padrão TIME_ZONE) e gravada em Agendamento.proxima_execucao. O processo do
+agendador (python manage.py run_scheduler) busca os vencidos pelo índice
+(ativo, proxima_execucao) com SELECT ... FOR UPDATE SKIP LOCKED, já avança
+proxima_execucao na mesma transação e só então executa, num pool de
+threads limitado. Assim vários processos do agendador podem rodar juntos
+sem executar o mesmo agendamento duas vezes.
+
+Execuções perdidas (agendador parado) não são repetidas: o agendamento
+vencido roda uma vez e volta para o próximo horário a partir de agora.
+
+Cada execução grava o resultado completo em disco (modo paginado, ver
+services/result_spill.py), ligado ao agendamento por
+ExecucaoAgendada.execucao e lido por /historico/{id}/pagina/; o arquivo é
+mantido por AGENDAMENTO_RESULTADO_TTL_SEGUNDOS (limpar_resultados).
+"""
+import calendar
+import logging
+import threading
+import zoneinfo
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Dias verificados à frente; cobre o mês mais longo sem o dia pedido
+MAX_DIAS_BUSCA = 400
+
+
+def fuso(empresa) -> zoneinfo.ZoneInfo:
+    """Fuso da empresa (ou TIME_ZONE do sistema)"""
+    return zoneinfo.ZoneInfo(getattr(empresa, 'fuso_horario', '') or settings.TIME_ZONE)
+
+
+def _executa_no_dia(agendamento, dia: date) -> bool:
+    if agendamento.frequencia == 'SEMANAL':
+        # dias_semana usa 0=Domingo; date.weekday() usa 0=Segunda
+        return (dia.weekday() + 1) % 7 in (agendamento.dias_semana or [])
+    if agendamento.frequencia == 'MENSAL':
+        # Dia 31 (ou 29/30) em meses mais curtos vira o último dia do mês
+        ultimo = calendar.monthrange(dia.year, dia.month)[1]
+        return dia.day == min(agendamento.dia_mes or 1, ultimo)
+    return True
+
+
+def calcular_proxima_execucao(agendamento, depois: datetime = None) -> datetime | None:
+    """
+    Primeiro horário de execução estritamente depois de `depois` (padrão: agora).
+
+    O horário (hora_execucao) vale no fuso da empresa; horários que não
+    existem num dia de mudança de horário de verão são ajustados pelo
+    próprio fuso.
+
+    Returns:
+        datetime em UTC ou None se a configuração nunca executa
+        (ex.: semanal sem dias)
+    """
+    depois = depois or timezone.now()
+    zona = fuso(agendamento.empresa)
+    dia = depois.astimezone(zona).date()
+
+    for _ in range(MAX_DIAS_BUSCA):
+        if _executa_no_dia(agendamento, dia):
+            local = datetime.combine(dia, agendamento.hora_execucao, tzinfo=zona)
+            # Ida e volta por UTC normaliza horários inexistentes
+            candidato = local.astimezone(dt_timezone.utc)
+            if candidato > depois:
+                return candidato
+        dia += timedelta(days=1)
+    return None
+
+
+def _proxima_ou_avisar(agendamento, depois: datetime = None) -> datetime | None:
+    """
+    calcular_proxima_execucao(), registrando em log configurações que nunca
+    executam: o agendamento fica sem proxima_execucao e não é mais reservado.
+    """
+    proxima = calcular_proxima_execucao(agendamento, depois)
+    if proxima is None:
+        logger.warning(
+            'Agendamento %s nunca executa com a configuração atual '
+            '(frequencia=%s, dias_semana=%s, dia_mes=%s); fica sem próxima execução',
+            agendamento.pk, agendamento.frequencia, agendamento.dias_semana, agendamento.dia_mes
+        )
+    return proxima
+
+
+def reagendar(agendamento, depois: datetime = None):
+    """Recalcula e grava proxima_execucao (ex.: após criar ou editar)"""
+    agendamento.proxima_execucao = (
+        _proxima_ou_avisar(agendamento, depois) if agendamento.ativo else None
+    )
+    agendamento.save(update_fields=['proxima_execucao'])
+
+
+def reservar_vencidos(limite: int, agora: datetime = None) -> list:
+    """
+    Reserva até `limite` agendamentos vencidos para execução.
+
+    Na mesma transação em que as linhas são bloqueadas (SKIP LOCKED: linhas
+    já reservadas por outro processo são puladas), proxima_execucao avança
+    para o próximo horário e ultima_execucao recebe agora, então o
+    agendamento deixa de estar vencido para os demais processos.
+
+    Returns:
+        Agendamentos reservados (com empresa, relatório e criador carregados)
+    """
+    from apps.agendamentos.models import Agendamento
+
+    agora = agora or timezone.now()
+    with transaction.atomic():
+        agendamentos = list(
+            Agendamento.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('empresa', 'relatorio__conexao', 'criado_por')
+            .filter(ativo=True, proxima_execucao__lte=agora)
+            .order_by('proxima_execucao')[:limite]
+        )
+        for agendamento in agendamentos:
+            agendamento.ultima_execucao = agora
+            agendamento.proxima_execucao = _proxima_ou_avisar(agendamento, agora)
+        Agendamento.objects.bulk_update(agendamentos, ['ultima_execucao', 'proxima_execucao'])
+    return agendamentos
+
+
+def executar(agendamento, execucao_agendada=None):
+    """
+    Executa o relatório do agendamento em nome de quem o criou, com os
+    filtros padrão, e registra o resultado em ExecucaoAgendada. O resultado
+    completo fica gravado em disco (Execucao.arquivo_resultado).
+
+    Args:
+        agendamento: Agendamento (com relatorio e criado_por)
+        execucao_agendada: Registro já criado (ex.: executar_agora); se None, é criado aqui
+
+    Returns:
+        ExecucaoAgendada finalizada
+    """
+    from apps.agendamentos.models import ExecucaoAgendada
+    from services.query_executor import QueryExecutor
+
+    if execucao_agendada is None:
+        execucao_agendada = ExecucaoAgendada.objects.create(agendamento=agendamento)
+
+    try:
+        if not agendamento.relatorio.ativo:
+            raise ValueError('O relatório está inativo')
+        resultado = QueryExecutor(agendamento.relatorio).executar(
+            usuario=agendamento.criado_por,
+            filtros_valores=agendamento.filtros_padrao or {},
+            paginado=True,
+        )
+        execucao_agendada.execucao_id = resultado.get('execucao_id')
+        execucao_agendada.sucesso = resultado['sucesso']
+        execucao_agendada.erro = resultado.get('erro')
+    except Exception as e:
+        # Inclui FilaCheia: o agendamento não é repetido, só registrado como falha
+        logger.exception('Falha no agendamento %s', agendamento.pk)
+        execucao_agendada.sucesso = False
+        execucao_agendada.erro = str(e)
+
+    execucao_agendada.finalizado_em = timezone.now()
+    execucao_agendada.save(update_fields=['execucao', 'sucesso', 'erro', 'finalizado_em'])
+    return execucao_agendada
+
+
+class Agendador:
+    """
+    Laço do agendador: reserva os vencidos e os executa num pool limitado.
+    Só reserva quantos o pool pode começar, então agendamentos que não
+    cabem ficam no banco para este ou outro processo.
+    """
+
+    def __init__(self, workers: int = None, intervalo: float = None):
+        self.workers = workers or settings.AGENDADOR_WORKERS
+        self.intervalo = intervalo or settings.AGENDADOR_INTERVALO_SEGUNDOS
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='agendador')
+        self._livres = threading.Semaphore(self.workers)
+        self._parar = threading.Event()
+
+    def rodar(self, uma_vez: bool = False) -> int:
+        """
+        Executa até parar() (ou uma única rodada com uma_vez=True).
+
+        Returns:
+            Quantidade de agendamentos disparados
+        """
+        disparados = 0
+        try:
+            while not self._parar.is_set():
+                reservados = self._rodada()
+                disparados += reservados
+                if uma_vez:
+                    break
+                if not reservados:
+                    self._parar.wait(self.intervalo)
+        finally:
+            self._executor.shutdown(wait=True)
+        return disparados
+
+    def parar(self):
+        self._parar.set()
+
+    def _rodada(self) -> int:
+        """Reserva e dispara um lote; espera uma vaga no pool se estiver cheio"""
+        self._livres.acquire()
+        vagas = 1
+        while self._livres.acquire(blocking=False):
+            vagas += 1
+
+        try:
+            close_old_connections()
+            agendamentos = reservar_vencidos(vagas)
+        except Exception:
+            logger.exception('Falha ao buscar agendamentos vencidos')
+            agendamentos = []
+            self._parar.wait(self.intervalo)
+
+        for agendamento in agendamentos:
+            self._executor.submit(self._executar, agendamento)
+        for _ in range(vagas - len(agendamentos)):
+            self._livres.release()
+        return len(agendamentos)
+
+    def _executar(self, agendamento):
+        close_old_connections()
+        try:
+            executar(agendamento)
+        finally:
+            close_old_connections()
+            self._livres.release()
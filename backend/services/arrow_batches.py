@@ -0,0 +1,123 @@
+"""
+Conversão de linhas do cursor para Arrow (RecordBatch).
+Usado pela exportação Parquet/Arrow e pelo armazenamento de resultados.
+"""
+from decimal import Context, Decimal
+
+# Escala de decimais sem escala informada pelo driver (ex.: numeric sem
+# precisão no PostgreSQL, como o resultado de a/b): 20 dígitos inteiros e
+# 18 decimais; valores com mais casas são arredondados
+ESCALA_DECIMAL_LIVRE = 18
+_CONTEXTO_DECIMAL = Context(prec=38)
+
+
+def normalizar_colunas(colunas: list) -> list[str]:
+    """
+    Garante nomes de coluna únicos e não vazios.
+    SQL Server devolve '' para expressões sem alias e Parquet não aceita duplicados.
+    """
+    nomes = []
+    usados = set()
+    for idx, coluna in enumerate(colunas):
+        nome = str(coluna) if coluna else f'coluna_{idx + 1}'
+        base, sufixo = nome, 1
+        while nome in usados:
+            nome = f'{base}_{sufixo}'
+            sufixo += 1
+        usados.add(nome)
+        nomes.append(nome)
+    return nomes
+
+
+def inferir_schema(colunas: list, linhas: list, descricao=None):
+    """
+    Infere o schema Arrow a partir do primeiro lote de linhas.
+
+    - Decimais usam precisão 38 e a escala informada pelo driver (cursor.description),
+      para que lotes seguintes com valores maiores não quebrem o schema; sem
+      escala informada, usam ESCALA_DECIMAL_LIVRE (o primeiro lote não diz
+      quantas casas os seguintes terão)
+    - Datas com timezone viram timestamp com tz (não são descartadas)
+    - Colunas sem valores no lote (ou com tipos mistos) viram texto
+
+    Args:
+        colunas: Nomes das colunas (já normalizados)
+        linhas: Primeiro lote de linhas do cursor
+        descricao: cursor.description (opcional)
+
+    Returns:
+        pyarrow.Schema
+    """
+    import pyarrow as pa
+
+    valores_por_coluna = list(zip(*linhas)) if linhas else [()] * len(colunas)
+    campos = []
+
+    for idx, nome in enumerate(colunas):
+        valores = valores_por_coluna[idx]
+        try:
+            tipo = pa.array(valores, from_pandas=True).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            tipo = pa.string()
+
+        if pa.types.is_null(tipo):
+            tipo = pa.string()
+        elif pa.types.is_decimal(tipo):
+            escala = _escala_descricao(descricao, idx)
+            if escala is None:
+                escala = ESCALA_DECIMAL_LIVRE
+            tipo = pa.decimal128(38, min(escala, 37))
+
+        campos.append(pa.field(nome, tipo))
+
+    return pa.schema(campos)
+
+
+def montar_record_batch(schema, linhas: list):
+    """
+    Converte um lote de linhas em RecordBatch seguindo o schema.
+    Colunas de texto aceitam qualquer valor (convertido com str) e decimais
+    com mais casas que a escala da coluna são arredondados para ela.
+
+    Args:
+        schema: pyarrow.Schema de inferir_schema
+        linhas: Lote de linhas do cursor
+
+    Returns:
+        pyarrow.RecordBatch
+    """
+    import pyarrow as pa
+
+    valores_por_coluna = list(zip(*linhas)) if linhas else [()] * len(schema)
+    arrays = []
+
+    for campo, valores in zip(schema, valores_por_coluna):
+        if pa.types.is_decimal(campo.type):
+            valores = _ajustar_escala(valores, campo.type.scale)
+        try:
+            arrays.append(pa.array(valores, type=campo.type, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            if not pa.types.is_string(campo.type):
+                raise
+            arrays.append(pa.array([None if v is None else str(v) for v in valores], type=pa.string()))
+
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _escala_descricao(descricao, idx: int) -> int | None:
+    """Escala numérica informada pelo driver (posição 5 do DB-API description)"""
+    try:
+        escala = descricao[idx][5]
+    except (TypeError, IndexError):
+        return None
+    return escala if isinstance(escala, int) and escala >= 0 else None
+
+
+def _ajustar_escala(valores, escala: int) -> list:
+    """Arredonda para a escala os decimais com mais casas (Arrow não trunca)"""
+    passo = Decimal(1).scaleb(-escala)
+    return [
+        v.quantize(passo, context=_CONTEXTO_DECIMAL)
+        if isinstance(v, Decimal) and v.is_finite() and v.as_tuple().exponent < -escala else v
+        for v in valores
+    ]
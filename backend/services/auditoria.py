@@ -0,0 +1,243 @@
+"""
+Gravação do histórico de execuções (Execucao) fora do caminho da requisição.
+
+Exportações e execuções que não vão ao banco do cliente (cache ou
+execução agrupada) são gravadas uma única vez, já finalizadas: o registro
+fica em memória e uma thread grava em lote (bulk_create) quando o buffer
+atinge AUDITORIA_LOTE registros ou a cada AUDITORIA_INTERVALO_SEGUNDOS.
+Atualizações de registros que já existem (ex.: estado final de execuções
+síncronas, gravadas antes da query para poderem ser canceladas, ou o
+progresso das assíncronas) seguem o mesmo caminho, com bulk_update só dos
+campos alterados. O estado final só é gravado se a execução ainda estiver
+EXECUTANDO, para que um cancelamento feito antes da descarga não seja
+sobrescrito por CONCLUIDO ou ERRO.
+
+Quem precisa do registro no banco na hora (ex.: a execução assíncrona,
+consultada pelo ID logo em seguida) passa imediato=True. O buffer é
+descarregado ao encerrar o processo (atexit) e, com
+AUDITORIA_BUFFER_ATIVO=False, tudo é gravado de forma síncrona.
+
+Depois de gravadas, as execuções finalizadas são somadas ao resumo por
+hora (services/estatisticas.somar_execucoes) no mesmo lote.
+"""
+import atexit
+import logging
+import threading
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class GravadorAuditoria:
+    """Buffer de gravações de Execucao com descarga periódica em lote (um por processo)"""
+
+    def __init__(self):
+        self._insercoes = []
+        self._atualizacoes = {}  # (campos em tupla ordenada, só em andamento) -> {pk: execucao}
+        self._finalizadas = []  # gravadas, ainda não somadas ao resumo
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        self._encerrado = False
+
+    @property
+    def ativo(self) -> bool:
+        return getattr(settings, 'AUDITORIA_BUFFER_ATIVO', True) and not self._encerrado
+
+    def registrar(self, execucao, imediato: bool = False):
+        """
+        Grava uma execução nova (instância ainda não salva).
+
+        Args:
+            execucao: Execucao com o estado final
+            imediato: Se True, grava agora (INSERT síncrono)
+        """
+        if imediato or not self.ativo:
+            execucao.save(force_insert=True)
+            self._contabilizar([execucao])
+            return
+
+        with self._lock:
+            self._insercoes.append(execucao)
+            cheio = len(self._insercoes) >= settings.AUDITORIA_LOTE
+        self._iniciar(cheio)
+
+    def atualizar(self, execucao, campos: list[str], imediato: bool = False,
+                  finalizada: bool = False):
+        """
+        Grava os campos de uma execução que já existe no banco.
+        Na descarga vale o valor atual da instância, então atualizações
+        seguidas da mesma execução viram um único UPDATE.
+
+        O estado final só é gravado se a execução ainda estiver EXECUTANDO
+        (senão foi cancelada nesse meio tempo e fica CANCELADO); quando o
+        próprio estado final é CANCELADO, é gravado sempre.
+
+        Args:
+            execucao: Execucao já gravada
+            campos: Campos alterados
+            imediato: Se True, grava agora (UPDATE síncrono)
+            finalizada: Se True, é a gravação do estado final (entra no resumo)
+        """
+        em_andamento = finalizada and execucao.status != execucao.Status.CANCELADO
+        if imediato or not self.ativo:
+            if self._atualizar_uma(execucao, campos, em_andamento) and finalizada:
+                self._contabilizar([execucao])
+            return
+
+        with self._lock:
+            chave = (tuple(sorted(campos)), em_andamento)
+            self._atualizacoes.setdefault(chave, {})[execucao.pk] = execucao
+            if finalizada:
+                self._finalizadas.append(execucao)
+            cheio = sum(len(v) for v in self._atualizacoes.values()) >= settings.AUDITORIA_LOTE
+        self._iniciar(cheio)
+
+    def descarregar(self) -> int:
+        """
+        Grava tudo que está no buffer.
+
+        Se o lote falhar (ex.: relatório apagado no meio tempo), os registros
+        são gravados um a um para que só os inválidos se percam; só os
+        gravados entram no resumo.
+
+        Returns:
+            Quantidade de registros gravados
+        """
+        from apps.execucoes.models import Execucao
+
+        with self._lock:
+            insercoes, self._insercoes = self._insercoes, []
+            atualizacoes, self._atualizacoes = self._atualizacoes, {}
+            finalizadas, self._finalizadas = self._finalizadas, []
+
+        gravadas = []
+        if insercoes:
+            gravadas += self._gravar(
+                insercoes,
+                lambda lote: Execucao.objects.bulk_create(lote, batch_size=settings.AUDITORIA_LOTE),
+                self._inserir_uma,
+            )
+        contabilizar = list(gravadas)
+        for (campos, em_andamento), execucoes in atualizacoes.items():
+            gravadas += self._gravar(
+                list(execucoes.values()),
+                lambda lote: self._atualizar_lote(lote, list(campos), em_andamento),
+                lambda execucao: self._atualizar_uma(execucao, list(campos), em_andamento),
+            )
+
+        if finalizadas:
+            ids = {id(execucao) for execucao in gravadas}
+            contabilizar += [execucao for execucao in finalizadas if id(execucao) in ids]
+        self._contabilizar(contabilizar)
+        return len(gravadas)
+
+    @staticmethod
+    def _inserir_uma(execucao) -> bool:
+        execucao.save(force_insert=True)
+        return True
+
+    @staticmethod
+    def _atualizar_uma(execucao, campos: list[str], em_andamento: bool) -> bool:
+        """UPDATE de uma execução; com em_andamento, só se ainda estiver EXECUTANDO"""
+        if not em_andamento:
+            execucao.save(update_fields=campos)
+            return True
+
+        from apps.execucoes.models import Execucao
+
+        return bool(Execucao.objects.filter(
+            pk=execucao.pk, status=Execucao.Status.EXECUTANDO
+        ).update(**{campo: getattr(execucao, campo) for campo in campos}))
+
+    @staticmethod
+    def _atualizar_lote(execucoes: list, campos: list[str], em_andamento: bool) -> list:
+        """
+        bulk_update das execuções; com em_andamento, só das que ainda estão
+        EXECUTANDO (bloqueadas até o fim para que um cancelamento não passe
+        entre a leitura e o UPDATE). Devolve as atualizadas.
+        """
+        from apps.execucoes.models import Execucao
+
+        if not em_andamento:
+            Execucao.objects.bulk_update(execucoes, campos, batch_size=settings.AUDITORIA_LOTE)
+            return execucoes
+
+        with transaction.atomic():
+            ativas = set(Execucao.objects.select_for_update().filter(
+                pk__in=[execucao.pk for execucao in execucoes], status=Execucao.Status.EXECUTANDO
+            ).values_list('pk', flat=True))
+            execucoes = [execucao for execucao in execucoes if execucao.pk in ativas]
+            Execucao.objects.bulk_update(execucoes, campos, batch_size=settings.AUDITORIA_LOTE)
+        return execucoes
+
+    @staticmethod
+    def _gravar(execucoes: list, em_lote, individual) -> list:
+        """
+        Grava em lote ou, se falhar, uma a uma; devolve as gravadas.
+        em_lote devolve as gravadas e individual, se gravou.
+        """
+        try:
+            return em_lote(execucoes)
+        except Exception:
+            logger.exception('Falha ao gravar %d execuções em lote; gravando uma a uma', len(execucoes))
+
+        gravadas = []
+        for execucao in execucoes:
+            try:
+                if individual(execucao):
+                    gravadas.append(execucao)
+            except Exception:
+                logger.exception('Execução %s descartada do histórico', execucao.pk)
+        return gravadas
+
+    @staticmethod
+    def _contabilizar(execucoes: list):
+        """Soma as execuções ao resumo; uma falha aqui não afeta o histórico"""
+        from services import estatisticas
+
+        if not execucoes:
+            return
+        try:
+            estatisticas.somar_execucoes(execucoes)
+        except Exception:
+            logger.exception('Falha ao somar %d execuções ao resumo por hora', len(execucoes))
+
+    def encerrar(self):
+        """Para a thread e grava o que restou (chamado ao encerrar o processo)"""
+        self._encerrado = True
+        self._acordar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=settings.AUDITORIA_INTERVALO_SEGUNDOS * 5)
+        self.descarregar()
+
+    def _iniciar(self, acordar: bool):
+        """Cria a thread na primeira gravação e a acorda se o lote encheu"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._rodar, name='auditoria', daemon=True
+                    )
+                    self._thread.start()
+                    atexit.register(self.encerrar)
+        if acordar:
+            self._acordar.set()
+
+    def _rodar(self):
+        while not self._encerrado:
+            self._acordar.wait(settings.AUDITORIA_INTERVALO_SEGUNDOS)
+            self._acordar.clear()
+            if not (self._insercoes or self._atualizacoes or self._finalizadas):
+                continue
+            try:
+                self.descarregar()
+            except Exception:
+                logger.exception('Falha ao descarregar o histórico de execuções')
+            finally:
+                # A thread não passa pelo ciclo de request/response
+                close_old_connections()
+
+
+gravador = GravadorAuditoria()
@@ -0,0 +1,122 @@
+"""
+Base comum dos exportadores de relatórios.
+Monta a query, abre o cursor (dentro do controle de admissão, como as
+execuções) e registra a exportação no histórico (uma única gravação ao
+final, pelo gravador de auditoria).
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from django.utils import timezone
+
+
+class BaseExporter:
+    """
+    Funcionalidades compartilhadas pelos exportadores (Excel, CSV, ...).
+    Os dados são lidos do cursor em lotes, nunca materializando o resultado inteiro.
+    """
+
+    TAMANHO_LOTE = 5000  # Linhas por fetchmany
+
+    def _montar_query(self, relatorio, filtros: dict = None) -> tuple[str, list | None]:
+        """
+        Converte os parâmetros da query em parâmetros do driver.
+
+        Returns:
+            Tupla (query, parametros). parametros é None quando a query não usa filtros.
+
+        Raises:
+            ValueError: Se algum filtro for inválido
+        """
+        from services.query_template import obter_template
+
+        template = obter_template(relatorio)
+        parametros, erro = template.parametros(filtros)
+        if erro:
+            raise ValueError(erro)
+        return template.query, parametros
+
+    @contextmanager
+    def _cursor(self, relatorio, query: str, parametros: list | None = None, execucao=None):
+        """
+        Abre conexão (do pool) e executa a query com os parâmetros.
+
+        A exportação ocupa uma vaga do limite de execuções simultâneas da
+        empresa e da conexão (services/admissao.py) enquanto o cursor estiver
+        aberto; o tempo de espera fica em execucao.tempo_fila_ms.
+        Cursor, conexão e vaga são liberados ao sair do bloco.
+
+        Yields:
+            Tupla (cursor, colunas)
+
+        Raises:
+            FilaCheia: Se a fila de espera estiver cheia ou a espera esgotar
+        """
+        from services.admissao import controle_admissao
+        from services.database_connector import DatabaseConnector
+        from services.query_params import executar_sql
+
+        with controle_admissao.admitir(relatorio.empresa, relatorio.conexao) as tempo_fila_ms:
+            if execucao is not None:
+                execucao.tempo_fila_ms = tempo_fila_ms
+
+            connector = DatabaseConnector(relatorio.conexao)
+            conn = connector.get_connection()
+            try:
+                cursor = conn.cursor()
+                try:
+                    executar_sql(cursor, query, parametros)
+                    yield cursor, [desc[0] for desc in cursor.description]
+                finally:
+                    cursor.close()
+            finally:
+                # Devolve ao pool mesmo em caso de erro
+                conn.close()
+
+    def _iterar_lotes(self, cursor):
+        """Gera lotes de linhas do cursor até o fim do resultado"""
+        lote = cursor.fetchmany(self.TAMANHO_LOTE)
+        while lote:
+            yield lote
+            lote = cursor.fetchmany(self.TAMANHO_LOTE)
+
+    def _iniciar_execucao(self, relatorio, usuario, filtros: dict = None):
+        """
+        Cria registro de execução marcado como exportação.
+        O registro só é gravado em _finalizar_execucao.
+
+        Returns:
+            Execucao ou None se não houver usuário (ex: uso interno)
+        """
+        from apps.execucoes.models import Execucao
+
+        if usuario is None:
+            return None
+
+        agora = timezone.now()
+        return Execucao(
+            empresa=relatorio.empresa,
+            relatorio=relatorio,
+            usuario=usuario,
+            filtros_usados=filtros,
+            status=Execucao.Status.EXECUTANDO,
+            exportou=True,
+            exportado_em=agora
+        )
+
+    def _finalizar_execucao(self, execucao, inicio: datetime, qtd_linhas: int = None,
+                            erro: str = None):
+        """Completa o registro de execução e o envia para gravação"""
+        from services.auditoria import gravador
+
+        if execucao is None:
+            return
+
+        execucao.finalizado_em = timezone.now()
+        execucao.tempo_execucao_ms = int((datetime.now() - inicio).total_seconds() * 1000)
+        execucao.sucesso = erro is None
+        execucao.status = execucao.Status.CONCLUIDO if erro is None else execucao.Status.ERRO
+        if erro is None:
+            execucao.progresso = 100
+        execucao.erro = erro
+        execucao.qtd_linhas = qtd_linhas
+        gravador.registrar(execucao)
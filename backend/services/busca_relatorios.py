@@ -0,0 +1,115 @@
+"""
+Busca de relatórios no catálogo (PostgreSQL full-text + trigramas).
+
+Cada relatório guarda:
+- busca_vetor: tsvector ('portuguese') com nome (peso A), descrição (B)
+  e tabelas usadas na query (C), indexado com GIN
+- nome_normalizado: nome sem acentos e em minúsculas, indexado com
+  GIN gin_trgm_ops para busca aproximada e por trecho
+
+Os textos são normalizados (sem acento) aqui mesmo, no Python, antes de
+irem para o banco; assim a busca ignora acentos sem depender da extensão
+unaccent, cuja função não pode ser usada em índices.
+"""
+import re
+import unicodedata
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+)
+from django.db.models import F, Q, Value
+
+CONFIG = 'portuguese'
+
+_COMENTARIO_LINHA = re.compile(r'--[^\n]*')
+_COMENTARIO_BLOCO = re.compile(r'/\*.*?\*/', re.DOTALL)
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_TABELA = re.compile(r'\b(?:FROM|JOIN)\s+([\w\.\[\]"`]+)', re.IGNORECASE)
+
+
+def normalizar(texto: str) -> str:
+    """Remove acentos e converte para minúsculas ('Relatório' -> 'relatorio')"""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def extrair_tabelas(query_sql: str) -> list[str]:
+    """
+    Lista as tabelas/views citadas em FROM e JOIN (inclusive em subqueries).
+    Schema e delimitadores são descartados: '[dbo].[Vendas]' -> 'vendas'.
+    """
+    query = _COMENTARIO_BLOCO.sub(' ', query_sql or '')
+    query = _COMENTARIO_LINHA.sub(' ', query)
+    query = _LITERAL.sub("''", query)
+
+    tabelas = []
+    for nome in _TABELA.findall(query):
+        tabela = re.sub(r'[\[\]"`]', '', nome).split('.')[-1]
+        tabela = normalizar(tabela)
+        if tabela and tabela not in tabelas:
+            tabelas.append(tabela)
+    return tabelas
+
+
+def vetor_busca(nome: str, descricao: str, query_sql: str) -> SearchVector:
+    """Expressão do tsvector de um relatório (nome A, descrição B, tabelas C)"""
+    tabelas = ' '.join(extrair_tabelas(query_sql))
+    return (
+        SearchVector(Value(normalizar(nome)), weight='A', config=CONFIG)
+        + SearchVector(Value(normalizar(descricao)), weight='B', config=CONFIG)
+        + SearchVector(Value(tabelas), weight='C', config=CONFIG)
+    )
+
+
+def atualizar_busca(relatorios, modelo=None, tamanho_lote: int = 1000):
+    """
+    Recalcula busca_vetor e nome_normalizado dos relatórios.
+
+    Args:
+        relatorios: Instâncias de Relatorio (com nome, descricao e query_sql)
+        modelo: Classe do modelo (padrão: a da primeira instância; em
+            migrations, passar o modelo histórico)
+        tamanho_lote: Registros por UPDATE
+    """
+    relatorios = list(relatorios)
+    if not relatorios:
+        return
+
+    modelo = modelo or type(relatorios[0])
+    for relatorio in relatorios:
+        relatorio.nome_normalizado = normalizar(relatorio.nome)
+        relatorio.busca_vetor = vetor_busca(relatorio.nome, relatorio.descricao, relatorio.query_sql)
+
+    modelo.objects.bulk_update(
+        relatorios, ['nome_normalizado', 'busca_vetor'], batch_size=tamanho_lote
+    )
+    for relatorio in relatorios:
+        del relatorio.busca_vetor
+
+
+def buscar(qs, termo: str):
+    """
+    Filtra e ordena por relevância os relatórios que correspondem ao termo.
+
+    Casa se:
+    - o termo (websearch: palavras, "frase", -exclusão) bate com o tsvector
+      (nome, descrição ou tabelas, com radicais em português)
+    - ou o nome contém o termo
+    - ou o nome é parecido com o termo (operador %> do pg_trgm, limiar
+      pg_trgm.word_similarity_threshold; tolera erros de digitação)
+
+    Todas as condições usam os índices GIN. Ordena por rank do full-text e,
+    em seguida, pela similaridade do nome.
+    """
+    termo = normalizar(termo).strip()
+    if not termo:
+        return qs
+
+    consulta = SearchQuery(termo, config=CONFIG, search_type='websearch')
+    return qs.annotate(
+        relevancia=SearchRank(F('busca_vetor'), consulta),
+        similaridade=TrigramWordSimilarity(termo, 'nome_normalizado'),
+    ).filter(
+        Q(busca_vetor=consulta)
+        | Q(nome_normalizado__contains=termo)
+        | Q(nome_normalizado__trigram_word_similar=termo)
+    ).order_by('-relevancia', '-similaridade', 'nome')
@@ -0,0 +1,168 @@
+"""
+Agrupamento (single-flight) de execuções idênticas simultâneas.
+Quando vários usuários executam o mesmo relatório ao mesmo tempo, apenas
+a primeira execução vai ao banco do cliente; as demais aguardam e
+recebem o mesmo resultado.
+"""
+import hashlib
+import json
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from services.execucoes_ativas import ExecucaoCancelada
+
+
+def chave_execucao(conexao_id, query: str, **opcoes) -> str:
+    """
+    Gera a chave que identifica execuções equivalentes.
+
+    Args:
+        conexao_id: ID da conexão onde a query roda
+        query: Query final (com parâmetros substituídos)
+        **opcoes: Demais parâmetros que alteram o resultado (limite, formato...)
+
+    Returns:
+        Hash sha256 em hexadecimal
+    """
+    conteudo = json.dumps([str(conexao_id), query, opcoes], sort_keys=True, default=str)
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+class _Voo:
+    """Execução em andamento compartilhada pelas threads do processo"""
+
+    def __init__(self):
+        self.concluido = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class Coalescedor:
+    """
+    Single-flight de execuções.
+
+    Dentro do processo, threads com a mesma chave aguardam a execução líder.
+    Com COALESCING_ENTRE_PROCESSOS, a líder do processo ainda disputa um
+    advisory lock no PostgreSQL do sistema: quem não obtém o lock aguarda a
+    liberação e lê o resultado publicado no cache do Django (que precisa ser
+    compartilhado entre processos, ex.: Redis).
+    """
+
+    PREFIXO = 'coalescing'
+    INTERVALO_ESPERA = 0.2
+
+    def __init__(self):
+        self._voos = {}
+        self._lock = threading.Lock()
+
+    def executar(self, chave: str, funcao) -> tuple[dict, bool]:
+        """
+        Executa funcao() ou aguarda a execução idêntica em andamento.
+
+        Args:
+            chave: Chave de chave_execucao()
+            funcao: Função sem argumentos que executa a query
+
+        Returns:
+            Tupla (resultado, coalescida). coalescida é True quando o
+            resultado veio da execução de outra requisição.
+            Erros da execução líder são repassados a quem aguardava, exceto
+            o cancelamento: quem aguardava não cancelou nada, então uma delas
+            assume como nova líder e as demais passam a aguardá-la.
+        """
+        if not getattr(settings, 'COALESCING_ATIVO', True):
+            return funcao(), False
+
+        while True:
+            with self._lock:
+                voo = self._voos.get(chave)
+                lider = voo is None
+                if lider:
+                    voo = self._voos[chave] = _Voo()
+
+            if lider:
+                break
+
+            timeout = getattr(settings, 'COALESCING_TIMEOUT_SEGUNDOS', 300)
+            if not voo.concluido.wait(timeout):
+                # Líder demorou demais: executa por conta própria
+                return funcao(), False
+            if isinstance(voo.erro, ExecucaoCancelada):
+                continue
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.resultado, True
+
+        try:
+            voo.resultado, coalescida = self._executar_lider(chave, funcao)
+            return voo.resultado, coalescida
+        except Exception as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                self._voos.pop(chave, None)
+            voo.concluido.set()
+
+    def _executar_lider(self, chave: str, funcao) -> tuple[dict, bool]:
+        """Execução líder do processo (com claim entre processos, se ativo)"""
+        if not self._entre_processos():
+            return funcao(), False
+
+        id_lock = self._id_advisory_lock(chave)
+        chave_resultado = f'{self.PREFIXO}:{chave}'
+        timeout = getattr(settings, 'COALESCING_TIMEOUT_SEGUNDOS', 300)
+        limite_espera = time.monotonic() + timeout
+        aguardou = False
+
+        while not self._tentar_lock(id_lock):
+            if time.monotonic() >= limite_espera:
+                return funcao(), False
+            aguardou = True
+            time.sleep(self.INTERVALO_ESPERA)
+
+        try:
+            # Só reaproveita se outra execução estava em andamento quando chegamos
+            if aguardou:
+                resultado = cache.get(chave_resultado)
+                if resultado is not None:
+                    return resultado, True
+
+            resultado = funcao()
+            cache.set(
+                chave_resultado,
+                resultado,
+                getattr(settings, 'COALESCING_RESULTADO_TTL_SEGUNDOS', 30)
+            )
+            return resultado, False
+        finally:
+            self._liberar_lock(id_lock)
+
+    @staticmethod
+    def _entre_processos() -> bool:
+        return (
+            getattr(settings, 'COALESCING_ENTRE_PROCESSOS', False)
+            and connection.vendor == 'postgresql'
+        )
+
+    @staticmethod
+    def _id_advisory_lock(chave: str) -> int:
+        """Converte a chave em bigint com sinal (argumento do pg_advisory_lock)"""
+        return int.from_bytes(bytes.fromhex(chave[:16]), 'big', signed=True)
+
+    @staticmethod
+    def _tentar_lock(id_lock: int) -> bool:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [id_lock])
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def _liberar_lock(id_lock: int):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [id_lock])
+
+
+# Instância única por processo
+coalescedor = Coalescedor()
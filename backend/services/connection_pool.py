@@ -0,0 +1,330 @@
+"""
+Pool de conexões com bancos de dados externos.
+Reaproveita conexões abertas entre execuções, evitando pagar
+TCP + TLS + login a cada relatório executado.
+"""
+import threading
+import time
+from collections import deque
+
+
+class PooledConnection:
+    """
+    Proxy para uma conexão do pool.
+    Repassa tudo para a conexão real (leitura e atribuição, ex.: conn.timeout
+    do pyodbc); close() devolve a conexão ao pool em vez de fechá-la, então o
+    código que já chama conn.close() continua igual.
+    """
+
+    _ATRIBUTOS_PROPRIOS = ('_pool', '_conn', '_descartar')
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._descartar = False
+
+    def close(self):
+        """Devolve a conexão ao pool (pode ser chamado mais de uma vez)"""
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool.devolver(conn, descartar=self._descartar)
+
+    def invalidar(self):
+        """Marca a conexão como quebrada: ela será fechada ao invés de devolvida"""
+        self._descartar = True
+
+    def __getattr__(self, nome):
+        if self._conn is None:
+            raise RuntimeError('Conexão já devolvida ao pool')
+        return getattr(self._conn, nome)
+
+    def __setattr__(self, nome, valor):
+        if nome in self._ATRIBUTOS_PROPRIOS:
+            object.__setattr__(self, nome, valor)
+            return
+        if self._conn is None:
+            raise RuntimeError('Conexão já devolvida ao pool')
+        setattr(self._conn, nome, valor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Pool de conexões de uma única Conexao.
+
+    - Cria conexões sob demanda até max_tamanho
+    - Quando esgotado, aguarda uma devolução até timeout_espera
+    - Conexões ociosas além de tempo_ocioso_max são fechadas (mantendo min_tamanho)
+    - Valida a conexão com SELECT 1 ao emprestar
+    """
+
+    def __init__(self, fabrica, min_tamanho: int = 0, max_tamanho: int = 5,
+                 tempo_ocioso_max: int = 300, timeout_espera: int = 30,
+                 validar_apos: int = 0):
+        """
+        Args:
+            fabrica: Função sem argumentos que abre uma nova conexão
+            min_tamanho: Conexões ociosas mantidas mesmo após expirar
+            max_tamanho: Máximo de conexões abertas (ociosas + emprestadas)
+            tempo_ocioso_max: Segundos até fechar uma conexão ociosa
+            timeout_espera: Segundos aguardando uma conexão livre
+            validar_apos: Só valida conexões ociosas há mais que N segundos
+        """
+        self._fabrica = fabrica
+        self.min_tamanho = min_tamanho
+        self.max_tamanho = max(max_tamanho, 1)
+        self.tempo_ocioso_max = tempo_ocioso_max
+        self.timeout_espera = timeout_espera
+        self.validar_apos = validar_apos
+
+        self._ociosas = deque()  # (conexão, devolvida_em)
+        self._emprestadas = 0
+        self._fechado = False
+        self._cond = threading.Condition()
+
+        # Estatísticas
+        self._criadas = 0
+        self._emprestimos = 0
+        self._esperas = 0
+        self._descartadas = 0
+        self._falhas_validacao = 0
+
+    def obter(self) -> PooledConnection:
+        """
+        Empresta uma conexão do pool.
+
+        Returns:
+            PooledConnection (close() devolve ao pool)
+
+        Raises:
+            TimeoutError: Se nenhuma conexão ficar livre dentro do timeout
+            Exception: Erros ao abrir nova conexão
+        """
+        prazo = time.monotonic() + self.timeout_espera
+
+        while True:
+            conn = None
+            criar = False
+
+            with self._cond:
+                if self._fechado:
+                    raise RuntimeError('Pool de conexões encerrado')
+
+                expiradas = self._remover_expiradas()
+
+                if self._ociosas:
+                    conn, devolvida_em = self._ociosas.pop()
+                    self._emprestadas += 1
+                elif self._emprestadas < self.max_tamanho:
+                    # Reserva a vaga; a conexão é aberta fora do lock
+                    self._emprestadas += 1
+                    criar = True
+                else:
+                    self._esperas += 1
+                    restante = prazo - time.monotonic()
+                    if restante <= 0 or not self._cond.wait(restante):
+                        raise TimeoutError(
+                            f'Nenhuma conexão livre no pool após {self.timeout_espera}s'
+                        )
+                    continue
+
+            for expirada in expiradas:
+                self._fechar(expirada)
+
+            if criar:
+                try:
+                    conn = self._fabrica()
+                except Exception:
+                    self._liberar_vaga()
+                    raise
+                with self._cond:
+                    self._criadas += 1
+                    self._emprestimos += 1
+                return PooledConnection(self, conn)
+
+            if time.monotonic() - devolvida_em >= self.validar_apos and not self._validar(conn):
+                # Conexão morta: descarta e tenta a próxima
+                self._fechar(conn)
+                with self._cond:
+                    self._falhas_validacao += 1
+                    self._descartadas += 1
+                self._liberar_vaga()
+                continue
+
+            with self._cond:
+                self._emprestimos += 1
+            return PooledConnection(self, conn)
+
+    def devolver(self, conn, descartar: bool = False):
+        """
+        Devolve uma conexão ao pool.
+        Desfaz transação aberta; se falhar, a conexão é descartada.
+
+        Args:
+            conn: Conexão real (não o proxy)
+            descartar: Se True, fecha a conexão ao invés de reaproveitar
+        """
+        if not descartar:
+            try:
+                conn.rollback()
+            except Exception:
+                descartar = True
+
+        with self._cond:
+            self._emprestadas -= 1
+            if descartar or self._fechado:
+                self._descartadas += 1
+            else:
+                self._ociosas.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None:
+            self._fechar(conn)
+
+    def fechar(self):
+        """Fecha conexões ociosas; as emprestadas são fechadas ao serem devolvidas"""
+        with self._cond:
+            self._fechado = True
+            ociosas = [conn for conn, _ in self._ociosas]
+            self._ociosas.clear()
+            self._cond.notify_all()
+
+        for conn in ociosas:
+            self._fechar(conn)
+
+    def estatisticas(self) -> dict:
+        """Retorna estatísticas do pool para dimensionamento"""
+        with self._cond:
+            return {
+                'emprestadas': self._emprestadas,
+                'ociosas': len(self._ociosas),
+                'max_tamanho': self.max_tamanho,
+                'min_tamanho': self.min_tamanho,
+                'criadas': self._criadas,
+                'emprestimos': self._emprestimos,
+                'esperas': self._esperas,
+                'descartadas': self._descartadas,
+                'falhas_validacao': self._falhas_validacao,
+            }
+
+    def _remover_expiradas(self) -> list:
+        """
+        Retira do pool conexões ociosas há mais de tempo_ocioso_max.
+        Chamado com lock; quem chama fecha as conexões retornadas fora do lock.
+        """
+        limite = time.monotonic() - self.tempo_ocioso_max
+        expiradas = []
+        # As mais antigas ficam à esquerda
+        while len(self._ociosas) > self.min_tamanho and self._ociosas[0][1] < limite:
+            conn, _ = self._ociosas.popleft()
+            self._descartadas += 1
+            expiradas.append(conn)
+        return expiradas
+
+    def _liberar_vaga(self):
+        with self._cond:
+            self._emprestadas -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _validar(conn) -> bool:
+        """Verifica se a conexão ainda responde"""
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _fechar(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class PoolManager:
+    """
+    Mantém um pool por Conexao no processo.
+    Guarda o atualizado_em de quem criou o pool: uma Conexao editada (mais
+    recente) substitui o pool antigo com as credenciais atualizadas. Uma
+    cópia mais antiga (lida antes da edição) continua usando o pool atual,
+    senão cópias diferentes fariam o pool ser recriado a cada alternância.
+    """
+
+    def __init__(self):
+        self._pools = {}  # conexao_id -> (atualizado_em, ConnectionPool)
+        self._lock = threading.Lock()
+
+    def obter_pool(self, conexao, fabrica, **config) -> ConnectionPool:
+        """
+        Retorna o pool da conexão, criando-o se necessário.
+
+        Args:
+            conexao: Instância de Conexao
+            fabrica: Função que abre uma nova conexão real
+            **config: Parâmetros de ConnectionPool
+
+        Returns:
+            ConnectionPool da conexão
+        """
+        chave = str(conexao.id)
+        antigo = None
+
+        with self._lock:
+            atual = self._pools.get(chave)
+            if atual and not self._mais_recente(conexao.atualizado_em, atual[0]):
+                return atual[1]
+
+            if atual:
+                antigo = atual[1]
+            pool = ConnectionPool(fabrica, **config)
+            self._pools[chave] = (conexao.atualizado_em, pool)
+
+        if antigo:
+            antigo.fechar()
+        return pool
+
+    @staticmethod
+    def _mais_recente(atualizado_em, atual) -> bool:
+        if atualizado_em is None or atual is None:
+            return atualizado_em != atual
+        return atualizado_em > atual
+
+    def invalidar(self, conexao_id):
+        """Descarta o pool de uma conexão (ex: após edição ou exclusão)"""
+        with self._lock:
+            atual = self._pools.pop(str(conexao_id), None)
+        if atual:
+            atual[1].fechar()
+
+    def estatisticas(self, conexao_id) -> dict | None:
+        """Estatísticas do pool da conexão (None se ainda não existe)"""
+        with self._lock:
+            atual = self._pools.get(str(conexao_id))
+        return atual[1].estatisticas() if atual else None
+
+    def fechar_todos(self):
+        """Fecha todos os pools do processo"""
+        with self._lock:
+            pools = [pool for _, pool in self._pools.values()]
+            self._pools.clear()
+        for pool in pools:
+            pool.fechar()
+
+
+# Instância única por processo
+pool_manager = PoolManager()
@@ -0,0 +1,105 @@
+"""
+Serviço para exportação de dados em CSV (opcionalmente compactado em gzip).
+"""
+import csv
+import io
+import zlib
+from contextlib import ExitStack
+from datetime import datetime
+from services.base_exporter import BaseExporter
+
+
+class CsvExporter(BaseExporter):
+    """
+    Exporta resultados de queries para CSV em streaming.
+    As linhas vão do cursor direto para o módulo csv, sem DataFrame,
+    e são entregues em blocos para um StreamingHttpResponse.
+    """
+
+    def __init__(self, comprimir: bool = False):
+        """
+        Args:
+            comprimir: Se True, gera o CSV compactado em gzip (.csv.gz)
+        """
+        self.comprimir = comprimir
+
+    def exportar(self, relatorio, filtros: dict = None, usuario=None):
+        """
+        Executa a query e retorna um gerador com o conteúdo do CSV.
+
+        A query é executada antes de retornar, para que erros de filtro ou
+        de SQL sejam levantados antes de a resposta começar a ser enviada.
+
+        Args:
+            relatorio: Instância do modelo Relatorio
+            filtros: Dicionário com filtros aplicados
+            usuario: Usuário que está exportando (registra no histórico)
+
+        Returns:
+            Gerador de blocos de bytes (UTF-8 com BOM, para abrir no Excel)
+        """
+        query, parametros = self._montar_query(relatorio, filtros)
+
+        inicio = datetime.now()
+        execucao = self._iniciar_execucao(relatorio, usuario, filtros)
+
+        # O cursor fica aberto até o fim do download: liberado pelo gerador
+        recursos = ExitStack()
+        try:
+            cursor, colunas = recursos.enter_context(
+                self._cursor(relatorio, query, parametros, execucao)
+            )
+        except Exception as e:
+            self._finalizar_execucao(execucao, inicio, erro=str(e))
+            raise
+
+        gerador = self._gerar(recursos, cursor, colunas, execucao, inicio)
+        # Inicia o gerador: a partir daqui close() libera a conexão
+        # mesmo que a resposta nunca seja consumida
+        next(gerador)
+        return gerador
+
+    def _gerar(self, recursos: ExitStack, cursor, colunas: list, execucao, inicio: datetime):
+        """
+        Gera os blocos do arquivo. Cursor, conexão e vaga de execução
+        (recursos) são liberados ao final, inclusive se o cliente
+        desconectar no meio do download.
+        """
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if self.comprimir else None
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        qtd_linhas = 0
+        erro = None
+
+        try:
+            yield b''
+            writer.writerow(colunas)
+            yield self._bloco(compressor, '\ufeff' + buffer.getvalue())
+
+            for lote in self._iterar_lotes(cursor):
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(lote)
+                qtd_linhas += len(lote)
+                bloco = self._bloco(compressor, buffer.getvalue())
+                if bloco:
+                    yield bloco
+
+            if compressor:
+                yield compressor.flush()
+        except GeneratorExit:
+            erro = 'Download interrompido pelo cliente'
+            raise
+        except Exception as e:
+            erro = str(e)
+            raise
+        finally:
+            # Devolve a conexão ao pool mesmo em caso de erro
+            recursos.close()
+            self._finalizar_execucao(execucao, inicio, qtd_linhas=qtd_linhas, erro=erro)
+
+    @staticmethod
+    def _bloco(compressor, texto: str) -> bytes:
+        """Codifica (e compacta, se necessário) um bloco de texto"""
+        dados = texto.encode('utf-8')
+        return compressor.compress(dados) if compressor else dados
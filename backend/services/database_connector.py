@@ -3,8 +3,10 @@ Serviço para conexão com bancos de dados externos.
 Suporta SQL Server, PostgreSQL e MySQL.
 """
 import pyodbc
+from django.conf import settings
 from apps.conexoes.models import Conexao
 from core.crypto import decrypt
+from services.connection_pool import pool_manager
 
 
 class DatabaseConnector:
@@ -23,15 +25,43 @@ class DatabaseConnector:
             conexao: Instância do modelo Conexao
         """
         self.conexao = conexao
-        self.senha = decrypt(conexao.senha_encriptada)
+        self.senha = decrypt(conexao.senha_encriptada, empresa_id=conexao.empresa_id)
 
     def get_connection(self):
         """
         Retorna uma conexão ativa com o banco.
 
+        Com DB_POOL_ATIVO, a conexão vem do pool da Conexao e close()
+        a devolve ao pool em vez de fechá-la.
+
         Returns:
             Conexão do pyodbc, psycopg2 ou pymysql (dependendo do tipo)
 
+        Raises:
+            ValueError: Se o tipo de banco não for suportado
+            TimeoutError: Se o pool estiver esgotado
+            Exception: Se houver erro na conexão
+        """
+        if not getattr(settings, 'DB_POOL_ATIVO', True):
+            return self.criar_conexao()
+        return self.get_pool().obter()
+
+    def get_pool(self):
+        """Retorna o pool de conexões desta Conexao"""
+        return pool_manager.obter_pool(
+            self.conexao,
+            self.criar_conexao,
+            min_tamanho=getattr(settings, 'DB_POOL_MIN', 0),
+            max_tamanho=getattr(settings, 'DB_POOL_MAX', 5),
+            tempo_ocioso_max=getattr(settings, 'DB_POOL_OCIOSO_MAX_SEGUNDOS', 300),
+            timeout_espera=getattr(settings, 'DB_POOL_TIMEOUT_ESPERA_SEGUNDOS', 30),
+            validar_apos=getattr(settings, 'DB_POOL_VALIDAR_APOS_SEGUNDOS', 0),
+        )
+
+    def criar_conexao(self):
+        """
+        Abre uma nova conexão com o banco (sem pool).
+
         Raises:
             ValueError: Se o tipo de banco não for suportado
             Exception: Se houver erro na conexão
@@ -84,6 +114,7 @@ class DatabaseConnector:
     def test_connection(self) -> tuple[bool, str]:
         """
         Testa a conexão com o banco de dados.
+        Passa pelo pool: conexões reaproveitadas são validadas ao serem emprestadas.
 
         Returns:
             Tupla (sucesso: bool, mensagem: str)
@@ -95,6 +126,113 @@ class DatabaseConnector:
         except Exception as e:
             return False, str(e)
 
+    def aplicar_timeout(self, conn, segundos: int):
+        """
+        Limita o tempo de execução das próximas queries da conexão.
+
+        - PostgreSQL: SET LOCAL statement_timeout (desfeito no rollback ao devolver ao pool)
+        - MySQL: max_execution_time da sessão (vale para SELECT)
+        - SQL Server: atributo timeout do pyodbc (SQL_ATTR_QUERY_TIMEOUT)
+
+        Args:
+            conn: Conexão aberta
+            segundos: Tempo máximo (0 = sem limite)
+        """
+        if self.conexao.tipo == 'SQLSERVER':
+            conn.timeout = segundos
+            return
+
+        if not segundos and self.conexao.tipo == 'POSTGRESQL':
+            return
+
+        cursor = conn.cursor()
+        try:
+            if self.conexao.tipo == 'POSTGRESQL':
+                cursor.execute('SET LOCAL statement_timeout = %s', [segundos * 1000])
+            elif self.conexao.tipo == 'MYSQL':
+                cursor.execute('SET SESSION max_execution_time = %s', [segundos * 1000])
+        finally:
+            cursor.close()
+
+    def restaurar_timeout(self, conn):
+        """Remove o limite de tempo antes de a conexão voltar ao pool"""
+        try:
+            if self.conexao.tipo == 'SQLSERVER':
+                conn.timeout = 0
+            elif self.conexao.tipo == 'MYSQL':
+                cursor = conn.cursor()
+                try:
+                    cursor.execute('SET SESSION max_execution_time = DEFAULT')
+                finally:
+                    cursor.close()
+        except Exception:
+            # Conexão quebrada (ex.: sessão encerrada no cancelamento): descarta do pool
+            if hasattr(conn, 'invalidar'):
+                conn.invalidar()
+
+    def identificar_sessao(self, conn) -> str:
+        """
+        Retorna o identificador da sessão no banco (pid, thread id ou spid),
+        usado por cancelar_sessao() a partir de outro processo.
+        """
+        if self.conexao.tipo == 'POSTGRESQL':
+            return str(conn.get_backend_pid())
+        if self.conexao.tipo == 'MYSQL':
+            return str(conn.thread_id())
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT @@SPID')
+            return str(cursor.fetchone()[0])
+        finally:
+            cursor.close()
+
+    def cancelar(self, conn, cursor):
+        """
+        Interrompe a query em andamento (chamado de outra thread do mesmo processo).
+        """
+        if self.conexao.tipo == 'POSTGRESQL':
+            conn.cancel()
+        elif self.conexao.tipo == 'SQLSERVER':
+            cursor.cancel()
+        else:
+            # pymysql não cancela pela própria conexão: KILL QUERY em outra sessão
+            self.cancelar_sessao(conn.thread_id())
+
+    def cancelar_sessao(self, sessao):
+        """
+        Interrompe a query de uma sessão abrindo uma nova conexão (sem pool).
+
+        - PostgreSQL: pg_cancel_backend(pid)
+        - MySQL: KILL QUERY id
+        - SQL Server: KILL spid (encerra a sessão; exige ALTER ANY CONNECTION)
+        """
+        sessao = int(sessao)
+        conn = self.criar_conexao()
+        try:
+            cursor = conn.cursor()
+            if self.conexao.tipo == 'POSTGRESQL':
+                cursor.execute('SELECT pg_cancel_backend(%s)', [sessao])
+            elif self.conexao.tipo == 'MYSQL':
+                cursor.execute(f'KILL QUERY {sessao}')
+            else:
+                conn.autocommit = True
+                cursor.execute(f'KILL {sessao}')
+            cursor.close()
+        finally:
+            conn.close()
+
+    def eh_timeout(self, erro: Exception) -> bool:
+        """Indica se o erro foi causado pelo limite de tempo da query"""
+        if self.conexao.tipo == 'POSTGRESQL':
+            # query_canceled: também ocorre no cancelamento, que é verificado antes
+            return getattr(erro, 'pgcode', None) == '57014'
+        if self.conexao.tipo == 'MYSQL':
+            # 3024: max_execution_time (MySQL); 1969: max_statement_time (MariaDB)
+            return bool(erro.args) and erro.args[0] in (3024, 1969)
+        # pyodbc: SQLSTATE HYT00 (Query timeout expired)
+        return bool(erro.args) and erro.args[0] == 'HYT00'
+
 
 def test_connection_params(tipo: str, host: str, porta: int, database: str,
                            usuario: str, senha: str) -> tuple[bool, str]:
@@ -0,0 +1,299 @@
+"""
+Estatísticas de execução a partir de execucoes_resumo_hora.
+
+Cada linha do resumo agrega as execuções finalizadas de uma hora, por
+relatório e usuário, com um histograma de tempo_execucao_ms em faixas
+logarítmicas (LIMITES_MS). Os percentis saem do histograma, então a
+consulta não lê execucoes e o custo depende só do período pedido.
+
+O resumo é mantido de forma incremental pelo gravador de auditoria
+(somar_execucoes) e pode ser recalculado a partir de execucoes
+(recalcular), como na retenção do histórico (services/particoes.py).
+"""
+import bisect
+from datetime import timezone as dt_timezone
+from django.conf import settings
+from django.db import connection
+
+# Limites das faixas do histograma (ms), crescendo 25% por faixa até ~1 h.
+# A faixa i conta tempos em [LIMITES_MS[i-1], LIMITES_MS[i]); a última, os
+# acima de LIMITES_MS[-1]. Alterar os limites invalida os resumos gravados.
+LIMITES_MS = tuple(sorted({round(5 * 1.25 ** i) for i in range(61)}))
+QTD_FAIXAS = len(LIMITES_MS) + 1
+
+AGRUPAMENTOS = {
+    'empresa': 'r.empresa_id',
+    'relatorio': 'r.relatorio_id',
+    'usuario': 'r.usuario_id',
+    'conexao': 'rel.conexao_id',
+}
+INTERVALOS = ('hora', 'dia', 'semana', 'mes', 'total')
+
+_CAMPOS = [
+    'empresa_id', 'relatorio_id', 'usuario_id', 'hora', 'total', 'erros', 'cache_hits',
+    'exportacoes', 'linhas', 'tempo_total_ms', 'tempo_max_ms', 'histograma',
+]
+
+
+def faixa(tempo_ms: int) -> int:
+    """Índice da faixa do histograma para o tempo (mesmo critério de width_bucket)"""
+    return bisect.bisect_right(LIMITES_MS, tempo_ms)
+
+
+def hora_resumo(data):
+    """Hora cheia (UTC) em que a execução é contabilizada"""
+    return data.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def percentil(histograma: list[int], p: float, maximo: int = None) -> int | None:
+    """
+    Estima o percentil p (0-1) por interpolação linear dentro da faixa.
+
+    Args:
+        histograma: Contagem por faixa
+        p: Percentil (ex.: 0.95)
+        maximo: Maior tempo observado (limita a estimativa da última faixa)
+    """
+    total = sum(histograma)
+    if not total:
+        return None
+
+    alvo = p * total
+    acumulado = 0
+    for i, quantidade in enumerate(histograma):
+        if quantidade and acumulado + quantidade >= alvo:
+            inferior = LIMITES_MS[i - 1] if i > 0 else 0
+            superior = LIMITES_MS[i] if i < len(LIMITES_MS) else (maximo or inferior)
+            valor = inferior + (superior - inferior) * (alvo - acumulado) / quantidade
+            if maximo is not None:
+                valor = min(valor, maximo)
+            return round(valor)
+        acumulado += quantidade
+    return maximo
+
+
+def somar_execucoes(execucoes) -> int:
+    """
+    Soma execuções finalizadas ao resumo (upsert incremental).
+
+    Returns:
+        Quantidade de linhas de resumo gravadas
+    """
+    resumos = {}
+    for execucao in execucoes:
+        chave = (execucao.empresa_id, execucao.relatorio_id, execucao.usuario_id,
+                 hora_resumo(execucao.iniciado_em))
+        resumo = resumos.get(chave)
+        if resumo is None:
+            resumo = resumos[chave] = {
+                'total': 0, 'erros': 0, 'cache_hits': 0, 'exportacoes': 0, 'linhas': 0,
+                'tempo_total_ms': 0, 'tempo_max_ms': None, 'histograma': [0] * QTD_FAIXAS,
+            }
+
+        resumo['total'] += 1
+        resumo['erros'] += not execucao.sucesso
+        resumo['cache_hits'] += execucao.cache_hit
+        resumo['exportacoes'] += execucao.exportou
+        resumo['linhas'] += execucao.qtd_linhas or 0
+        if execucao.tempo_execucao_ms is not None:
+            resumo['tempo_total_ms'] += execucao.tempo_execucao_ms
+            resumo['tempo_max_ms'] = max(resumo['tempo_max_ms'] or 0, execucao.tempo_execucao_ms)
+            resumo['histograma'][faixa(execucao.tempo_execucao_ms)] += 1
+
+    if not resumos:
+        return 0
+
+    valores = []
+    parametros = []
+    for (empresa_id, relatorio_id, usuario_id, hora), resumo in resumos.items():
+        valores.append('(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::integer[])')
+        parametros += [
+            empresa_id, relatorio_id, usuario_id, hora, resumo['total'], resumo['erros'],
+            resumo['cache_hits'], resumo['exportacoes'], resumo['linhas'],
+            resumo['tempo_total_ms'], resumo['tempo_max_ms'], resumo['histograma'],
+        ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO execucoes_resumo_hora AS r ({', '.join(_CAMPOS)})
+            VALUES {', '.join(valores)}
+            ON CONFLICT (empresa_id, relatorio_id, usuario_id, hora) DO UPDATE SET
+                total = r.total + EXCLUDED.total,
+                erros = r.erros + EXCLUDED.erros,
+                cache_hits = r.cache_hits + EXCLUDED.cache_hits,
+                exportacoes = r.exportacoes + EXCLUDED.exportacoes,
+                linhas = r.linhas + EXCLUDED.linhas,
+                tempo_total_ms = r.tempo_total_ms + EXCLUDED.tempo_total_ms,
+                tempo_max_ms = GREATEST(r.tempo_max_ms, EXCLUDED.tempo_max_ms),
+                histograma = ARRAY(
+                    SELECT coalesce(a, 0) + coalesce(b, 0)
+                    FROM unnest(r.histograma, EXCLUDED.histograma) WITH ORDINALITY AS h(a, b, i)
+                    ORDER BY i
+                )
+            """,
+            parametros
+        )
+    return len(resumos)
+
+
+def recalcular(cursor, inicio=None, fim=None, empresa_id=None) -> int:
+    """
+    Recalcula o resumo a partir das execuções finalizadas do período.
+
+    Só as horas com execuções no período são regravadas (upsert), então
+    horas cujas execuções já saíram pela retenção mantêm o resumo.
+
+    Returns:
+        Quantidade de linhas de resumo gravadas
+    """
+    condicoes, parametros = ['finalizado_em IS NOT NULL'], [list(LIMITES_MS)]
+    if inicio is not None:
+        condicoes.append('iniciado_em >= %s')
+        parametros.append(inicio)
+    if fim is not None:
+        condicoes.append('iniciado_em < %s')
+        parametros.append(fim)
+    if empresa_id is not None:
+        condicoes.append('empresa_id = %s')
+        parametros.append(empresa_id)
+    parametros.append(QTD_FAIXAS - 1)
+
+    # Agrega por faixa e monta o histograma de cada hora cruzando com todas
+    # as faixas (-1 = sem tempo_execucao_ms, fora do histograma)
+    cursor.execute(
+        f"""
+        WITH faixas AS (
+            SELECT
+                empresa_id, relatorio_id, usuario_id, date_trunc('hour', iniciado_em) AS hora,
+                coalesce(width_bucket(tempo_execucao_ms, %s::integer[]), -1) AS faixa,
+                count(*) AS total,
+                count(*) FILTER (WHERE NOT sucesso) AS erros,
+                count(*) FILTER (WHERE cache_hit) AS cache_hits,
+                count(*) FILTER (WHERE exportou) AS exportacoes,
+                sum(qtd_linhas) AS linhas,
+                sum(tempo_execucao_ms) AS tempo_total_ms,
+                max(tempo_execucao_ms) AS tempo_max_ms
+            FROM execucoes
+            WHERE {' AND '.join(condicoes)}
+            GROUP BY 1, 2, 3, 4, 5
+        )
+        INSERT INTO execucoes_resumo_hora ({', '.join(_CAMPOS)})
+        SELECT
+            h.empresa_id, h.relatorio_id, h.usuario_id, h.hora,
+            sum(f.total), sum(f.erros), sum(f.cache_hits), sum(f.exportacoes),
+            coalesce(sum(f.linhas), 0), coalesce(sum(f.tempo_total_ms), 0), max(f.tempo_max_ms),
+            array_agg(coalesce(f.total, 0) ORDER BY i.faixa) FILTER (WHERE i.faixa >= 0)
+        FROM (SELECT DISTINCT empresa_id, relatorio_id, usuario_id, hora FROM faixas) h
+        CROSS JOIN generate_series(-1, %s) AS i(faixa)
+        LEFT JOIN faixas f
+            ON f.empresa_id = h.empresa_id AND f.relatorio_id = h.relatorio_id
+            AND f.usuario_id = h.usuario_id AND f.hora = h.hora AND f.faixa = i.faixa
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (empresa_id, relatorio_id, usuario_id, hora) DO UPDATE SET
+            total = EXCLUDED.total,
+            erros = EXCLUDED.erros,
+            cache_hits = EXCLUDED.cache_hits,
+            exportacoes = EXCLUDED.exportacoes,
+            linhas = EXCLUDED.linhas,
+            tempo_total_ms = EXCLUDED.tempo_total_ms,
+            tempo_max_ms = EXCLUDED.tempo_max_ms,
+            histograma = EXCLUDED.histograma
+        """,
+        parametros
+    )
+    return cursor.rowcount
+
+
+def consultar(empresa_id, inicio, fim, agrupar_por: str = 'relatorio', intervalo: str = 'dia',
+              relatorio_id=None, usuario_id=None, conexao_id=None) -> list[dict]:
+    """
+    Estatísticas do período agrupadas por dimensão e intervalo de tempo.
+
+    Args:
+        empresa_id: Empresa (sempre filtrada)
+        inicio, fim: Período [inicio, fim); arredondado para a hora cheia
+        agrupar_por: empresa, relatorio, usuario ou conexao
+        intervalo: hora, dia, semana, mes (no fuso TIME_ZONE) ou total
+        relatorio_id, usuario_id, conexao_id: Filtros opcionais
+
+    Returns:
+        [{'chave', 'periodo', 'total', 'erros', 'taxa_erro', 'cache_hits',
+          'exportacoes', 'linhas', 'tempo_medio_ms', 'tempo_max_ms',
+          'p50_ms', 'p95_ms', 'p99_ms'}]
+    """
+    chave = AGRUPAMENTOS[agrupar_por]
+    condicoes = ['r.empresa_id = %s', 'r.hora >= %s', 'r.hora < %s']
+    parametros_where = [empresa_id, hora_resumo(inicio), fim]
+    for coluna, valor in (('r.relatorio_id', relatorio_id), ('r.usuario_id', usuario_id),
+                          ('rel.conexao_id', conexao_id)):
+        if valor:
+            condicoes.append(f'{coluna} = %s')
+            parametros_where.append(valor)
+
+    if intervalo == 'total':
+        periodo, parametros_periodo = 'NULL::timestamptz', []
+    elif intervalo == 'hora':
+        periodo, parametros_periodo = 'r.hora', []
+    else:
+        periodo = 'date_trunc(%s, r.hora AT TIME ZONE %s) AT TIME ZONE %s'
+        parametros_periodo = ['week' if intervalo == 'semana' else
+                              'month' if intervalo == 'mes' else 'day',
+                              settings.TIME_ZONE, settings.TIME_ZONE]
+
+    tabelas = 'FROM execucoes_resumo_hora r JOIN relatorios rel ON rel.id = r.relatorio_id'
+    where = ' AND '.join(condicoes)
+
+    resultados = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT {chave}, {periodo}, sum(r.total), sum(r.erros), sum(r.cache_hits),
+                   sum(r.exportacoes), sum(r.linhas), sum(r.tempo_total_ms), max(r.tempo_max_ms)
+            {tabelas}
+            WHERE {where}
+            GROUP BY 1, 2
+            """,
+            parametros_periodo + parametros_where
+        )
+        for (valor_chave, data, total, erros, cache_hits, exportacoes, linhas,
+             tempo_total_ms, tempo_max_ms) in cursor.fetchall():
+            resultados[(valor_chave, data)] = {
+                'chave': valor_chave,
+                'periodo': data,
+                'total': total,
+                'erros': erros,
+                'taxa_erro': round(erros / total, 4) if total else 0,
+                'cache_hits': cache_hits,
+                'exportacoes': exportacoes,
+                # sum() de bigint volta como numeric (Decimal)
+                'linhas': int(linhas),
+                'tempo_total_ms': int(tempo_total_ms),
+                'tempo_max_ms': tempo_max_ms,
+                'histograma': [0] * QTD_FAIXAS,
+            }
+
+        cursor.execute(
+            f"""
+            SELECT {chave}, {periodo}, h.faixa - 1, sum(h.quantidade)
+            {tabelas}
+            CROSS JOIN LATERAL unnest(r.histograma) WITH ORDINALITY AS h(quantidade, faixa)
+            WHERE {where} AND h.quantidade > 0
+            GROUP BY 1, 2, 3
+            """,
+            parametros_periodo + parametros_where
+        )
+        for valor_chave, data, indice, quantidade in cursor.fetchall():
+            resumo = resultados.get((valor_chave, data))
+            if resumo is not None and indice < QTD_FAIXAS:
+                resumo['histograma'][indice] += quantidade
+
+    for resumo in resultados.values():
+        histograma = resumo.pop('histograma')
+        tempo_total_ms = resumo.pop('tempo_total_ms')
+        medidas = sum(histograma)
+        resumo['tempo_medio_ms'] = round(tempo_total_ms / medidas) if medidas else None
+        for nome, p in (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            resumo[nome] = percentil(histograma, p, resumo['tempo_max_ms'])
+
+    return list(resultados.values())
@@ -1,75 +1,136 @@
 """
 Serviço para exportação de dados para Excel.
 """
-import pandas as pd
-from io import BytesIO
+import math
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import chain
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from services.base_exporter import BaseExporter
 
 
-class ExcelExporter:
+class ExcelExporter(BaseExporter):
     """
     Exporta resultados de queries para Excel.
     Baseado no código funcional do MVP (forgereports/reports/views.py).
+
+    Lê o cursor em lotes (fetchmany) e escreve com o modo write_only do
+    openpyxl em arquivo temporário, mantendo a memória limitada
+    independente da quantidade de linhas.
     """
 
-    def exportar(self, relatorio, filtros: dict = None) -> BytesIO:
+    AMOSTRA_LARGURA = 1000  # Linhas usadas para estimar largura das colunas
+    LARGURA_MAXIMA = 50
+    LARGURA_PADRAO = 15
+
+    def exportar(self, relatorio, filtros: dict = None, usuario=None):
         """
         Exporta relatório completo para Excel.
 
         Args:
             relatorio: Instância do modelo Relatorio
             filtros: Dicionário com filtros aplicados
+            usuario: Usuário que está exportando (registra no histórico)
 
         Returns:
-            BytesIO com o arquivo Excel
+            Arquivo temporário (binário, posicionado no início) com o Excel.
+            O arquivo é removido do disco ao ser fechado.
+        """
+        query, parametros = self._montar_query(relatorio, filtros)
+
+        inicio = datetime.now()
+        execucao = self._iniciar_execucao(relatorio, usuario, filtros)
+        arquivo = tempfile.TemporaryFile(suffix='.xlsx')
+
+        try:
+            with self._cursor(relatorio, query, parametros, execucao) as (cursor, colunas):
+                qtd_linhas = self._escrever(arquivo, cursor, colunas)
+        except Exception as e:
+            arquivo.close()
+            self._finalizar_execucao(execucao, inicio, erro=str(e))
+            raise
+
+        self._finalizar_execucao(execucao, inicio, qtd_linhas=qtd_linhas)
+        arquivo.seek(0)
+        return arquivo
+
+    def _escrever(self, arquivo, cursor, colunas: list) -> int:
+        """
+        Escreve as linhas do cursor no arquivo usando workbook write_only.
+
+        Args:
+            arquivo: Arquivo binário de destino
+            cursor: Cursor já executado
+            colunas: Nomes das colunas
+
+        Returns:
+            Quantidade de linhas escritas
+        """
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet('Dados')
+        lotes = self._iterar_lotes(cursor)
+        primeiro_lote = next(lotes, [])
+
+        # Larguras precisam ser definidas antes de escrever as linhas
+        larguras = self._estimar_larguras(colunas, primeiro_lote[:self.AMOSTRA_LARGURA])
+        for idx, largura in enumerate(larguras):
+            worksheet.column_dimensions[self._get_column_letter(idx)].width = largura
+
+        worksheet.append([str(col) for col in colunas])
+
+        qtd_linhas = 0
+        for lote in chain([primeiro_lote], lotes):
+            for linha in lote:
+                worksheet.append([self._valor_excel(valor) for valor in linha])
+            qtd_linhas += len(lote)
+
+        workbook.save(arquivo)
+        return qtd_linhas
+
+    def _estimar_larguras(self, colunas: list, amostra: list) -> list[int]:
+        """
+        Estima a largura de cada coluna a partir de uma amostra de linhas.
+
+        Args:
+            colunas: Nomes das colunas
+            amostra: Primeiras linhas do resultado
+
+        Returns:
+            Lista de larguras (limitadas a LARGURA_MAXIMA)
+        """
+        larguras = []
+        for idx, col in enumerate(colunas):
+            try:
+                col_max = max((len(str(linha[idx])) for linha in amostra), default=0)
+                larguras.append(min(max(col_max, len(str(col))) + 2, self.LARGURA_MAXIMA))
+            except Exception:
+                # Se houver erro, usar largura padrão
+                larguras.append(self.LARGURA_PADRAO)
+        return larguras
+
+    @staticmethod
+    def _valor_excel(valor):
+        """
+        Converte um valor do cursor para algo aceito pelo Excel.
+        Remove timezone de datas, troca NaN/inf por vazio e
+        caracteres de controle inválidos em textos.
         """
-        from services.database_connector import DatabaseConnector
-        from services.query_params import substituir_parametros
-
-        # Buscar filtros do relatório
-        filtros_objetos = list(relatorio.filtros.all())
-
-        # Substituir parâmetros na query se houver filtros
-        query = relatorio.query_sql
-        if filtros_objetos and filtros:
-            query, erro = substituir_parametros(query, filtros_objetos, filtros)
-            if erro:
-                raise ValueError(erro)
-
-        connector = DatabaseConnector(relatorio.conexao)
-        conn = connector.get_connection()
-
-        df = pd.read_sql(query, conn)
-        conn.close()
-
-        # Remover timezone de colunas datetime para compatibilidade com Excel
-        for col in df.columns:
-            if pd.api.types.is_datetime64tz_dtype(df[col]):
-                df[col] = df[col].dt.tz_localize(None)
-
-        # Substituir NaN, inf e -inf por None para compatibilidade com Excel
-        import numpy as np
-        df = df.replace([np.inf, -np.inf, np.nan], None)
-
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Dados', index=False)
-
-            # Auto-ajustar largura das colunas
-            worksheet = writer.sheets['Dados']
-            for idx, col in enumerate(df.columns):
-                try:
-                    col_max = df[col].astype(str).map(len).max() if len(df) > 0 else 0
-                    max_length = max(col_max, len(str(col))) + 2
-                    # Limitar largura máxima em 50 caracteres
-                    col_letter = self._get_column_letter(idx)
-                    worksheet.column_dimensions[col_letter].width = min(max_length, 50)
-                except:
-                    # Se houver erro, usar largura padrão
-                    col_letter = self._get_column_letter(idx)
-                    worksheet.column_dimensions[col_letter].width = 15
-
-        output.seek(0)
-        return output
+        if valor is None or isinstance(valor, (bool, int)):
+            return valor
+        if isinstance(valor, str):
+            return ILLEGAL_CHARACTERS_RE.sub('', valor)
+        if isinstance(valor, float):
+            return None if math.isnan(valor) or math.isinf(valor) else valor
+        if isinstance(valor, (datetime, time)):
+            return valor.replace(tzinfo=None) if valor.tzinfo else valor
+        if isinstance(valor, (Decimal, date, timedelta)):
+            return valor
+        if isinstance(valor, (bytes, bytearray, memoryview)):
+            return bytes(valor).hex()
+        # Tipos sem equivalente no Excel (UUID, etc.)
+        return str(valor)
 
     def _get_column_letter(self, idx: int) -> str:
         """
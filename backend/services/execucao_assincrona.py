@@ -0,0 +1,90 @@
+"""
+Execução de relatórios em segundo plano.
+Pool de threads local (sem broker externo): a requisição retorna logo
+e o resultado fica gravado em disco (SPILL_DIR) para ser consultado
+depois, por qualquer processo.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from services import result_spill
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _obter_executor() -> ThreadPoolExecutor:
+    """Cria o pool na primeira utilização (um por processo)"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'EXECUCAO_ASSINCRONA_WORKERS', 4),
+                thread_name_prefix='execucao'
+            )
+        return _executor
+
+
+def enviar(funcao, *args, **kwargs):
+    """
+    Agenda funcao(*args, **kwargs) no pool de execução.
+
+    As conexões do Django abertas pela thread são fechadas ao final,
+    já que ela não passa pelo ciclo de request/response.
+
+    Returns:
+        concurrent.futures.Future
+    """
+    def rodar():
+        close_old_connections()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return _obter_executor().submit(rodar)
+
+
+def salvar_resultado(execucao_id, resultado: dict):
+    """
+    Guarda o resultado de uma execução assíncrona.
+
+    Fica em arquivo por execução (e não no cache, que por padrão é local
+    ao processo), então a consulta de status pode cair em outro worker.
+    """
+    result_spill.gravar_resposta(execucao_id, resultado)
+
+
+def obter_resultado(execucao_id) -> dict | None:
+    """Retorna o resultado guardado ou None se expirou/não existe"""
+    return result_spill.ler_resposta(
+        execucao_id,
+        getattr(settings, 'EXECUCAO_RESULTADO_TTL_SEGUNDOS', 3600)
+    )
+
+
+def encerrar_abandonadas(idade_segundos: int) -> int:
+    """
+    Marca como ERRO as execuções PENDENTE/EXECUTANDO iniciadas há mais de
+    idade_segundos: nem o pool de threads nem a requisição síncrona
+    sobrevivem ao reinício do processo, então o que estava na fila ou
+    rodando nele nunca será finalizado.
+
+    Returns:
+        Quantidade de execuções encerradas
+    """
+    from apps.execucoes.models import Execucao
+
+    agora = timezone.now()
+    return Execucao.objects.filter(
+        status__in=[Execucao.Status.PENDENTE, Execucao.Status.EXECUTANDO],
+        iniciado_em__lt=agora - timedelta(seconds=idade_segundos),
+    ).update(
+        status=Execucao.Status.ERRO,
+        sucesso=False,
+        erro='Execução interrompida: o processo que a executava foi encerrado',
+        finalizado_em=agora,
+    )
@@ -0,0 +1,42 @@
+"""
+Registro das queries em andamento neste processo.
+Permite que outra requisição cancele a query de uma execução.
+"""
+import threading
+
+_ativas = {}  # execucao_id -> (connector, conn, cursor)
+_lock = threading.Lock()
+
+
+class ExecucaoCancelada(Exception):
+    """A execução foi cancelada pelo usuário"""
+
+
+def registrar(execucao_id, connector, conn, cursor):
+    """Registra a query em andamento da execução"""
+    with _lock:
+        _ativas[str(execucao_id)] = (connector, conn, cursor)
+
+
+def remover(execucao_id):
+    """Remove o registro ao final da query"""
+    with _lock:
+        _ativas.pop(str(execucao_id), None)
+
+
+def cancelar(execucao_id) -> bool:
+    """
+    Interrompe a query da execução, se estiver rodando neste processo.
+
+    Returns:
+        True se a execução foi encontrada e o cancelamento enviado
+    """
+    with _lock:
+        ativa = _ativas.get(str(execucao_id))
+
+    if ativa is None:
+        return False
+
+    connector, conn, cursor = ativa
+    connector.cancelar(conn, cursor)
+    return True
@@ -0,0 +1,120 @@
+"""
+Serviço para exportação de dados em formatos colunares (Parquet e Arrow IPC).
+"""
+import tempfile
+from datetime import datetime
+from services.arrow_batches import inferir_schema, montar_record_batch, normalizar_colunas
+from services.base_exporter import BaseExporter
+
+
+class ParquetExporter(BaseExporter):
+    """
+    Exporta resultados de queries para Parquet ou Arrow IPC.
+
+    Os lotes do cursor são convertidos incrementalmente em RecordBatches e
+    gravados com compressão em arquivo temporário. Preserva tipos que o Excel
+    perde (decimais, datas com timezone).
+    """
+
+    LINHAS_POR_ROW_GROUP = 100000
+    COMPRESSAO = 'zstd'
+
+    def __init__(self, formato: str = 'parquet'):
+        """
+        Args:
+            formato: 'parquet' ou 'arrow' (Arrow IPC file)
+        """
+        if formato not in ('parquet', 'arrow'):
+            raise ValueError(f"Formato não suportado: {formato}")
+        self.formato = formato
+
+    def exportar(self, relatorio, filtros: dict = None, usuario=None):
+        """
+        Exporta relatório completo.
+
+        Args:
+            relatorio: Instância do modelo Relatorio
+            filtros: Dicionário com filtros aplicados
+            usuario: Usuário que está exportando (registra no histórico)
+
+        Returns:
+            Arquivo temporário (binário, posicionado no início).
+            O arquivo é removido do disco ao ser fechado.
+        """
+        query, parametros = self._montar_query(relatorio, filtros)
+
+        inicio = datetime.now()
+        execucao = self._iniciar_execucao(relatorio, usuario, filtros)
+        arquivo = tempfile.TemporaryFile(suffix=f'.{self.formato}')
+
+        try:
+            with self._cursor(relatorio, query, parametros, execucao) as (cursor, colunas):
+                qtd_linhas = self._escrever(arquivo, cursor, colunas)
+        except Exception as e:
+            arquivo.close()
+            self._finalizar_execucao(execucao, inicio, erro=str(e))
+            raise
+
+        self._finalizar_execucao(execucao, inicio, qtd_linhas=qtd_linhas)
+        arquivo.seek(0)
+        return arquivo
+
+    def _escrever(self, arquivo, cursor, colunas: list) -> int:
+        """
+        Converte os lotes do cursor e grava no arquivo.
+
+        Returns:
+            Quantidade de linhas escritas
+        """
+        lotes = self._iterar_lotes(cursor)
+        primeiro_lote = next(lotes, [])
+        schema = inferir_schema(normalizar_colunas(colunas), primeiro_lote, cursor.description)
+
+        if self.formato == 'arrow':
+            return self._escrever_arrow(arquivo, schema, primeiro_lote, lotes)
+        return self._escrever_parquet(arquivo, schema, primeiro_lote, lotes)
+
+    def _escrever_parquet(self, arquivo, schema, primeiro_lote: list, lotes) -> int:
+        """Grava row groups de até LINHAS_POR_ROW_GROUP linhas"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        qtd_linhas = 0
+        pendentes = []
+        linhas_pendentes = 0
+
+        with pq.ParquetWriter(arquivo, schema, compression=self.COMPRESSAO) as writer:
+            for lote in self._com_primeiro(primeiro_lote, lotes):
+                pendentes.append(montar_record_batch(schema, lote))
+                linhas_pendentes += len(lote)
+                qtd_linhas += len(lote)
+
+                if linhas_pendentes >= self.LINHAS_POR_ROW_GROUP:
+                    writer.write_table(pa.Table.from_batches(pendentes, schema=schema))
+                    pendentes, linhas_pendentes = [], 0
+
+            if pendentes or qtd_linhas == 0:
+                writer.write_table(pa.Table.from_batches(pendentes, schema=schema))
+
+        return qtd_linhas
+
+    def _escrever_arrow(self, arquivo, schema, primeiro_lote: list, lotes) -> int:
+        """Grava um RecordBatch comprimido por lote do cursor"""
+        import pyarrow as pa
+
+        qtd_linhas = 0
+        opcoes = pa.ipc.IpcWriteOptions(compression=self.COMPRESSAO)
+
+        with pa.ipc.new_file(arquivo, schema, options=opcoes) as writer:
+            for lote in self._com_primeiro(primeiro_lote, lotes):
+                writer.write_batch(montar_record_batch(schema, lote))
+                qtd_linhas += len(lote)
+
+        return qtd_linhas
+
+    @staticmethod
+    def _com_primeiro(primeiro_lote: list, lotes):
+        """Reencadeia o primeiro lote (usado na inferência) com os demais"""
+        if primeiro_lote:
+            yield primeiro_lote
+        yield from lotes
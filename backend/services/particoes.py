@@ -0,0 +1,262 @@
+"""
+Particionamento mensal e retenção do histórico de execuções (PostgreSQL).
+
+execucoes e execucoes_agendadas são particionadas por faixa (RANGE) de
+iniciado_em, uma partição por mês ({tabela}_pAAAA_MM) mais uma partição
+DEFAULT ({tabela}_padrao) que recebe o que cair fora das faixas criadas.
+A PK no banco passa a ser (id, iniciado_em), exigência do PostgreSQL para
+tabelas particionadas; para o Django a PK continua sendo id. A conversão
+das tabelas é feita pelas migrations (execucoes 0010, agendamentos 0003).
+
+Retenção (Empresa.retencao_historico_meses, padrão HISTORICO_RETENCAO_MESES):
+- o mês atual e os N meses anteriores completos são mantidos
+- partições mais antigas que a maior retenção entre as empresas são
+  desanexadas e movidas para o schema HISTORICO_SCHEMA_ARQUIVO (ou apagadas)
+- empresas com retenção menor têm as linhas antigas apagadas em lotes
+  dentro das partições que continuam anexadas
+- ExecucaoAgendada.execucao (sem constraint no banco) que aponta para
+  execuções removidas é anulada na mesma transação
+
+Antes de sair, as execuções são consolidadas em execucoes_resumo_hora
+(services/estatisticas.recalcular).
+"""
+import re
+from datetime import datetime
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from services import estatisticas
+
+# Tabelas particionadas e a coluna usada como chave de partição
+TABELAS = {
+    'execucoes': 'iniciado_em',
+    'execucoes_agendadas': 'iniciado_em',
+}
+
+LOTE_EXCLUSAO = 10000
+
+
+def _q(nome: str) -> str:
+    return connection.ops.quote_name(nome)
+
+
+def _literal(data: datetime) -> str:
+    # Limites de partição não aceitam parâmetros; a data é gerada aqui mesmo
+    return f"'{data.isoformat()}'"
+
+
+def inicio_mes(data: datetime) -> datetime:
+    """Meia-noite do dia 1 no fuso do sistema (TIME_ZONE)"""
+    local = timezone.localtime(data)
+    return timezone.make_aware(datetime(local.year, local.month, 1))
+
+
+def somar_meses(mes: datetime, meses: int) -> datetime:
+    """Soma meses a um início de mês (resultado também é início de mês)"""
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return timezone.make_aware(datetime(indice // 12, indice % 12 + 1, 1))
+
+
+def nome_particao(tabela: str, mes: datetime) -> str:
+    return f'{tabela}_p{mes:%Y_%m}'
+
+
+def _existe(cursor, tabela: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [tabela])
+    return cursor.fetchone()[0]
+
+
+def criar_particao(cursor, tabela: str, mes: datetime):
+    """
+    Cria a partição do mês. Se a partição DEFAULT já tiver linhas desse
+    mês, elas são movidas para a nova partição (o PostgreSQL recusaria
+    criá-la diretamente).
+    """
+    coluna = _q(TABELAS[tabela])
+    nome = nome_particao(tabela, mes)
+    padrao = f'{tabela}_padrao'
+    inicio, fim = _literal(mes), _literal(somar_meses(mes, 1))
+
+    if _existe(cursor, padrao):
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {_q(padrao)} WHERE {coluna} >= %s AND {coluna} < %s)',
+            [mes, somar_meses(mes, 1)]
+        )
+        if cursor.fetchone()[0]:
+            cursor.execute(f'CREATE TABLE {_q(nome)} (LIKE {_q(tabela)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            cursor.execute(
+                f'WITH movidas AS ('
+                f'DELETE FROM {_q(padrao)} WHERE {coluna} >= %s AND {coluna} < %s RETURNING *'
+                f') INSERT INTO {_q(nome)} SELECT * FROM movidas',
+                [mes, somar_meses(mes, 1)]
+            )
+            cursor.execute(
+                f'ALTER TABLE {_q(tabela)} ATTACH PARTITION {_q(nome)} '
+                f'FOR VALUES FROM ({inicio}) TO ({fim})'
+            )
+            return
+
+    cursor.execute(
+        f'CREATE TABLE {_q(nome)} PARTITION OF {_q(tabela)} FOR VALUES FROM ({inicio}) TO ({fim})'
+    )
+
+
+def listar_particoes(cursor, tabela: str) -> dict[str, datetime]:
+    """Partições mensais anexadas à tabela: {nome: início do mês}"""
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass",
+        [tabela]
+    )
+    padrao = re.compile(rf'^{re.escape(tabela)}_p(\d{{4}})_(\d{{2}})$')
+    particoes = {}
+    for (nome,) in cursor.fetchall():
+        encontrado = padrao.match(nome)
+        if encontrado:
+            ano, mes = int(encontrado.group(1)), int(encontrado.group(2))
+            particoes[nome] = timezone.make_aware(datetime(ano, mes, 1))
+    return particoes
+
+
+def garantir_particoes(meses_futuros: int = None, agora: datetime = None) -> list[str]:
+    """
+    Cria as partições do mês atual e dos próximos meses que ainda não existem.
+
+    Returns:
+        Nomes das partições criadas
+    """
+    if meses_futuros is None:
+        meses_futuros = settings.HISTORICO_PARTICOES_FUTURAS
+    mes_atual = inicio_mes(agora or timezone.now())
+
+    criadas = []
+    for tabela in TABELAS:
+        with transaction.atomic(), connection.cursor() as cursor:
+            existentes = listar_particoes(cursor, tabela)
+            for i in range(meses_futuros + 1):
+                mes = somar_meses(mes_atual, i)
+                if nome_particao(tabela, mes) not in existentes:
+                    criar_particao(cursor, tabela, mes)
+                    criadas.append(nome_particao(tabela, mes))
+    return criadas
+
+
+def planejar_retencao(agora: datetime = None) -> dict:
+    """
+    Calcula o que a retenção removeria, sem alterar nada.
+
+    Returns:
+        {
+            'particoes': [(tabela, nome, mes)] a desanexar,
+            'empresas': [(empresa_id, corte)] com linhas a apagar antes de corte,
+        }
+    """
+    from apps.empresas.models import Empresa
+
+    padrao = settings.HISTORICO_RETENCAO_MESES
+    mes_atual = inicio_mes(agora or timezone.now())
+    retencoes = {
+        empresa_id: padrao if meses is None else meses
+        for empresa_id, meses in Empresa.objects.values_list('id', 'retencao_historico_meses')
+    }
+
+    # Partições só saem quando nenhuma empresa precisa mais delas
+    maior = None
+    if retencoes and 0 not in retencoes.values():
+        maior = max(retencoes.values())
+
+    particoes = []
+    if maior is not None:
+        corte_global = somar_meses(mes_atual, -maior)
+        with connection.cursor() as cursor:
+            for tabela in TABELAS:
+                for nome, mes in sorted(listar_particoes(cursor, tabela).items(), key=lambda p: p[1]):
+                    if mes < corte_global:
+                        particoes.append((tabela, nome, mes))
+
+    empresas = [
+        (empresa_id, somar_meses(mes_atual, -meses))
+        for empresa_id, meses in retencoes.items()
+        if meses > 0 and (maior is None or meses < maior)
+    ]
+    return {'particoes': particoes, 'empresas': empresas}
+
+
+def aplicar_retencao(plano: dict, apagar: bool = False, lote: int = LOTE_EXCLUSAO) -> dict:
+    """
+    Executa o plano de planejar_retencao().
+
+    Args:
+        plano: Resultado de planejar_retencao()
+        apagar: Se True, apaga as partições desanexadas em vez de arquivá-las
+        lote: Linhas apagadas por comando (retenção por empresa)
+
+    Returns:
+        {'particoes': [nomes removidos], 'linhas': {empresa_id: linhas apagadas}}
+    """
+    schema = settings.HISTORICO_SCHEMA_ARQUIVO
+    removidas = []
+
+    for tabela, nome, mes in plano['particoes']:
+        with transaction.atomic(), connection.cursor() as cursor:
+            if tabela == 'execucoes':
+                estatisticas.recalcular(cursor, mes, somar_meses(mes, 1))
+                cursor.execute(
+                    f'UPDATE execucoes_agendadas SET execucao_id = NULL '
+                    f'WHERE execucao_id IN (SELECT id FROM {_q(nome)})'
+                )
+            cursor.execute(f'ALTER TABLE {_q(tabela)} DETACH PARTITION {_q(nome)}')
+            if apagar:
+                cursor.execute(f'DROP TABLE {_q(nome)}')
+            else:
+                # As FKs herdadas impediriam apagar empresas/relatórios arquivados
+                _remover_chaves_estrangeiras(cursor, nome)
+                cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {_q(schema)}')
+                cursor.execute(f'ALTER TABLE {_q(nome)} SET SCHEMA {_q(schema)}')
+        removidas.append(nome)
+
+    linhas = {}
+    for empresa_id, corte in plano['empresas']:
+        with transaction.atomic(), connection.cursor() as cursor:
+            estatisticas.recalcular(cursor, fim=corte, empresa_id=empresa_id)
+
+        linhas[empresa_id] = _apagar_em_lotes(
+            'WITH lote AS ('
+            'SELECT id, iniciado_em FROM execucoes '
+            'WHERE empresa_id = %s AND iniciado_em < %s LIMIT %s'
+            '), desvinculadas AS ('
+            'UPDATE execucoes_agendadas SET execucao_id = NULL '
+            'WHERE execucao_id IN (SELECT id FROM lote)'
+            ') DELETE FROM execucoes WHERE (id, iniciado_em) IN (SELECT id, iniciado_em FROM lote)',
+            [empresa_id, corte], lote
+        )
+        _apagar_em_lotes(
+            'DELETE FROM execucoes_agendadas WHERE (id, iniciado_em) IN ('
+            'SELECT ea.id, ea.iniciado_em FROM execucoes_agendadas ea '
+            'JOIN agendamentos a ON a.id = ea.agendamento_id '
+            'WHERE a.empresa_id = %s AND ea.iniciado_em < %s LIMIT %s)',
+            [empresa_id, corte], lote
+        )
+
+    return {'particoes': removidas, 'linhas': linhas}
+
+
+def _remover_chaves_estrangeiras(cursor, tabela: str):
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [tabela]
+    )
+    for (nome,) in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {_q(tabela)} DROP CONSTRAINT {_q(nome)}')
+
+
+def _apagar_em_lotes(sql: str, parametros: list, lote: int) -> int:
+    """Repete o DELETE (com LIMIT no último parâmetro) até não sobrar nada"""
+    total = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, parametros + [lote])
+            apagadas = cursor.rowcount
+        total += apagadas
+        if apagadas < lote:
+            return total
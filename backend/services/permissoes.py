@@ -1,8 +1,69 @@
 """
 Serviço de verificação de permissões de relatórios.
+
+As permissões de um usuário são carregadas de uma vez como um mapa
+{relatorio_id: nivel}, guardado:
+- no próprio objeto do usuário (vale durante a requisição, como o
+  _perm_cache do ModelBackend do Django)
+- no cache compartilhado, com versão por usuário incrementada sempre
+  que uma Permissao dele é criada, alterada ou removida (sinais em
+  apps/relatorios/signals.py)
 """
+from django.conf import settings
+from django.core.cache import cache
 from apps.relatorios.models import Permissao
 
+PREFIXO = 'permissoes'
+
+
+def _chave_versao(usuario_id) -> str:
+    return f'{PREFIXO}:{usuario_id}:versao'
+
+
+def carregar_permissoes(usuario) -> dict[str, str]:
+    """
+    Retorna o mapa de permissões explícitas do usuário.
+
+    Args:
+        usuario: Instância do usuário
+
+    Returns:
+        dict: {relatorio_id (str): nivel}
+    """
+    mapa = getattr(usuario, '_mapa_permissoes', None)
+    if mapa is not None:
+        return mapa
+
+    versao = cache.get_or_set(_chave_versao(usuario.id), 1, None)
+    chave = f'{PREFIXO}:{usuario.id}:{versao}'
+    mapa = cache.get(chave)
+    if mapa is None:
+        mapa = {
+            str(relatorio_id): nivel
+            for relatorio_id, nivel in Permissao.objects.filter(
+                usuario=usuario
+            ).values_list('relatorio_id', 'nivel')
+        }
+        cache.set(chave, mapa, getattr(settings, 'PERMISSOES_CACHE_TTL_SEGUNDOS', 300))
+
+    usuario._mapa_permissoes = mapa
+    return mapa
+
+
+def invalidar_permissoes(usuario_id):
+    """Invalida o mapa de permissões em cache do usuário (todas as instâncias)"""
+    chave_versao = _chave_versao(usuario_id)
+    # add() não sobrescreve; incr() é atômico nos backends que suportam
+    cache.add(chave_versao, 1, None)
+    try:
+        cache.incr(chave_versao)
+    except ValueError:
+        cache.set(chave_versao, 2, None)
+
+
+def _resolver(nivel: str | None) -> dict:
+    return {'tem_acesso': nivel is not None, 'pode_exportar': nivel == 'EXPORTAR'}
+
 
 def verificar_permissao(relatorio_id: str, usuario) -> dict:
     """
@@ -19,18 +80,31 @@ def verificar_permissao(relatorio_id: str, usuario) -> dict:
     if usuario.role in ['ADMIN', 'TECNICO']:
         return {'tem_acesso': True, 'pode_exportar': True}
 
-    # Buscar permissão explícita
-    try:
-        permissao = Permissao.objects.get(
-            relatorio_id=relatorio_id,
-            usuario=usuario
-        )
+    return _resolver(carregar_permissoes(usuario).get(str(relatorio_id)))
+
+
+def verificar_permissoes(relatorio_ids, usuario) -> dict:
+    """
+    Verifica permissões do usuário em vários relatórios (listagens).
+
+    Args:
+        relatorio_ids: IDs dos relatórios
+        usuario: Instância do usuário
+
+    Returns:
+        dict: {relatorio_id (str): {'tem_acesso': bool, 'pode_exportar': bool}}
+    """
+    if usuario.role in ['ADMIN', 'TECNICO']:
         return {
-            'tem_acesso': True,
-            'pode_exportar': permissao.nivel == 'EXPORTAR'
+            str(relatorio_id): {'tem_acesso': True, 'pode_exportar': True}
+            for relatorio_id in relatorio_ids
         }
-    except Permissao.DoesNotExist:
-        return {'tem_acesso': False, 'pode_exportar': False}
+
+    mapa = carregar_permissoes(usuario)
+    return {
+        str(relatorio_id): _resolver(mapa.get(str(relatorio_id)))
+        for relatorio_id in relatorio_ids
+    }
 
 
 def usuario_pode_ver_relatorio(relatorio_id: str, usuario) -> bool:
@@ -1,14 +1,34 @@
 """
 Serviço para execução de queries SQL.
-Registra todas as execuções no banco para auditoria.
+Registra todas as execuções no banco para auditoria (ver services/auditoria.py).
 """
+import logging
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime
+from functools import cached_property
 from django.utils import timezone
 from apps.relatorios.models import Relatorio
 from apps.execucoes.models import Execucao
 from services.database_connector import DatabaseConnector
-from services.query_params import substituir_parametros
+from services.query_params import executar_sql
+from services.query_template import QueryTemplate, obter_template
+from services.result_serializer import serializar_colunar, serializar_registros
+from services.result_cache import ResultCache
+from services import result_spill
+from services.coalescing import chave_execucao, coalescedor
+from services import execucao_assincrona, execucoes_ativas
+from services.execucoes_ativas import ExecucaoCancelada
+from services.admissao import FilaCheia, controle_admissao
+from services.auditoria import gravador
+
+logger = logging.getLogger(__name__)
+
+# Campos gravados ao finalizar uma execução que já existe no banco
+CAMPOS_FINALIZACAO = [
+    'finalizado_em', 'tempo_execucao_ms', 'tempo_fila_ms', 'sucesso', 'status', 'progresso',
+    'erro', 'qtd_linhas', 'cache_hit', 'coalescida', 'arquivo_resultado',
+]
 
 
 class QueryExecutor:
@@ -27,115 +47,503 @@ class QueryExecutor:
         self.relatorio = relatorio
         self.connector = DatabaseConnector(relatorio.conexao)
 
-    def executar(self, usuario, filtros_valores: dict = None, limite: int = None) -> dict:
+    @property
+    def timeout(self) -> int:
+        """Tempo máximo da query: do relatório ou, se vazio, da conexão (0 = sem limite)"""
+        if self.relatorio.timeout_segundos is not None:
+            return self.relatorio.timeout_segundos
+        return self.relatorio.conexao.timeout_query_segundos
+
+    @cached_property
+    def template(self) -> QueryTemplate:
+        """Query do relatório pré-processada (cacheada por processo)"""
+        return obter_template(self.relatorio)
+
+    def executar(self, usuario, filtros_valores: dict = None, limite: int = None,
+                 contar_total: bool = True, formato_dados: str = 'colunar',
+                 paginado: bool = False) -> dict:
         """
         Executa relatório e retorna resultado.
 
+        A query é limitada no próprio banco (TOP/LIMIT), trazendo no máximo
+        limite + 1 linhas. O total é obtido com um COUNT(*) separado.
+        Se o relatório tiver cache_ttl_segundos, resultados idênticos
+        (mesma query, valores dos filtros, conexão e opções) são servidos do cache.
+        Execuções idênticas simultâneas são agrupadas: só a primeira vai ao
+        banco e as demais recebem o mesmo resultado (coalescida=True).
+
+        Execuções que vão ao banco do cliente são gravadas ao abrir a conexão
+        (status EXECUTANDO, com a sessão no banco), para que possam ser
+        consultadas e canceladas por outra requisição; o estado final segue
+        pelo gravador de auditoria (em lote, fora da requisição) e não
+        sobrescreve um cancelamento feito nesse meio tempo. Resultados do cache
+        ou de execução agrupada são gravados uma única vez, já finalizados. No
+        modo paginado a gravação final é imediata, já que as próximas páginas
+        são lidas pelo ID.
+
         Args:
             usuario: Usuário que está executando
             filtros_valores: Dicionário com valores dos filtros {parametro: valor}
             limite: Limite de linhas para exibição (padrão: limite_linhas_tela do relatório)
+            contar_total: Se True, executa COUNT(*) para informar total_linhas
+            formato_dados: 'colunar' (colunas + linhas como arrays) ou
+                'registros' (lista de dicionários, formato legado)
+            paginado: Se True, grava o resultado completo em disco e retorna a
+                primeira página; as demais saem de /historico/{id}/pagina/
 
         Returns:
             Dicionário com resultado da execução:
             {
                 'sucesso': bool,
+                'formato_dados': str,
                 'colunas': list,
-                'dados': list,
-                'total_linhas': int,
+                'linhas': list,  # ou 'dados' (lista de dicts) no formato 'registros'
+                'total_linhas': int | None,
                 'linhas_exibidas': int,
+                'possui_mais': bool,
+                'paginado': bool,  # só no modo paginado
                 'tempo_ms': int,
+                'cache_hit': bool,
+                'coalescida': bool,
                 'execucao_id': str
             }
             Ou em caso de erro:
             {
                 'sucesso': False,
-                'erro': str
+                'erro': str,
+                'status': str,  # ERRO, TIMEOUT ou CANCELADO
+                'execucao_id': str  # ausente em erro de filtro
             }
+
+        Raises:
+            FilaCheia: Limite de execuções simultâneas atingido e fila cheia
         """
         inicio = datetime.now()
-        limite = limite or self.relatorio.limite_linhas_tela
+        opcoes = self._opcoes(limite, contar_total, formato_dados, paginado)
+
+        parametros, erro = self.template.parametros(filtros_valores)
+        if erro:
+            return {'sucesso': False, 'erro': erro}
+
+        # Registro de execução (gravado ao ir ao banco ou ao finalizar)
+        execucao = Execucao(
+            empresa=self.relatorio.empresa,
+            relatorio=self.relatorio,
+            usuario=usuario,
+            filtros_usados=filtros_valores,
+            status=Execucao.Status.EXECUTANDO
+        )
+
+        return self._processar(execucao, inicio, parametros, opcoes)
 
-        # Buscar filtros do relatório
-        filtros = list(self.relatorio.filtros.all())
+    def executar_assincrono(self, usuario, filtros_valores: dict = None, limite: int = None,
+                            contar_total: bool = True, formato_dados: str = 'colunar',
+                            paginado: bool = False) -> dict:
+        """
+        Enfileira a execução no pool local e retorna imediatamente.
+
+        Os filtros são validados antes de enfileirar. O andamento é acompanhado
+        por Execucao.status/progresso e o resultado (mesmo formato de executar())
+        fica disponível em execucao_assincrona.obter_resultado().
 
-        # Substituir parâmetros na query se houver filtros
-        query = self.relatorio.query_sql
-        if filtros and filtros_valores:
-            query, erro = substituir_parametros(query, filtros, filtros_valores)
-            if erro:
-                return {'sucesso': False, 'erro': erro}
+        Returns:
+            {'sucesso': True, 'execucao_id': str, 'status': 'PENDENTE'}
+            Ou em caso de erro de filtro:
+            {'sucesso': False, 'erro': str}
+        """
+        opcoes = self._opcoes(limite, contar_total, formato_dados, paginado)
+
+        parametros, erro = self.template.parametros(filtros_valores)
+        if erro:
+            return {'sucesso': False, 'erro': erro}
 
-        # Criar registro de execução
         execucao = Execucao.objects.create(
             empresa=self.relatorio.empresa,
             relatorio=self.relatorio,
             usuario=usuario,
-            filtros_usados=filtros_valores
+            filtros_usados=filtros_valores,
+            status=Execucao.Status.PENDENTE
+        )
+
+        resposta = {
+            'sucesso': True,
+            'execucao_id': str(execucao.id),
+            'status': execucao.status
+        }
+
+        execucao_assincrona.enviar(
+            self._executar_em_segundo_plano,
+            execucao, parametros, opcoes
         )
 
+        return resposta
+
+    def _executar_em_segundo_plano(self, execucao, parametros: list | None, opcoes: dict):
+        """
+        Roda em uma thread do pool e guarda o resultado para consulta.
+        Qualquer falha fora da query (cache, gravação do resultado, banco da
+        aplicação) encerra a execução como ERRO, para que a consulta de
+        status não fique esperando.
+        """
         try:
-            # Executar query
-            conn = self.connector.get_connection()
-            df = pd.read_sql(query, conn)
-            conn.close()
+            resultado = self._rodar_em_segundo_plano(execucao, parametros, opcoes)
+            execucao_assincrona.salvar_resultado(execucao.id, resultado)
+        except Exception as e:
+            logger.exception('Falha na execução assíncrona %s', execucao.id)
+            self._encerrar_com_erro(execucao, e)
+
+    def _rodar_em_segundo_plano(self, execucao, parametros: list | None, opcoes: dict) -> dict:
+        """Marca a execução como EXECUTANDO e a processa; devolve o resultado"""
+        inicio = datetime.now()
+
+        # Cancelada enquanto aguardava na fila
+        iniciou = Execucao.objects.filter(
+            pk=execucao.pk, status=Execucao.Status.PENDENTE
+        ).update(status=Execucao.Status.EXECUTANDO)
+        if not iniciou:
+            return {
+                'sucesso': False,
+                'erro': 'Execução cancelada pelo usuário',
+                'status': Execucao.Status.CANCELADO,
+                'execucao_id': str(execucao.id)
+            }
+        execucao.status = Execucao.Status.EXECUTANDO
+
+        try:
+            return self._processar(
+                execucao, inicio, parametros, opcoes, acompanhar_progresso=True
+            )
+        except FilaCheia as e:
+            return {
+                'sucesso': False,
+                'erro': str(e),
+                'status': execucao.status,
+                'execucao_id': str(execucao.id)
+            }
+
+    @staticmethod
+    def _encerrar_com_erro(execucao, erro: Exception):
+        """
+        Grava ERRO na execução (se ainda não finalizada) e o resultado de
+        erro. Se nem isso for possível, a execução fica para
+        execucao_assincrona.encerrar_abandonadas().
+        """
+        try:
+            Execucao.objects.filter(
+                pk=execucao.pk,
+                status__in=[Execucao.Status.PENDENTE, Execucao.Status.EXECUTANDO]
+            ).update(
+                status=Execucao.Status.ERRO, sucesso=False, erro=str(erro),
+                finalizado_em=timezone.now()
+            )
+            execucao_assincrona.salvar_resultado(execucao.id, {
+                'sucesso': False,
+                'erro': str(erro),
+                'status': Execucao.Status.ERRO,
+                'execucao_id': str(execucao.id)
+            })
+        except Exception:
+            logger.exception('Não foi possível encerrar a execução assíncrona %s', execucao.id)
+
+    def _opcoes(self, limite: int, contar_total: bool, formato_dados: str,
+                paginado: bool) -> dict:
+        """Opções que alteram o resultado (também compõem as chaves de cache)"""
+        return {
+            'limite': limite or self.relatorio.limite_linhas_tela,
+            'contar_total': contar_total,
+            'formato_dados': formato_dados,
+            'paginado': paginado,
+        }
+
+    def _processar(self, execucao, inicio: datetime, parametros: list | None, opcoes: dict,
+                   acompanhar_progresso: bool = False) -> dict:
+        """
+        Obtém o resultado (cache, execução em andamento ou banco) e
+        finaliza o registro de execução.
+
+        Args:
+            acompanhar_progresso: Se True, atualiza Execucao.progresso a cada etapa
+
+        Returns:
+            Resultado no formato de executar()
+        """
+        progresso = self._atualizar_progresso(execucao) if acompanhar_progresso else None
+        # Execuções assíncronas (já gravadas) e paginadas são lidas pelo ID em seguida
+        gravar_imediato = opcoes['paginado'] or not execucao._state.adding
+
+        # Cache de resultado (opcional por relatório)
+        cache_resultado = ResultCache(self.relatorio)
+        chave_cache = None
+        resultado = None
+        if cache_resultado.ativo:
+            chave_cache = cache_resultado.chave(self.template.query, parametros=parametros, **opcoes)
+            resultado = cache_resultado.obter(chave_cache)
+            execucao.cache_hit = resultado is not None
+
+        try:
+            if resultado is None:
+                chave_voo = chave_execucao(
+                    self.relatorio.conexao_id, self.template.query, parametros=parametros, **opcoes
+                )
+                resultado, execucao.coalescida = coalescedor.executar(
+                    chave_voo,
+                    lambda: self._executar_no_banco(execucao, parametros, opcoes, progresso)
+                )
+                if chave_cache and not execucao.coalescida:
+                    cache_resultado.salvar(chave_cache, resultado)
 
             tempo_ms = int((datetime.now() - inicio).total_seconds() * 1000)
-            total_linhas = len(df)
-
-            # Limitar linhas para exibição
-            df_limitado = df.head(limite)
-
-            # Converter para dicionário e tratar valores NaN/None
-            import json
-            import numpy as np
-
-            # Substituir NaN, inf e -inf por None
-            dados = df_limitado.replace([np.inf, -np.inf, np.nan], None).to_dict('records')
-
-            # Garantir que todos os valores são JSON serializáveis
-            dados_limpos = []
-            for row in dados:
-                row_limpo = {}
-                for key, value in row.items():
-                    if pd.isna(value) or value is pd.NaT or value is pd.NA:
-                        row_limpo[key] = None
-                    elif isinstance(value, (np.integer, np.floating)):
-                        if np.isnan(value) or np.isinf(value):
-                            row_limpo[key] = None
-                        else:
-                            row_limpo[key] = value.item()
-                    else:
-                        row_limpo[key] = value
-                dados_limpos.append(row_limpo)
 
             # Atualizar execução
             execucao.finalizado_em = timezone.now()
             execucao.tempo_execucao_ms = tempo_ms
             execucao.sucesso = True
-            execucao.qtd_linhas = total_linhas
-            execucao.save()
+            execucao.status = Execucao.Status.CONCLUIDO
+            execucao.progresso = 100
+            execucao.qtd_linhas = resultado['total_linhas']
+            execucao.arquivo_resultado = resultado.get('arquivo_resultado', '')
+            self._gravar(execucao, gravar_imediato)
 
             return {
                 'sucesso': True,
-                'colunas': df_limitado.columns.tolist(),
-                'dados': dados_limpos,
-                'total_linhas': total_linhas,
-                'linhas_exibidas': len(df_limitado),
+                **{k: v for k, v in resultado.items() if k != 'arquivo_resultado'},
                 'tempo_ms': tempo_ms,
+                'cache_hit': execucao.cache_hit,
+                'coalescida': execucao.coalescida,
                 'execucao_id': str(execucao.id)
             }
 
         except Exception as e:
             tempo_ms = int((datetime.now() - inicio).total_seconds() * 1000)
 
+            if isinstance(e, ExecucaoCancelada):
+                execucao.status = Execucao.Status.CANCELADO
+                execucao.erro = str(e)
+            elif self.connector.eh_timeout(e):
+                execucao.status = Execucao.Status.TIMEOUT
+                execucao.erro = f'A execução excedeu o tempo limite de {self.timeout} segundos'
+            else:
+                execucao.status = Execucao.Status.ERRO
+                execucao.erro = str(e)
+
             execucao.finalizado_em = timezone.now()
             execucao.tempo_execucao_ms = tempo_ms
             execucao.sucesso = False
-            execucao.erro = str(e)
-            execucao.save()
+            self._gravar(execucao, gravar_imediato)
+
+            # Sobrecarga: quem chamou decide (ex.: HTTP 429)
+            if isinstance(e, FilaCheia):
+                raise
 
             return {
                 'sucesso': False,
-                'erro': str(e)
+                'erro': execucao.erro,
+                'status': execucao.status,
+                'execucao_id': str(execucao.id)
             }
+
+    @staticmethod
+    def _gravar(execucao, imediato: bool):
+        """
+        Grava o estado final da execução: INSERT se ela ainda não está no
+        banco (cache ou execução agrupada), senão UPDATE dos campos finais.
+        Com imediato=False, a gravação entra no buffer de auditoria.
+        """
+        if execucao._state.adding:
+            gravador.registrar(execucao, imediato=imediato)
+        else:
+            gravador.atualizar(execucao, CAMPOS_FINALIZACAO, imediato=imediato, finalizada=True)
+
+    def _executar_no_banco(self, execucao, parametros: list | None, opcoes: dict,
+                           progresso=None) -> dict:
+        """
+        Executa a query respeitando o limite de execuções simultâneas da
+        empresa e da conexão. O tempo de espera fica em execucao.tempo_fila_ms.
+
+        Raises:
+            FilaCheia: Se a fila de espera estiver cheia ou a espera esgotar
+        """
+        with controle_admissao.admitir(self.relatorio.empresa, self.relatorio.conexao) as tempo_fila_ms:
+            execucao.tempo_fila_ms = tempo_fila_ms
+            if opcoes['paginado']:
+                return self._executar_query_paginada(execucao, parametros, opcoes, progresso)
+            return self._executar_query(
+                execucao, parametros, opcoes['limite'], opcoes['contar_total'],
+                opcoes['formato_dados'], progresso
+            )
+
+    @staticmethod
+    def _atualizar_progresso(execucao):
+        """Retorna função que grava o percentual concluído da execução (em lote)"""
+        def atualizar(percentual: int):
+            execucao.progresso = percentual
+            gravador.atualizar(execucao, ['progresso'])
+        return atualizar
+
+    @contextmanager
+    def _cursor(self, execucao):
+        """
+        Abre conexão e cursor com o timeout aplicado e registra a query como
+        ativa, para que cancelar() (mesmo processo) ou a sessão gravada em
+        Execucao.sessao_banco (outro processo) possam interrompê-la.
+        Execuções síncronas são gravadas aqui, num único INSERT que já leva a
+        sessão; as assíncronas (já gravadas) só recebem a sessão.
+
+        Raises:
+            ExecucaoCancelada: Se a execução foi cancelada antes ou durante a query
+        """
+        conn = self.connector.get_connection()
+        try:
+            self.connector.aplicar_timeout(conn, self.timeout)
+            cursor = conn.cursor()
+            execucoes_ativas.registrar(execucao.id, self.connector, conn, cursor)
+            try:
+                self._gravar_inicio(execucao, self.connector.identificar_sessao(conn))
+
+                yield cursor
+            except ExecucaoCancelada:
+                raise
+            except Exception as e:
+                cancelada = Execucao.objects.filter(
+                    pk=execucao.id, status=Execucao.Status.CANCELADO
+                ).exists()
+                if cancelada:
+                    raise ExecucaoCancelada('Execução cancelada pelo usuário') from e
+                raise
+            finally:
+                execucoes_ativas.remover(execucao.id)
+                cursor.close()
+                self.connector.restaurar_timeout(conn)
+        finally:
+            # Devolve ao pool mesmo em caso de erro
+            conn.close()
+
+    @staticmethod
+    def _gravar_inicio(execucao, sessao: str):
+        """
+        Grava a execução com a sessão no banco. Se ela já existia (assíncrona),
+        confirma que não foi cancelada até aqui.
+
+        Raises:
+            ExecucaoCancelada: Se a execução foi cancelada enquanto aguardava
+        """
+        execucao.sessao_banco = sessao
+        if execucao._state.adding:
+            execucao.save(force_insert=True)
+            return
+
+        ativa = Execucao.objects.filter(pk=execucao.id).exclude(
+            status=Execucao.Status.CANCELADO
+        ).update(sessao_banco=sessao)
+        if not ativa:
+            raise ExecucaoCancelada('Execução cancelada pelo usuário')
+
+    def _executar_query(self, execucao, parametros: list | None, limite: int,
+                        contar_total: bool, formato_dados: str, progresso=None) -> dict:
+        """
+        Executa a query no banco do cliente e monta o resultado serializado.
+
+        Args:
+            execucao: Execucao em andamento (registro para cancelamento)
+            parametros: Valores dos marcadores da query (None se não houver)
+            limite: Quantidade de linhas para exibição
+            contar_total: Se True, executa COUNT(*) quando houver mais linhas
+            formato_dados: 'colunar' ou 'registros'
+            progresso: Função opcional chamada com o percentual concluído
+
+        Returns:
+            Dicionário com formato_dados, colunas, linhas/dados,
+            total_linhas, linhas_exibidas e possui_mais
+        """
+        # Executar query limitada no banco (+1 linha para saber se há mais)
+        query_limitada = self.template.query_limitada(limite + 1)
+        with self._cursor(execucao) as cursor:
+            executar_sql(cursor, query_limitada, parametros)
+            colunas = [desc[0] for desc in cursor.description]
+            df = pd.DataFrame.from_records(cursor.fetchall(), columns=colunas, coerce_float=True)
+            possui_mais = len(df) > limite
+            total_linhas = len(df) if not possui_mais else None
+            if contar_total and possui_mais:
+                if progresso:
+                    progresso(60)
+                total_linhas = self._contar_linhas(cursor, parametros)
+
+        if progresso:
+            progresso(80)
+
+        # Limitar linhas para exibição (query pode não ter sido limitada)
+        df_limitado = df.head(limite)
+
+        # Limpeza de NaN/inf/NaT vetorizada por coluna
+        if formato_dados == 'registros':
+            payload = serializar_registros(df_limitado)
+        else:
+            payload = serializar_colunar(df_limitado)
+
+        return {
+            'formato_dados': formato_dados,
+            **payload,
+            'total_linhas': total_linhas,
+            'linhas_exibidas': len(df_limitado),
+            'possui_mais': possui_mais,
+        }
+
+    def _executar_query_paginada(self, execucao, parametros: list | None, opcoes: dict,
+                                 progresso=None) -> dict:
+        """
+        Executa a query completa, grava o resultado em disco (result_spill)
+        e retorna a primeira página. O total de linhas é exato, sem COUNT(*).
+
+        Args:
+            execucao: Execucao em andamento (o ID dá nome ao arquivo gravado)
+            parametros: Valores dos marcadores da query (None se não houver)
+            opcoes: Opções de _opcoes()
+            progresso: Função opcional chamada com o percentual concluído
+
+        Returns:
+            Mesmo formato de _executar_query, com paginado=True e arquivo_resultado
+        """
+        with self._cursor(execucao) as cursor:
+            executar_sql(cursor, self.template.query, parametros)
+            colunas = [desc[0] for desc in cursor.description]
+            arquivo, total_linhas = result_spill.gravar(execucao.id, cursor, colunas)
+
+        if progresso:
+            progresso(80)
+
+        pagina = result_spill.ler_pagina(arquivo, 0, opcoes['limite'], opcoes['formato_dados'])
+        campo = 'dados' if opcoes['formato_dados'] == 'registros' else 'linhas'
+
+        return {
+            'formato_dados': opcoes['formato_dados'],
+            'colunas': pagina['colunas'],
+            campo: pagina[campo],
+            'total_linhas': total_linhas,
+            'linhas_exibidas': len(pagina[campo]),
+            'possui_mais': total_linhas > opcoes['limite'],
+            'paginado': True,
+            'arquivo_resultado': arquivo,
+        }
+
+    def _contar_linhas(self, cursor, parametros: list | None = None) -> int | None:
+        """
+        Conta o total de linhas da query com COUNT(*) no banco.
+
+        Args:
+            cursor: Cursor da execução (já consumido)
+            parametros: Valores dos marcadores da query (None se não houver)
+
+        Returns:
+            Total de linhas ou None se a contagem não for suportada pela query
+
+        Raises:
+            Exception: Timeout ou cancelamento durante a contagem
+        """
+        try:
+            executar_sql(cursor, self.template.query_contagem, parametros)
+            return int(cursor.fetchone()[0])
+        except Exception as e:
+            if self.connector.eh_timeout(e):
+                raise
+            # Ex.: SQL Server não aceita colunas sem nome em subquery
+            return None
@@ -0,0 +1,174 @@
+"""
+Serviço para limitar queries no próprio banco (limit pushdown).
+Evita trazer a tabela inteira para o Django quando só uma prévia será exibida.
+"""
+import re
+
+# Operadores de conjunto que impedem injetar TOP direto no primeiro SELECT
+SET_OPERATORS = ('UNION', 'EXCEPT', 'INTERSECT', 'MINUS')
+
+
+def _mascarar(query: str) -> str:
+    """
+    Retorna cópia da query (mesmo tamanho) com comentários substituídos por
+    espaços, literais e identificadores delimitados por '#' e conteúdo entre
+    parênteses por '_'. Sobra apenas o nível superior da query, o que
+    permite localizar cláusulas com regex sem falsos positivos.
+
+    Args:
+        query: Query SQL
+
+    Returns:
+        Query mascarada em maiúsculas
+    """
+    resultado = []
+    i = 0
+    profundidade = 0
+    tamanho = len(query)
+
+    while i < tamanho:
+        c = query[i]
+        proximo = query[i + 1] if i + 1 < tamanho else ''
+
+        # Comentário de linha
+        if c == '-' and proximo == '-':
+            fim = query.find('\n', i)
+            fim = tamanho if fim == -1 else fim
+            resultado.append(' ' * (fim - i))
+            i = fim
+            continue
+
+        # Comentário de bloco
+        if c == '/' and proximo == '*':
+            fim = query.find('*/', i + 2)
+            fim = tamanho if fim == -1 else fim + 2
+            resultado.append(' ' * (fim - i))
+            i = fim
+            continue
+
+        # Literais e identificadores delimitados
+        if c in ("'", '"', '`', '['):
+            fechamento = ']' if c == '[' else c
+            j = i + 1
+            while j < tamanho:
+                if query[j] == fechamento:
+                    # Aspas duplicadas são escape dentro do literal
+                    if j + 1 < tamanho and query[j + 1] == fechamento and fechamento != ']':
+                        j += 2
+                        continue
+                    break
+                j += 1
+            fim = min(j + 1, tamanho)
+            # Não é espaço: um literal no fim da query não pode ser cortado por _normalizar
+            resultado.append('#' * (fim - i))
+            i = fim
+            continue
+
+        if c == '(':
+            profundidade += 1
+            resultado.append('_')
+        elif c == ')':
+            profundidade = max(profundidade - 1, 0)
+            resultado.append('_')
+        elif profundidade > 0:
+            resultado.append('_')
+        else:
+            # upper() pode alterar o tamanho de alguns caracteres (ex: ß)
+            maiuscula = c.upper()
+            resultado.append(maiuscula if len(maiuscula) == 1 else c)
+        i += 1
+
+    return ''.join(resultado)
+
+
+def _normalizar(query: str) -> str:
+    """Remove ponto e vírgula, espaços e comentários no final da query"""
+    mascarada = _mascarar(query)
+    fim = len(mascarada.rstrip())
+    while fim > 0 and mascarada[fim - 1] == ';':
+        fim = len(mascarada[:fim - 1].rstrip())
+    return query[:fim]
+
+
+def _possui_clausula(mascarada: str, clausula: str) -> bool:
+    """Verifica se a cláusula aparece no nível superior da query"""
+    padrao = r'\b' + r'\s+'.join(clausula.split()) + r'\b'
+    return re.search(padrao, mascarada) is not None
+
+
+def _posicao_order_by(mascarada: str) -> int | None:
+    """Retorna a posição do ORDER BY de nível superior (ou None)"""
+    matches = list(re.finditer(r'\bORDER\s+BY\b', mascarada))
+    return matches[-1].start() if matches else None
+
+
+def aplicar_limite(query: str, tipo_banco: str, limite: int) -> str:
+    """
+    Reescreve a query para que o próprio banco limite as linhas retornadas.
+
+    - SQL Server: injeta TOP no primeiro SELECT ou envolve a query em subquery
+      (mesma estratégia do MVP: SELECT TOP 1001 * FROM (...) AS subquery);
+      queries com OFFSET/FETCH sempre vão para a subquery, já que TOP e
+      OFFSET não podem ser usados juntos
+    - PostgreSQL/MySQL: adiciona LIMIT ao final ou envolve em subquery quando
+      a query já possui LIMIT próprio
+
+    Args:
+        query: Query SQL (já com parâmetros substituídos)
+        tipo_banco: Tipo da conexão (SQLSERVER, POSTGRESQL, MYSQL)
+        limite: Quantidade máxima de linhas
+
+    Returns:
+        Query limitada. Se não for possível limitar com segurança,
+        retorna a query original (o executor ainda corta o resultado).
+    """
+    query = _normalizar(query)
+    mascarada = _mascarar(query)
+    limite = int(limite)
+
+    if tipo_banco == 'SQLSERVER':
+        inicio = re.match(r'\s*SELECT\b(\s+(?:DISTINCT|ALL)\b)?', mascarada)
+        possui_top = inicio is not None and re.match(r'\s+TOP\b', mascarada[inicio.end():]) is not None
+        possui_set = any(_possui_clausula(mascarada, op) for op in SET_OPERATORS)
+        possui_offset = _possui_clausula(mascarada, 'OFFSET') or _possui_clausula(mascarada, 'FETCH')
+
+        if inicio and not possui_top and not possui_set and not possui_offset:
+            return f"{query[:inicio.end()]} TOP {limite}{query[inicio.end():]}"
+
+        # ORDER BY só é aceito em subquery junto de TOP ou OFFSET
+        possui_order_by = _posicao_order_by(mascarada) is not None
+        if not possui_order_by or possui_top or possui_offset:
+            return f"SELECT TOP {limite} * FROM (\n{query}\n) AS subquery"
+
+        return query
+
+    if tipo_banco in ('POSTGRESQL', 'MYSQL'):
+        if any(_possui_clausula(mascarada, c) for c in ('LIMIT', 'OFFSET', 'FETCH', 'FOR UPDATE')):
+            return f"SELECT * FROM (\n{query}\n) AS subquery LIMIT {limite}"
+        return f"{query}\nLIMIT {limite}"
+
+    return query
+
+
+def montar_query_contagem(query: str) -> str:
+    """
+    Monta query COUNT(*) sobre a query do relatório.
+    O ORDER BY final é removido por não alterar a contagem (e não ser
+    aceito em subqueries do SQL Server sem TOP/OFFSET).
+
+    Args:
+        query: Query SQL (já com parâmetros substituídos)
+
+    Returns:
+        Query que retorna uma única linha com o total de registros
+    """
+    query = _normalizar(query)
+    mascarada = _mascarar(query)
+
+    posicao = _posicao_order_by(mascarada)
+    if posicao is not None:
+        restante = mascarada[posicao:]
+        if not any(_possui_clausula(restante, c) for c in ('LIMIT', 'OFFSET', 'FETCH')):
+            query = query[:posicao].rstrip()
+
+    return f"SELECT COUNT(*) FROM (\n{query}\n) AS subquery"
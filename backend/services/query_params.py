@@ -1,137 +1,281 @@
 """
-Serviço para substituição de parâmetros em queries SQL.
+Serviço para parâmetros em queries SQL.
 Usado para filtros dinâmicos em relatórios.
+
+Os placeholders (@parametro) são convertidos para o estilo nativo do driver
+('?' no pyodbc, '%s' no psycopg2/pymysql) e os valores seguem em uma lista
+separada. O texto da query fica igual entre execuções, o que permite ao
+banco reaproveitar o plano (SQL Server) e elimina o escape manual de valores.
 """
 from datetime import datetime, date
-import re
+
+# Estilo de parâmetro de cada driver
+PLACEHOLDERS = {
+    'SQLSERVER': '?',
+    'POSTGRESQL': '%s',
+    'MYSQL': '%s',
+}
 
 
-def substituir_parametros(query: str, filtros: list, valores: dict) -> tuple[str, str | None]:
+def _tokenizar(query: str) -> list[tuple[str, str]]:
     """
-    Substitui placeholders na query pelos valores dos filtros.
+    Divide a query em trechos de SQL e parâmetros (@nome) em uma única passada.
+
+    Literais, identificadores delimitados e comentários ficam dentro dos
+    trechos de SQL, então um @nome dentro deles não é tratado como parâmetro.
+    Variáveis de sistema (@@ROWCOUNT) também são ignoradas.
+
+    Returns:
+        Lista de (tipo, texto), tipo 'sql' ou 'param'
+    """
+    tokens = []
+    inicio_sql = 0
+    i = 0
+    tamanho = len(query)
+
+    while i < tamanho:
+        c = query[i]
+        proximo = query[i + 1] if i + 1 < tamanho else ''
+
+        # Comentário de linha
+        if c == '-' and proximo == '-':
+            fim = query.find('\n', i)
+            i = tamanho if fim == -1 else fim
+            continue
+
+        # Comentário de bloco
+        if c == '/' and proximo == '*':
+            fim = query.find('*/', i + 2)
+            i = tamanho if fim == -1 else fim + 2
+            continue
+
+        # Literais e identificadores delimitados
+        if c in ("'", '"', '`', '['):
+            fechamento = ']' if c == '[' else c
+            j = i + 1
+            while j < tamanho:
+                if query[j] == fechamento:
+                    # Aspas duplicadas são escape dentro do literal
+                    if j + 1 < tamanho and query[j + 1] == fechamento and fechamento != ']':
+                        j += 2
+                        continue
+                    break
+                j += 1
+            i = j + 1
+            continue
+
+        if c == '@':
+            # @@variavel de sistema: pula inteira
+            if proximo == '@':
+                j = i + 2
+                while j < tamanho and (query[j].isalnum() or query[j] == '_'):
+                    j += 1
+                i = j
+                continue
+
+            j = i + 1
+            while j < tamanho and (query[j].isalnum() or query[j] == '_'):
+                j += 1
+
+            if j > i + 1:
+                if i > inicio_sql:
+                    tokens.append(('sql', query[inicio_sql:i]))
+                tokens.append(('param', query[i:j]))
+                inicio_sql = j
+            i = max(j, i + 1)
+            continue
+
+        i += 1
+
+    if inicio_sql < tamanho:
+        tokens.append(('sql', query[inicio_sql:]))
+
+    return tokens
+
+
+def compilar_query(query: str, filtros: list, valores: dict,
+                   tipo_banco: str) -> tuple[str, list | None, str | None]:
+    """
+    Converte os placeholders dos filtros em parâmetros do driver.
 
     Args:
         query: Query SQL com placeholders (ex: @data_inicio)
         filtros: Lista de objetos Filtro do relatório
         valores: Dicionário com valores fornecidos pelo usuário {parametro: valor}
+        tipo_banco: Tipo da conexão (SQLSERVER, POSTGRESQL, MYSQL)
 
     Returns:
-        Tupla (query_final, erro):
-        - query_final: Query com parâmetros substituídos
+        Tupla (query_final, parametros, erro):
+        - query_final: Query com placeholders do driver
+        - parametros: Valores na ordem dos placeholders, ou None se não houver
+          (nesse caso a query deve ser executada sem parâmetros)
         - erro: Mensagem de erro ou None se sucesso
 
     Example:
         >>> filtros = [Filtro(parametro='@data', tipo='DATA', obrigatorio=True, label='Data')]
-        >>> valores = {'@data': '2024-01-01'}
-        >>> query_final, erro = substituir_parametros(
+        >>> compilar_query(
         ...     "SELECT * FROM vendas WHERE data = @data",
         ...     filtros,
-        ...     valores
+        ...     {'@data': '2024-01-01'},
+        ...     'SQLSERVER'
         ... )
-        >>> query_final
-        "SELECT * FROM vendas WHERE data = '2024-01-01'"
+        ('SELECT * FROM vendas WHERE data = ?', [datetime.date(2024, 1, 1)], None)
+    """
+    valores_filtros, erro = converter_filtros(filtros, valores)
+    if erro:
+        return '', None, erro
+
+    query_final, ordem = montar_query_driver(query, valores_filtros.keys(), tipo_banco)
+    if not ordem:
+        return query, None, None
+    return query_final, [valores_filtros[parametro] for parametro in ordem], None
+
+
+def converter_filtros(filtros: list, valores: dict) -> tuple[dict, str | None]:
     """
-    query_final = query
+    Valida os valores informados e converte cada um para o tipo do filtro.
+
+    Args:
+        filtros: Lista de objetos Filtro do relatório
+        valores: Dicionário com valores fornecidos pelo usuário {parametro: valor}
+
+    Returns:
+        Tupla (valores_convertidos, erro). valores_convertidos é {parametro: valor};
+        filtros opcionais sem valor recebem o valor padrão ou None (NULL).
+    """
+    valores = valores or {}
+    valores_filtros = {}
 
     for filtro in filtros:
-        param = filtro.parametro
-        valor = valores.get(param)
+        valor = valores.get(filtro.parametro)
 
         # Validar obrigatórios
         if filtro.obrigatorio and (valor is None or valor == ''):
-            return '', f'Filtro "{filtro.label}" é obrigatório'
+            return {}, f'Filtro "{filtro.label}" é obrigatório'
 
-        # Se não for obrigatório e não tiver valor, usar valor padrão ou pular
+        # Se não for obrigatório e não tiver valor, usar valor padrão ou NULL
         if valor is None or valor == '':
-            if filtro.valor_padrao:
-                valor = filtro.valor_padrao
-            else:
-                # Se não tem valor e não é obrigatório, substituir por NULL
-                valor_formatado = 'NULL'
-                query_final = query_final.replace(param, valor_formatado)
-                continue
+            valor = filtro.valor_padrao or None
 
-        # Formatar valor de acordo com o tipo
         try:
-            valor_formatado = formatar_valor(valor, filtro.tipo, getattr(filtro, 'formato_data', None))
+            valores_filtros[filtro.parametro] = converter_valor(
+                valor, filtro.tipo, getattr(filtro, 'formato_data', None)
+            )
         except ValueError as e:
-            return '', f'Erro no filtro "{filtro.label}": {str(e)}'
+            return {}, f'Erro no filtro "{filtro.label}": {str(e)}'
+
+    return valores_filtros, None
+
+
+def montar_query_driver(query: str, parametros, tipo_banco: str) -> tuple[str, list[str]]:
+    """
+    Troca os placeholders conhecidos pelo marcador do driver.
+    Depende apenas do texto da query e dos nomes dos filtros, então o
+    resultado pode ser reaproveitado entre execuções (ver query_template).
+
+    Args:
+        query: Query SQL com placeholders (ex: @data_inicio)
+        parametros: Nomes dos parâmetros dos filtros
+        tipo_banco: Tipo da conexão (SQLSERVER, POSTGRESQL, MYSQL)
+
+    Returns:
+        Tupla (query_final, ordem). ordem lista o parâmetro de cada marcador,
+        na posição em que aparece; vazia se a query não usa nenhum filtro
+        (nesse caso query_final é a query original).
+    """
+    parametros = set(parametros)
+    tokens = _tokenizar(query)
+    if not any(tipo == 'param' and texto in parametros for tipo, texto in tokens):
+        return query, []
+
+    placeholder = PLACEHOLDERS.get(tipo_banco, '%s')
+    partes = []
+    ordem = []
 
-        # Substituir na query
-        query_final = query_final.replace(param, valor_formatado)
+    for tipo, texto in tokens:
+        if tipo == 'param' and texto in parametros:
+            partes.append(placeholder)
+            ordem.append(texto)
+        elif placeholder == '%s':
+            # Com parâmetros, psycopg2/pymysql interpretam '%' no texto todo
+            partes.append(texto.replace('%', '%%'))
+        else:
+            partes.append(texto)
 
-    return query_final, None
+    return ''.join(partes), ordem
 
 
-def formatar_valor(valor, tipo: str, formato_data: str = None) -> str:
+def converter_valor(valor, tipo: str, formato_data: str = None):
     """
-    Formata valor para uso seguro em SQL.
+    Converte o valor do filtro para o tipo Python enviado ao driver.
 
     Args:
-        valor: Valor a ser formatado
+        valor: Valor informado
         tipo: Tipo do filtro (DATA, TEXTO, NUMERO, LISTA)
-        formato_data: Formato customizado para datas
+        formato_data: Formato customizado para datas. Quando informado,
+            a data é enviada como texto nesse formato (colunas de data em texto)
 
     Returns:
-        String formatada para inserção na query SQL
+        date, str, int, float ou None
 
     Raises:
-        ValueError: Se o valor não puder ser formatado para o tipo especificado
+        ValueError: Se o valor não puder ser convertido para o tipo especificado
     """
     if valor is None or valor == '':
-        return 'NULL'
+        return None
 
     if tipo == 'DATA':
         fmt = formato_data if formato_data else '%Y-%m-%d'
-        
+
         # Aceita string ISO ou objeto date/datetime
-        if isinstance(valor, datetime):
-            return f"'{valor.strftime(fmt)}'"
-        elif isinstance(valor, date):
-            return f"'{valor.strftime(fmt)}'"
+        if isinstance(valor, (datetime, date)):
+            date_obj = valor
         else:
-            # Validar formato de data
             try:
                 # Tenta parsear do formato ISO (que vem do frontend geralmente)
                 # ou do próprio formato customizado se vier como string já no formato
                 if '-' in str(valor):
                     date_obj = datetime.strptime(str(valor), '%Y-%m-%d')
                 else:
-                    # Tenta parsear com o formato customizado se possível, 
-                    # mas geralmente o input do frontend é YYYY-MM-DD
                     date_obj = datetime.strptime(str(valor), fmt)
-                
-                return f"'{date_obj.strftime(fmt)}'"
             except ValueError:
                 # Fallback: tenta parsear ISO de qualquer forma
                 try:
                     date_obj = datetime.strptime(str(valor).split('T')[0], '%Y-%m-%d')
-                    return f"'{date_obj.strftime(fmt)}'"
                 except ValueError:
                     raise ValueError(f'Data inválida: {valor}. Use formato YYYY-MM-DD ou {fmt}')
 
-    elif tipo == 'TEXTO' or tipo == 'LISTA':
-        # Escapar aspas simples para prevenir SQL injection
-        valor_escapado = str(valor).replace("'", "''")
-        return f"'{valor_escapado}'"
+        if formato_data:
+            return date_obj.strftime(formato_data)
+        return date_obj.date() if isinstance(date_obj, datetime) else date_obj
 
     elif tipo == 'NUMERO':
         try:
-            # Tenta converter para float para validar
             valor_num = float(valor)
-            return str(valor_num)
         except (ValueError, TypeError):
             raise ValueError(f'Número inválido: {valor}')
+        # Inteiros seguem como int para não forçar conversão da coluna no banco
+        return int(valor_num) if valor_num.is_integer() else valor_num
+
+    # TEXTO, LISTA e tipos desconhecidos
+    return str(valor)
 
-    # Tipo desconhecido - tratar como texto
-    valor_escapado = str(valor).replace("'", "''")
-    return f"'{valor_escapado}'"
+
+def executar_sql(cursor, query: str, parametros: list | None = None):
+    """
+    Executa a query no cursor com ou sem parâmetros.
+    pyodbc trataria None como um parâmetro, então sem parâmetros a chamada
+    é feita só com a query.
+    """
+    if parametros:
+        return cursor.execute(query, parametros)
+    return cursor.execute(query)
 
 
 def extrair_parametros_query(query: str) -> list[str]:
     """
     Extrai todos os parâmetros (placeholders) de uma query SQL.
-    Busca por padrão @nome_parametro.
+    Busca por @nome_parametro fora de literais e comentários.
 
     Args:
         query: Query SQL
@@ -143,7 +287,5 @@ def extrair_parametros_query(query: str) -> list[str]:
         >>> extrair_parametros_query("SELECT * FROM vendas WHERE data = @data AND vendedor = @vendedor")
         ['@data', '@vendedor']
     """
-    # Padrão: @ seguido de letras, números ou underscore
-    parametros = re.findall(r'@\w+', query)
-    # Retornar lista única (sem duplicatas)
-    return list(set(parametros))
+    # Retornar lista única (sem duplicatas), na ordem em que aparecem
+    return list(dict.fromkeys(texto for tipo, texto in _tokenizar(query) if tipo == 'param'))
@@ -0,0 +1,117 @@
+"""
+Queries de relatórios pré-processadas (templates).
+A query do relatório é analisada uma única vez: posição dos parâmetros,
+marcadores do driver e variantes limitada/contagem ficam em memória,
+junto com os filtros, evitando reprocessar o SQL e buscar os filtros
+no banco a cada execução.
+"""
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from services.query_params import converter_filtros, montar_query_driver
+from services.query_limit import aplicar_limite, montar_query_contagem
+
+
+class QueryTemplate:
+    """
+    Query de um relatório pronta para execução.
+
+    - query: query com os marcadores do driver ('?' ou '%s')
+    - ordem: parâmetro correspondente a cada marcador
+    - filtros: filtros do relatório (validação e conversão dos valores)
+    """
+
+    # Variantes limitadas guardadas por template (limites distintos são poucos)
+    MAX_VARIANTES_LIMITE = 8
+
+    def __init__(self, query_sql: str, filtros: list, tipo_banco: str):
+        self.tipo_banco = tipo_banco
+        self.filtros = filtros
+        self.query, self.ordem = montar_query_driver(
+            query_sql, [filtro.parametro for filtro in filtros], tipo_banco
+        )
+        self._limitadas = {}
+        self._contagem = None
+
+    def parametros(self, valores: dict = None) -> tuple[list | None, str | None]:
+        """
+        Valida os valores dos filtros e monta a lista de parâmetros.
+
+        Returns:
+            Tupla (parametros, erro). parametros é None se a query não usa filtros.
+        """
+        if not self.filtros:
+            return None, None
+
+        valores_filtros, erro = converter_filtros(self.filtros, valores)
+        if erro:
+            return None, erro
+        if not self.ordem:
+            return None, None
+        return [valores_filtros[parametro] for parametro in self.ordem], None
+
+    def query_limitada(self, limite: int) -> str:
+        """Query limitada no próprio banco (ver query_limit.aplicar_limite)"""
+        query = self._limitadas.get(limite)
+        if query is None:
+            query = aplicar_limite(self.query, self.tipo_banco, limite)
+            if len(self._limitadas) >= self.MAX_VARIANTES_LIMITE:
+                self._limitadas.clear()
+            self._limitadas[limite] = query
+        return query
+
+    @property
+    def query_contagem(self) -> str:
+        """Query COUNT(*) sobre a query (ver query_limit.montar_query_contagem)"""
+        if self._contagem is None:
+            self._contagem = montar_query_contagem(self.query)
+        return self._contagem
+
+
+_templates = OrderedDict()  # relatorio_id -> (versao, QueryTemplate)
+_lock = threading.Lock()
+
+
+def _versao(relatorio) -> tuple:
+    # atualizado_em muda ao salvar o relatório ou os filtros
+    return (relatorio.atualizado_em, relatorio.conexao.tipo)
+
+
+def obter_template(relatorio) -> QueryTemplate:
+    """
+    Retorna o template do relatório, montando-o se não houver um
+    da versão atual em memória (LRU limitado por QUERY_TEMPLATE_CACHE_MAX).
+
+    Args:
+        relatorio: Instância de Relatorio
+
+    Returns:
+        QueryTemplate
+    """
+    versao = _versao(relatorio)
+
+    with _lock:
+        item = _templates.get(relatorio.id)
+        if item is not None and item[0] == versao:
+            _templates.move_to_end(relatorio.id)
+            return item[1]
+
+    template = QueryTemplate(
+        relatorio.query_sql,
+        list(relatorio.filtros.all()),
+        relatorio.conexao.tipo
+    )
+
+    with _lock:
+        _templates[relatorio.id] = (versao, template)
+        _templates.move_to_end(relatorio.id)
+        while len(_templates) > getattr(settings, 'QUERY_TEMPLATE_CACHE_MAX', 1000):
+            _templates.popitem(last=False)
+
+    return template
+
+
+def invalidar(relatorio_id):
+    """Descarta o template do relatório neste processo"""
+    with _lock:
+        _templates.pop(relatorio_id, None)
@@ -10,6 +10,11 @@ BLOCKED_KEYWORDS = [
     'BACKUP', 'RESTORE', 'SHUTDOWN'
 ]
 
+# Compiladas uma vez no carregamento do módulo
+_COMENTARIO_LINHA = re.compile(r'--.*$', re.MULTILINE)
+_COMENTARIO_BLOCO = re.compile(r'/\*.*?\*/', re.DOTALL)
+_KEYWORDS_BLOQUEADAS = re.compile(r'\b(' + '|'.join(BLOCKED_KEYWORDS) + r')\b')
+
 
 def validar_query(query: str) -> tuple[bool, str | None]:
     """
@@ -27,8 +32,8 @@ def validar_query(query: str) -> tuple[bool, str | None]:
     query_upper = query.upper().strip()
 
     # Remover comentários
-    query_sem_comentarios = re.sub(r'--.*$', '', query_upper, flags=re.MULTILINE)
-    query_sem_comentarios = re.sub(r'/\*.*?\*/', '', query_sem_comentarios, flags=re.DOTALL)
+    query_sem_comentarios = _COMENTARIO_LINHA.sub('', query_upper)
+    query_sem_comentarios = _COMENTARIO_BLOCO.sub('', query_sem_comentarios)
     query_sem_comentarios = query_sem_comentarios.strip()
 
     if not query_sem_comentarios:
@@ -38,10 +43,9 @@ def validar_query(query: str) -> tuple[bool, str | None]:
     if not query_sem_comentarios.startswith('SELECT'):
         return False, 'Query deve começar com SELECT'
 
-    # Verificar keywords bloqueadas
-    for keyword in BLOCKED_KEYWORDS:
-        pattern = rf'\b{keyword}\b'
-        if re.search(pattern, query_sem_comentarios, re.IGNORECASE):
-            return False, f'Comando {keyword} não é permitido'
+    # Verificar keywords bloqueadas (uma única varredura)
+    encontrada = _KEYWORDS_BLOQUEADAS.search(query_sem_comentarios)
+    if encontrada:
+        return False, f'Comando {encontrada.group(1)} não é permitido'
 
     return True, None
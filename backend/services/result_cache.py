@@ -0,0 +1,135 @@
+"""
+Cache de resultados de execução de relatórios.
+Usa o cache framework do Django (locmem, arquivo, Redis...), configurado em CACHES.
+"""
+import hashlib
+import json
+import pickle
+import time
+from django.conf import settings
+from django.core.cache import cache
+from services import result_spill
+
+
+class ResultCache:
+    """
+    Cache opcional por relatório (Relatorio.cache_ttl_segundos > 0).
+
+    A chave é o hash da query final e dos valores dos parâmetros, da conexão
+    e das opções de execução. Cada relatório tem:
+    - uma versão, incrementada para invalidar todos os resultados de uma vez
+    - um índice com o tamanho das entradas, usado para remover as mais antigas
+      quando o relatório passa de RESULT_CACHE_MAX_BYTES_POR_RELATORIO
+
+    Resultados paginados apontam para o arquivo em disco (arquivo_resultado),
+    que é removido após SPILL_TTL_SEGUNDOS: ficam no cache no máximo esse
+    tempo e só são servidos se o arquivo ainda existir.
+    """
+
+    PREFIXO = 'resultado'
+
+    def __init__(self, relatorio):
+        """
+        Args:
+            relatorio: Instância do modelo Relatorio
+        """
+        self.relatorio = relatorio
+        self.ttl = relatorio.cache_ttl_segundos
+
+    @property
+    def ativo(self) -> bool:
+        return self.ttl > 0
+
+    def chave(self, query: str, **opcoes) -> str:
+        """
+        Gera a chave do resultado.
+
+        Args:
+            query: Query final executada no banco
+            **opcoes: Demais parâmetros que alteram o resultado (limite, formato...)
+
+        Returns:
+            Chave do cache
+        """
+        conteudo = json.dumps(
+            [str(self.relatorio.conexao_id), query, opcoes],
+            sort_keys=True,
+            default=str
+        )
+        hash_query = hashlib.sha256(conteudo.encode()).hexdigest()
+        return f'{self.PREFIXO}:{self.relatorio.id}:{self._versao()}:{hash_query}'
+
+    def obter(self, chave: str) -> dict | None:
+        """Retorna o resultado em cache ou None"""
+        if not self.ativo:
+            return None
+        resultado = cache.get(chave)
+        arquivo = resultado.get('arquivo_resultado') if resultado else None
+        if arquivo and not result_spill.existe(arquivo):
+            cache.delete(chave)
+            return None
+        return resultado
+
+    def salvar(self, chave: str, resultado: dict) -> bool:
+        """
+        Salva o resultado respeitando os limites de tamanho.
+
+        Returns:
+            True se o resultado foi armazenado
+        """
+        if not self.ativo:
+            return False
+
+        tamanho = len(pickle.dumps(resultado, pickle.HIGHEST_PROTOCOL))
+        max_item = getattr(settings, 'RESULT_CACHE_MAX_ITEM_BYTES', 5 * 1024 * 1024)
+        max_relatorio = getattr(settings, 'RESULT_CACHE_MAX_BYTES_POR_RELATORIO', 50 * 1024 * 1024)
+
+        if tamanho > max_item or tamanho > max_relatorio:
+            return False
+
+        ttl = self.ttl
+        if resultado.get('arquivo_resultado'):
+            ttl = min(ttl, settings.SPILL_TTL_SEGUNDOS)
+
+        chave_indice = self._chave_indice()
+        agora = time.time()
+
+        # Entradas expiradas (item[2] = quando expira) não contam no tamanho
+        indice = [
+            item for item in cache.get(chave_indice, [])
+            if item[2] > agora and item[0] != chave
+        ]
+
+        # Remove as mais antigas até caber
+        total = sum(item[1] for item in indice)
+        while indice and total + tamanho > max_relatorio:
+            chave_antiga, tamanho_antigo, _ = indice.pop(0)
+            cache.delete(chave_antiga)
+            total -= tamanho_antigo
+
+        indice.append((chave, tamanho, agora + ttl))
+        cache.set(chave, resultado, ttl)
+        cache.set(chave_indice, indice, self.ttl)
+        return True
+
+    def invalidar(self):
+        """Invalida todos os resultados em cache do relatório"""
+        indice = cache.get(self._chave_indice(), [])
+        cache.delete_many([item[0] for item in indice] + [self._chave_indice()])
+
+        chave_versao = self._chave_versao()
+        # add() não sobrescreve; incr() é atômico nos backends que suportam
+        cache.add(chave_versao, 1, None)
+        try:
+            cache.incr(chave_versao)
+        except ValueError:
+            cache.set(chave_versao, 2, None)
+
+    def _versao(self) -> int:
+        return cache.get_or_set(self._chave_versao(), 1, None)
+
+    def _chave_versao(self) -> str:
+        return f'{self.PREFIXO}:{self.relatorio.id}:versao'
+
+    def _chave_indice(self) -> str:
+        return f'{self.PREFIXO}:{self.relatorio.id}:{self._versao()}:indice'
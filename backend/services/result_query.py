@@ -0,0 +1,184 @@
+"""
+Consultas sobre o resultado completo de uma execução (gravado por result_spill).
+Ordenação, filtros, agrupamento e agregações com pyarrow.compute,
+sem executar a query novamente no banco do cliente.
+"""
+from services import result_spill
+
+OPERADORES = [
+    'igual', 'diferente', 'maior', 'maior_igual', 'menor', 'menor_igual',
+    'entre', 'em', 'contem', 'comeca_com', 'nulo', 'nao_nulo',
+]
+
+# Nome da função na API -> agregação do Arrow
+FUNCOES_AGREGACAO = {
+    'soma': 'sum',
+    'contagem': 'count',
+    'media': 'mean',
+    'minimo': 'min',
+    'maximo': 'max',
+}
+
+
+def consultar(nome: str, ordenacao: list = None, filtros: list = None,
+              agrupar_por: list = None, agregacoes: list = None,
+              offset: int = 0, limite: int = 100, formato_dados: str = 'colunar') -> dict:
+    """
+    Aplica filtros, agrupamento e ordenação sobre o resultado gravado
+    e retorna apenas a página pedida.
+
+    Args:
+        nome: Nome do arquivo (Execucao.arquivo_resultado)
+        ordenacao: [{'coluna': str, 'direcao': 'asc'|'desc'}]
+        filtros: [{'coluna': str, 'operador': str, 'valor': any}]
+            (ver OPERADORES; 'entre' e 'em' recebem lista)
+        agrupar_por: Colunas de agrupamento
+        agregacoes: [{'funcao': str, 'coluna': str}] (ver FUNCOES_AGREGACAO).
+            'contagem' sem coluna conta as linhas. Sem agrupar_por, calcula
+            os totais do resultado filtrado (uma linha).
+        offset: Primeira linha da página
+        limite: Quantidade de linhas da página
+        formato_dados: 'colunar' ou 'registros'
+
+    Returns:
+        {'colunas', 'linhas' ou 'dados', 'offset', 'limite', 'total_linhas'}
+        total_linhas considera filtros e agrupamento.
+
+    Raises:
+        ValueError: Coluna, operador ou valor inválido
+        result_spill.ResultadoExpirado: Se o arquivo não existir mais
+    """
+    import pyarrow.compute as pc
+
+    with result_spill.abrir(nome) as tabela:
+        if filtros:
+            tabela = tabela.filter(_montar_filtro(tabela, filtros))
+
+        if agrupar_por or agregacoes:
+            tabela = _agrupar(tabela, agrupar_por or [], agregacoes or [])
+
+        total_linhas = tabela.num_rows
+
+        if ordenacao:
+            chaves = [
+                (_validar_coluna(tabela, item['coluna']),
+                 'descending' if item.get('direcao') == 'desc' else 'ascending')
+                for item in ordenacao
+            ]
+            # Ordena só os índices (nulos ao final) e materializa apenas a página
+            indices = pc.sort_indices(tabela, sort_keys=chaves)
+            pagina = tabela.take(indices.slice(offset, limite))
+        else:
+            pagina = tabela.slice(offset, limite)
+
+        return {
+            **result_spill.serializar_tabela(pagina, formato_dados),
+            'offset': offset,
+            'limite': limite,
+            'total_linhas': total_linhas,
+        }
+
+
+def _validar_coluna(tabela, coluna: str) -> str:
+    if coluna not in tabela.column_names:
+        raise ValueError(f"Coluna '{coluna}' não existe no resultado")
+    return coluna
+
+
+def _converter_valor(valor, tipo, coluna: str):
+    """Converte o valor do JSON para o tipo da coluna (ex.: '2024-01-31' -> timestamp)"""
+    import pyarrow as pa
+
+    try:
+        return pa.scalar(valor).cast(tipo)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        raise ValueError(f"Valor inválido para a coluna '{coluna}': {valor}")
+
+
+def _montar_filtro(tabela, filtros: list):
+    """Combina os filtros (AND) em uma máscara booleana"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    mascara = None
+
+    for filtro in filtros:
+        coluna = _validar_coluna(tabela, filtro['coluna'])
+        operador = filtro['operador']
+        valor = filtro.get('valor')
+        dados = tabela[coluna]
+        tipo = dados.type
+
+        if operador == 'nulo':
+            condicao = pc.is_null(dados)
+        elif operador == 'nao_nulo':
+            condicao = pc.is_valid(dados)
+        elif operador in ('contem', 'comeca_com'):
+            texto = dados if pa.types.is_string(tipo) else pc.cast(dados, pa.string())
+            funcao = pc.match_substring if operador == 'contem' else pc.starts_with
+            condicao = funcao(texto, str(valor), ignore_case=True)
+        elif operador == 'em':
+            if not isinstance(valor, list):
+                raise ValueError("O operador 'em' espera uma lista de valores")
+            valores = pa.array([_converter_valor(v, tipo, coluna).as_py() for v in valor], type=tipo)
+            condicao = pc.is_in(dados, value_set=valores)
+        elif operador == 'entre':
+            if not isinstance(valor, list) or len(valor) != 2:
+                raise ValueError("O operador 'entre' espera uma lista [inicio, fim]")
+            inicio = _converter_valor(valor[0], tipo, coluna)
+            fim = _converter_valor(valor[1], tipo, coluna)
+            condicao = pc.and_(pc.greater_equal(dados, inicio), pc.less_equal(dados, fim))
+        elif operador in ('igual', 'diferente', 'maior', 'maior_igual', 'menor', 'menor_igual'):
+            funcao = {
+                'igual': pc.equal,
+                'diferente': pc.not_equal,
+                'maior': pc.greater,
+                'maior_igual': pc.greater_equal,
+                'menor': pc.less,
+                'menor_igual': pc.less_equal,
+            }[operador]
+            condicao = funcao(dados, _converter_valor(valor, tipo, coluna))
+        else:
+            raise ValueError(f"Operador inválido: {operador}")
+
+        mascara = condicao if mascara is None else pc.and_(mascara, condicao)
+
+    return mascara
+
+
+def _agrupar(tabela, agrupar_por: list, agregacoes: list):
+    """Agrupa e calcula as agregações (nomes de saída: funcao_coluna)"""
+    import pyarrow as pa
+
+    for coluna in agrupar_por:
+        _validar_coluna(tabela, coluna)
+
+    especificacoes = []
+    nomes = {}  # nome gerado pelo Arrow -> nome na resposta
+    for agregacao in agregacoes:
+        funcao = agregacao['funcao']
+        if funcao not in FUNCOES_AGREGACAO:
+            raise ValueError(f"Função de agregação inválida: {funcao}")
+
+        coluna = agregacao.get('coluna')
+        if coluna:
+            especificacao = (_validar_coluna(tabela, coluna), FUNCOES_AGREGACAO[funcao])
+            nome_arrow, nome = f'{coluna}_{FUNCOES_AGREGACAO[funcao]}', f'{funcao}_{coluna}'
+        elif funcao == 'contagem':
+            especificacao = ([], 'count_all')
+            nome_arrow, nome = 'count_all', 'contagem'
+        else:
+            raise ValueError(f"A função '{funcao}' precisa de uma coluna")
+
+        if nome_arrow not in nomes:
+            especificacoes.append(especificacao)
+            nomes[nome_arrow] = nome
+
+    try:
+        agrupado = tabela.group_by(agrupar_por, use_threads=False).aggregate(especificacoes)
+    except (pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+        raise ValueError(f"Agregação não suportada para o tipo da coluna: {e}")
+
+    # Chaves primeiro, depois as agregações (a ordem do aggregate() varia entre versões)
+    agrupado = agrupado.select(agrupar_por + list(nomes))
+    return agrupado.rename_columns(agrupar_por + list(nomes.values()))
@@ -0,0 +1,74 @@
+"""
+Serialização de resultados de queries para JSON.
+Limpa NaN/inf/NaT coluna a coluna com operações vetorizadas.
+"""
+import numpy as np
+import pandas as pd
+
+
+def limpar_colunas(df: pd.DataFrame) -> list[list]:
+    """
+    Converte cada coluna do DataFrame em lista de valores nativos do Python,
+    trocando NaN, inf, -inf, NaT e NA por None.
+
+    O tratamento é feito uma vez por coluna conforme o dtype, sem
+    percorrer célula a célula em Python.
+
+    Args:
+        df: DataFrame com o resultado
+
+    Returns:
+        Lista de colunas, cada uma uma lista de valores JSON serializáveis
+    """
+    colunas = []
+
+    for _, serie in df.items():
+        kind = serie.dtype.kind if isinstance(serie.dtype, np.dtype) else None
+
+        if kind in ('b', 'i', 'u'):
+            # Booleanos e inteiros numpy não possuem nulos
+            colunas.append(serie.tolist())
+
+        elif kind == 'f':
+            valores = serie.to_numpy()
+            objetos = valores.astype(object)
+            objetos[~np.isfinite(valores)] = None
+            colunas.append(objetos.tolist())
+
+        else:
+            # Datas, extension dtypes (Int64, boolean, string) e object
+            objetos = serie.to_numpy(dtype=object, copy=True)
+            objetos[pd.isna(serie).to_numpy()] = None
+            colunas.append(objetos.tolist())
+
+    return colunas
+
+
+def serializar_colunar(df: pd.DataFrame) -> dict:
+    """
+    Formato compacto: nomes das colunas + lista de linhas (arrays),
+    como o values.tolist() do MVP.
+
+    Returns:
+        {'colunas': [...], 'linhas': [[...], ...]}
+    """
+    colunas = limpar_colunas(df)
+    return {
+        'colunas': df.columns.tolist(),
+        'linhas': [list(linha) for linha in zip(*colunas)],
+    }
+
+
+def serializar_registros(df: pd.DataFrame) -> dict:
+    """
+    Formato legado: lista de dicionários {coluna: valor}.
+
+    Returns:
+        {'colunas': [...], 'dados': [{...}, ...]}
+    """
+    nomes = df.columns.tolist()
+    colunas = limpar_colunas(df)
+    return {
+        'colunas': nomes,
+        'dados': [dict(zip(nomes, linha)) for linha in zip(*colunas)],
+    }
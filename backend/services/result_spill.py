@@ -0,0 +1,234 @@
+"""
+Armazenamento do resultado completo de execuções em disco (Arrow IPC).
+Permite navegar por páginas sem executar a query novamente.
+
+Também guarda a resposta de execuções assíncronas (JSON), para que
+qualquer processo que receba a consulta de status consiga lê-la.
+SPILL_DIR precisa ser compartilhado entre os processos da aplicação.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from services.arrow_batches import inferir_schema, montar_record_batch, normalizar_colunas
+
+
+# Arquivos gerenciados por este módulo (removidos por limpar_expirados)
+_EXTENSOES = ('.arrow', '.arrow.tmp', '.resposta.json', '.resposta.json.tmp')
+
+
+class ResultadoExpirado(Exception):
+    """O arquivo do resultado não existe mais (TTL ou limpeza)"""
+
+
+def _diretorio() -> str:
+    diretorio = settings.SPILL_DIR
+    os.makedirs(diretorio, exist_ok=True)
+    return diretorio
+
+
+def _caminho(nome: str) -> str:
+    # nome vem de Execucao.arquivo_resultado; basename evita sair do diretório
+    return os.path.join(_diretorio(), os.path.basename(nome))
+
+
+def gravar(execucao_id, cursor, colunas: list, tamanho_lote: int = 5000) -> tuple[str, int]:
+    """
+    Grava todas as linhas do cursor em um arquivo Arrow IPC.
+
+    O arquivo não é comprimido para permitir leitura por memory-map sem cópia.
+    É escrito com nome temporário e renomeado ao final, então leitores nunca
+    veem um arquivo pela metade.
+
+    Args:
+        execucao_id: ID da Execucao que gerou o resultado (nome do arquivo)
+        cursor: Cursor com a query já executada
+        colunas: Nomes das colunas do cursor
+        tamanho_lote: Linhas por fetchmany/RecordBatch
+
+    Returns:
+        Tupla (nome do arquivo, quantidade de linhas)
+    """
+    import pyarrow as pa
+
+    nome = f'{execucao_id}.arrow'
+    caminho = _caminho(nome)
+    temporario = f'{caminho}.tmp'
+
+    lote = cursor.fetchmany(tamanho_lote)
+    schema = inferir_schema(normalizar_colunas(colunas), lote, cursor.description)
+    qtd_linhas = 0
+
+    try:
+        with pa.OSFile(temporario, 'wb') as arquivo:
+            with pa.ipc.new_file(arquivo, schema) as writer:
+                while lote:
+                    writer.write_batch(montar_record_batch(schema, lote))
+                    qtd_linhas += len(lote)
+                    lote = cursor.fetchmany(tamanho_lote)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+    return nome, qtd_linhas
+
+
+@contextmanager
+def abrir(nome: str):
+    """
+    Abre o resultado gravado como pyarrow.Table mapeada em memória.
+    A tabela só é válida dentro do bloco with.
+
+    Args:
+        nome: Nome do arquivo (Execucao.arquivo_resultado)
+
+    Raises:
+        ResultadoExpirado: Se o arquivo não existir mais
+    """
+    import pyarrow as pa
+
+    try:
+        fonte = pa.memory_map(_caminho(nome), 'r')
+    except FileNotFoundError:
+        raise ResultadoExpirado('O resultado expirou. Execute o relatório novamente.')
+
+    with fonte:
+        yield pa.ipc.open_file(fonte).read_all()
+
+
+def ler_pagina(nome: str, offset: int, limite: int, formato_dados: str = 'colunar') -> dict:
+    """
+    Lê uma página do resultado gravado.
+
+    O arquivo é mapeado em memória e a página é um slice da tabela,
+    então o custo não depende do tamanho total do resultado.
+
+    Args:
+        nome: Nome do arquivo (Execucao.arquivo_resultado)
+        offset: Primeira linha (a partir de 0)
+        limite: Quantidade de linhas
+        formato_dados: 'colunar' (linhas como arrays) ou 'registros' (dicts)
+
+    Returns:
+        {'colunas', 'linhas' ou 'dados', 'offset', 'limite', 'total_linhas'}
+
+    Raises:
+        ResultadoExpirado: Se o arquivo não existir mais
+    """
+    with abrir(nome) as tabela:
+        return {
+            **serializar_tabela(tabela.slice(offset, limite), formato_dados),
+            'offset': offset,
+            'limite': limite,
+            'total_linhas': tabela.num_rows,
+        }
+
+
+def serializar_tabela(tabela, formato_dados: str = 'colunar') -> dict:
+    """
+    Converte uma tabela Arrow (pequena, já paginada) para JSON.
+
+    Returns:
+        {'colunas', 'linhas'} ou {'colunas', 'dados'} no formato 'registros'
+    """
+    colunas = tabela.column_names
+    valores = [_valores_coluna(coluna) for coluna in tabela.columns]
+
+    if formato_dados == 'registros':
+        return {'colunas': colunas, 'dados': [dict(zip(colunas, linha)) for linha in zip(*valores)]}
+    return {'colunas': colunas, 'linhas': [list(linha) for linha in zip(*valores)]}
+
+
+def _valores_coluna(coluna) -> list:
+    """Converte a coluna para valores Python, trocando NaN/inf por None"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if pa.types.is_floating(coluna.type):
+        coluna = pc.if_else(pc.is_finite(coluna), coluna, None)
+    return coluna.to_pylist()
+
+
+def existe(nome: str) -> bool:
+    """Se o arquivo do resultado ainda está em disco"""
+    return os.path.exists(_caminho(nome))
+
+
+def remover(nome: str):
+    """Remove o arquivo do resultado, se existir"""
+    try:
+        os.remove(_caminho(nome))
+    except FileNotFoundError:
+        pass
+
+
+def _caminho_resposta(execucao_id) -> str:
+    return _caminho(f'{execucao_id}.resposta.json')
+
+
+def gravar_resposta(execucao_id, resposta: dict):
+    """
+    Grava a resposta de uma execução assíncrona.
+    Escrita em arquivo temporário e renomeada, como em gravar().
+    """
+    from rest_framework.utils.encoders import JSONEncoder
+
+    caminho = _caminho_resposta(execucao_id)
+    temporario = caminho + '.tmp'
+    try:
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(resposta, arquivo, cls=JSONEncoder, ensure_ascii=False)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def ler_resposta(execucao_id, ttl_segundos: int) -> dict | None:
+    """Resposta gravada por gravar_resposta() ou None se não existe/expirou"""
+    caminho = _caminho_resposta(execucao_id)
+    try:
+        if os.path.getmtime(caminho) < time.time() - ttl_segundos:
+            return None
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return None
+
+
+def limpar_expirados(ttl_segundos: int = None, preservar: set = frozenset()) -> int:
+    """
+    Remove arquivos mais antigos que o TTL (SPILL_TTL_SEGUNDOS).
+
+    Args:
+        ttl_segundos: Idade máxima dos arquivos
+        preservar: Nomes de arquivo mantidos mesmo expirados
+            (ex.: resultados de agendamentos, com retenção própria)
+
+    Returns:
+        Quantidade de arquivos removidos
+    """
+    if ttl_segundos is None:
+        ttl_segundos = settings.SPILL_TTL_SEGUNDOS
+
+    limite = time.time() - ttl_segundos
+    removidos = 0
+
+    with os.scandir(_diretorio()) as entradas:
+        for entrada in entradas:
+            if not entrada.is_file() or not entrada.name.endswith(_EXTENSOES):
+                continue
+            if entrada.name in preservar:
+                continue
+            try:
+                if entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+                    removidos += 1
+            except FileNotFoundError:
+                continue
+
+    return removidos
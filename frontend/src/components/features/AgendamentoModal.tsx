@@ -62,7 +62,7 @@ export function AgendamentoModal({ isOpen, onClose, onSuccess, agendamentoId }:
         dias_semana: [],
         dia_mes: '',
         emails_destino: [],
-        enviar_email: true,
+        enviar_email: false,
         ativo: true
     })
 
@@ -124,7 +124,7 @@ export function AgendamentoModal({ isOpen, onClose, onSuccess, agendamentoId }:
             dias_semana: [],
             dia_mes: '',
             emails_destino: [],
-            enviar_email: true,
+            enviar_email: false,
             ativo: true
         })
         setNewEmail('')
@@ -357,14 +357,15 @@ export function AgendamentoModal({ isOpen, onClose, onSuccess, agendamentoId }:
                                             Destinatários do Relatório
                                         </label>
                                         <div className="flex items-center gap-2 text-sm text-slate-400">
+                                            {/* Envio ainda não disponível: o resultado fica no histórico do agendamento */}
                                             <input
                                                 type="checkbox"
                                                 id="enviarEmail"
                                                 checked={formData.enviar_email}
-                                                onChange={e => setFormData({ ...formData, enviar_email: e.target.checked })}
-                                                className="w-4 h-4 rounded border-slate-600 bg-slate-800 text-purple-500 focus:ring-purple-500"
+                                                disabled
+                                                className="w-4 h-4 rounded border-slate-600 bg-slate-800 text-purple-500 focus:ring-purple-500 disabled:opacity-50"
                                             />
-                                            <label htmlFor="enviarEmail">Habilitar envio</label>
+                                            <label htmlFor="enviarEmail">Habilitar envio (em breve)</label>
                                         </div>
                                     </div>
 
@@ -4,6 +4,7 @@ import api from '@/services/api'
 import { useToast } from '@/hooks/useToast'
 import { DataTable } from './DataTable'
 import { getErrorMessage } from '@/utils/errorMessages'
+import { normalizarResultado } from '@/utils/resultado'
 
 interface Filtro {
   id: string
@@ -89,7 +90,7 @@ export function RelatorioExecutor({ relatorioId, onClose, autoExecute }: Relator
       })
 
       const fim = Date.now()
-      const resultado = response.data
+      const resultado = normalizarResultado(response.data)
 
       // Verificar se a execução foi bem-sucedida
       if (!resultado.sucesso) {
@@ -85,17 +85,17 @@ export default function Dashboard() {
     try {
       setLoading(true)
       const [pastasRes, relatoriosRes, favoritosRes, recentesRes] = await Promise.all([
-        api.get('/pastas/'),
+        api.get('/pastas/arvore/'),
         api.get('/relatorios/'),
         api.get('/favoritos/'),
-        api.get('/historico/?limit=50')
+        api.get('/historico/?limite=50')
       ])
 
-      const pastasFlat = pastasRes.data as PastaNode[]
+      const arvore = pastasRes.data as PastaNode[]
       const relatoriosList = relatoriosRes.data as Relatorio[]
 
       // Organiza pastas em árvore e adiciona relatórios
-      const pastasComRelatorios = organizarPastasComRelatorios(pastasFlat, relatoriosList)
+      const pastasComRelatorios = organizarPastasComRelatorios(arvore, relatoriosList)
       setPastas(pastasComRelatorios)
 
       setRelatorios(relatoriosList)
@@ -103,7 +103,7 @@ export default function Dashboard() {
       const favIds = new Set<string>(favoritosRes.data.map((f: any) => f.relatorio_id))
       setFavoritos(favIds)
 
-      setRecentes(recentesRes.data)
+      setRecentes(recentesRes.data.resultados)
     } catch (error: any) {
       console.error('Erro ao carregar dados:', error)
       const mensagem = getErrorMessage(error)
@@ -113,48 +113,31 @@ export default function Dashboard() {
     }
   }
 
-  // Organiza pastas em estrutura de árvore e adiciona relatórios a cada pasta
-  const organizarPastasComRelatorios = useCallback((pastasFlat: PastaNode[], relatoriosList: Relatorio[]): PastaNode[] => {
-    const pastaMap = new Map<string, PastaNode>()
+  // Adiciona relatórios a cada pasta da árvore (já montada por /pastas/arvore/)
+  const organizarPastasComRelatorios = useCallback((arvore: PastaNode[], relatoriosList: Relatorio[]): PastaNode[] => {
+    const relatoriosPorPasta = new Map<string, RelatorioNode[]>()
 
-    // Cria mapa de pastas
-    pastasFlat.forEach(pasta => {
-      pastaMap.set(pasta.id, { ...pasta, subpastas: [], relatorios: [] })
-    })
-
-    // Adiciona relatórios às pastas
     relatoriosList.forEach(relatorio => {
       const pastaId = relatorio.pasta || relatorio.pasta_id
       if (pastaId) {
-        const pasta = pastaMap.get(pastaId)
-        if (pasta) {
-          pasta.relatorios = pasta.relatorios || []
-          pasta.relatorios.push({
-            id: relatorio.id,
-            nome: relatorio.nome,
-            descricao: relatorio.descricao
-          })
-        }
+        const lista = relatoriosPorPasta.get(pastaId) || []
+        lista.push({
+          id: relatorio.id,
+          nome: relatorio.nome,
+          descricao: relatorio.descricao
+        })
+        relatoriosPorPasta.set(pastaId, lista)
       }
     })
 
-    // Monta árvore
-    const pastasRaiz: PastaNode[] = []
-
-    pastasFlat.forEach(pasta => {
-      const pastaNode = pastaMap.get(pasta.id)!
-      if (pasta.pasta_pai) {
-        const pai = pastaMap.get(pasta.pasta_pai)
-        if (pai) {
-          pai.subpastas = pai.subpastas || []
-          pai.subpastas.push(pastaNode)
-        }
-      } else {
-        pastasRaiz.push(pastaNode)
-      }
-    })
+    const montar = (pastas: PastaNode[]): PastaNode[] =>
+      pastas.map(pasta => ({
+        ...pasta,
+        subpastas: montar(pasta.subpastas || []),
+        relatorios: relatoriosPorPasta.get(pasta.id) || []
+      }))
 
-    return pastasRaiz
+    return montar(arvore)
   }, [])
 
   // Carrega relatórios por pasta (quando necessário)
@@ -275,9 +258,9 @@ export default function Dashboard() {
 
     try {
       await api.delete(`/pastas/${pasta.id}/`)
-      const res = await api.get('/pastas/')
-      const pastasFlat = res.data as PastaNode[]
-      const pastasComRelatorios = organizarPastasComRelatorios(pastasFlat, relatorios)
+      const res = await api.get('/pastas/arvore/')
+      const arvore = res.data as PastaNode[]
+      const pastasComRelatorios = organizarPastasComRelatorios(arvore, relatorios)
       setPastas(pastasComRelatorios)
       showToast('Pasta excluída com sucesso', 'success')
     } catch (error: any) {
@@ -308,9 +291,9 @@ export default function Dashboard() {
 
       // Atualiza árvore de pastas
       const resRel = await api.get('/relatorios/')
-      const pastasRes = await api.get('/pastas/')
-      const pastasFlat = pastasRes.data as PastaNode[]
-      const pastasComRelatorios = organizarPastasComRelatorios(pastasFlat, resRel.data)
+      const pastasRes = await api.get('/pastas/arvore/')
+      const arvore = pastasRes.data as PastaNode[]
+      const pastasComRelatorios = organizarPastasComRelatorios(arvore, resRel.data)
       setPastas(pastasComRelatorios)
 
       showToast('Relatório removido da pasta', 'success')
@@ -322,9 +305,9 @@ export default function Dashboard() {
   }
 
   const handleSucessoPasta = async () => {
-    const pastasRes = await api.get('/pastas/')
-    const pastasFlat = pastasRes.data as PastaNode[]
-    const pastasComRelatorios = organizarPastasComRelatorios(pastasFlat, relatorios)
+    const pastasRes = await api.get('/pastas/arvore/')
+    const arvore = pastasRes.data as PastaNode[]
+    const pastasComRelatorios = organizarPastasComRelatorios(arvore, relatorios)
     setPastas(pastasComRelatorios)
   }
 
@@ -339,9 +322,9 @@ export default function Dashboard() {
     setRelatorios(resRel.data)
 
     // Atualiza árvore de pastas
-    const pastasRes = await api.get('/pastas/')
-    const pastasFlat = pastasRes.data as PastaNode[]
-    const pastasComRelatorios = organizarPastasComRelatorios(pastasFlat, resRel.data)
+    const pastasRes = await api.get('/pastas/arvore/')
+    const arvore = pastasRes.data as PastaNode[]
+    const pastasComRelatorios = organizarPastasComRelatorios(arvore, resRel.data)
     setPastas(pastasComRelatorios)
   }
 
@@ -421,9 +404,9 @@ export default function Dashboard() {
       showToast('Relatórios movidos com sucesso', 'success')
 
       // Atualiza árvore de pastas
-      const pastasRes = await api.get('/pastas/')
-      const pastasFlat = pastasRes.data as PastaNode[]
-      const pastasComRelatorios = organizarPastasComRelatorios(pastasFlat, res.data)
+      const pastasRes = await api.get('/pastas/arvore/')
+      const arvore = pastasRes.data as PastaNode[]
+      const pastasComRelatorios = organizarPastasComRelatorios(arvore, res.data)
       setPastas(pastasComRelatorios)
     } catch (error: any) {
       console.error('Erro ao mover relatórios:', error)
@@ -4,6 +4,7 @@ import api from '../services/api'
 import FiltroInput from '../components/features/FiltroInput'
 import type { Filtro } from '../components/features/FiltroForm'
 import { getErrorMessage } from '../utils/errorMessages'
+import { descreverQuantidadeLinhas, normalizarResultado } from '../utils/resultado'
 
 interface Relatorio {
   id: string
@@ -18,8 +19,9 @@ interface ResultadoExecucao {
   sucesso: boolean
   colunas?: string[]
   dados?: any[]
-  total_linhas?: number
+  total_linhas?: number | null
   linhas_exibidas?: number
+  possui_mais?: boolean
   tempo_ms?: number
   erro?: string
 }
@@ -76,7 +78,7 @@ export default function ExecutarRelatorio() {
       const response = await api.post(`/relatorios/${id}/executar/`, {
         filtros: valoresFiltros
       })
-      setResultado(response.data)
+      setResultado(normalizarResultado(response.data))
     } catch (err: any) {
       const errorMsg = getErrorMessage(err)
       setError(errorMsg)
@@ -204,9 +206,17 @@ export default function ExecutarRelatorio() {
         <div className="bg-slate-800 rounded-lg overflow-hidden">
           <div className="bg-slate-700 px-4 py-3 flex justify-between items-center text-sm">
             <div className="text-slate-300">
-              <span className="font-semibold">{resultado.linhas_exibidas}</span> de{' '}
-              <span className="font-semibold">{resultado.total_linhas}</span> linhas
-              {resultado.total_linhas! > resultado.linhas_exibidas! && (
+              {resultado.total_linhas != null ? (
+                <>
+                  <span className="font-semibold">{resultado.linhas_exibidas}</span> de{' '}
+                  <span className="font-semibold">{resultado.total_linhas}</span> linhas
+                </>
+              ) : (
+                <span className="font-semibold">{descreverQuantidadeLinhas(resultado)}</span>
+              )}
+              {(resultado.total_linhas != null
+                ? resultado.total_linhas > resultado.linhas_exibidas!
+                : resultado.possui_mais) && (
                 <span className="text-yellow-400 ml-2">
                   (exibindo apenas primeiras {resultado.linhas_exibidas})
                 </span>
@@ -1,4 +1,4 @@
-import { useState, useEffect, useMemo } from 'react'
+import { useState, useEffect, useMemo, useRef } from 'react'
 import { useNavigate } from 'react-router-dom'
 import {
   Clock,
@@ -18,6 +18,7 @@ import {
 } from 'lucide-react'
 import { AppLayout } from '@/components/layout/AppLayout'
 import { useToast } from '@/hooks/useToast'
+import { useDebounce } from '@/hooks/useDebounce'
 import api from '@/services/api'
 import { formatDistanceToNow } from 'date-fns'
 import { ptBR } from 'date-fns/locale'
@@ -42,29 +43,67 @@ interface Execucao {
   filtros_usados: Record<string, any>
 }
 
+interface PaginaHistorico {
+  resultados: Execucao[]
+  proximo_cursor: string | null
+  possui_mais: boolean
+}
+
+const TAMANHO_PAGINA = 100
+
 export default function Historico() {
   const [execucoes, setExecucoes] = useState<Execucao[]>([])
   const [loading, setLoading] = useState(true)
+  const [filtrando, setFiltrando] = useState(false)
+  const [carregandoMais, setCarregandoMais] = useState(false)
+  const [proximoCursor, setProximoCursor] = useState<string | null>(null)
   const [busca, setBusca] = useState('')
   const [statusFilter, setStatusFilter] = useState<'todos' | 'sucesso' | 'erro'>('todos')
+  const [dataInicio, setDataInicio] = useState('')
+  const [dataFim, setDataFim] = useState('')
+  const buscaDebounced = useDebounce(busca, 300)
+  const ultimaRequisicao = useRef(0)
   const { showToast } = useToast()
   const navigate = useNavigate()
 
   useEffect(() => {
     carregarHistorico()
-  }, [])
+  }, [dataInicio, dataFim, statusFilter, buscaDebounced])
 
-  async function carregarHistorico() {
+  // Sem cursor recarrega do início; com cursor acrescenta a próxima página.
+  // Os filtros vão para a API, que os aplica antes da paginação por cursor.
+  async function carregarHistorico(cursor?: string) {
+    const requisicao = ++ultimaRequisicao.current
     try {
-      setLoading(true)
-      const response = await api.get('/historico/')
-      setExecucoes(response.data)
+      if (cursor) {
+        setCarregandoMais(true)
+      } else {
+        setFiltrando(true)
+      }
+
+      const params: Record<string, string | number> = { limite: TAMANHO_PAGINA }
+      if (cursor) params.cursor = cursor
+      if (dataInicio) params.iniciado_de = dataInicio
+      if (dataFim) params.iniciado_ate = dataFim
+      if (statusFilter !== 'todos') params.sucesso = statusFilter === 'sucesso' ? 'true' : 'false'
+      if (buscaDebounced.trim()) params.busca = buscaDebounced.trim()
+
+      const response = await api.get('/historico/', { params })
+      // Filtros mudaram enquanto a resposta chegava: descarta a resposta antiga
+      if (requisicao !== ultimaRequisicao.current) return
+      const pagina = response.data as PaginaHistorico
+      setExecucoes(anteriores => cursor ? [...anteriores, ...pagina.resultados] : pagina.resultados)
+      setProximoCursor(pagina.possui_mais ? pagina.proximo_cursor : null)
     } catch (error: any) {
       const mensagem = getErrorMessage(error)
       showToast(mensagem, 'error')
       console.error('Erro ao carregar histórico:', error)
     } finally {
-      setLoading(false)
+      if (requisicao === ultimaRequisicao.current) {
+        setLoading(false)
+        setFiltrando(false)
+        setCarregandoMais(false)
+      }
     }
   }
 
@@ -76,21 +115,6 @@ export default function Historico() {
     }
   }, [execucoes])
 
-  const filteredExecucoes = useMemo(() => {
-    return execucoes.filter(exec => {
-      const matchesBusca =
-        exec.relatorio_nome.toLowerCase().includes(busca.toLowerCase()) ||
-        exec.usuario_nome.toLowerCase().includes(busca.toLowerCase())
-
-      const matchesStatus =
-        statusFilter === 'todos' ||
-        (statusFilter === 'sucesso' && exec.sucesso) ||
-        (statusFilter === 'erro' && !exec.sucesso)
-
-      return matchesBusca && matchesStatus
-    })
-  }, [execucoes, busca, statusFilter])
-
   const formatarTempo = (ms: number | null) => {
     if (!ms) return '-'
     if (ms < 1000) return `${ms}ms`
@@ -308,6 +332,26 @@ export default function Historico() {
               ))}
             </div>
 
+            {/* Date Range */}
+            <div className="flex items-center gap-2">
+              <Calendar className="w-4 h-4 text-slate-500" />
+              <input
+                type="date"
+                value={dataInicio}
+                max={dataFim || undefined}
+                onChange={(e) => setDataInicio(e.target.value)}
+                className="px-3 py-2 bg-slate-950/30 text-white text-sm rounded-xl border border-white/5 focus:border-purple-500 focus:outline-none transition-all"
+              />
+              <span className="text-slate-500 text-xs">até</span>
+              <input
+                type="date"
+                value={dataFim}
+                min={dataInicio || undefined}
+                onChange={(e) => setDataFim(e.target.value)}
+                className="px-3 py-2 bg-slate-950/30 text-white text-sm rounded-xl border border-white/5 focus:border-purple-500 focus:outline-none transition-all"
+              />
+            </div>
+
             {/* Search Input */}
             <div className="relative flex-1">
               <Search className="absolute left-4 top-1/2 -translate-y-1/2 w-4 h-4 text-slate-500" />
@@ -322,8 +366,8 @@ export default function Historico() {
           </div>
 
           {/* Table Area */}
-          <div className="p-1">
-            {filteredExecucoes.length === 0 ? (
+          <div className={`p-1 transition-opacity ${filtrando ? 'opacity-50' : ''}`}>
+            {execucoes.length === 0 ? (
               <div className="py-20 flex flex-col items-center text-center">
                 <div className="w-16 h-16 bg-slate-800/50 rounded-2xl flex items-center justify-center mb-4 border border-white/5">
                   <Search className="w-8 h-8 text-slate-600" />
@@ -334,7 +378,20 @@ export default function Historico() {
                 </p>
               </div>
             ) : (
-              <DataTable data={filteredExecucoes} columns={columns} />
+              <DataTable data={execucoes} columns={columns} />
+            )}
+
+            {proximoCursor && (
+              <div className="flex justify-center py-4">
+                <Button
+                  variant="ghost"
+                  onClick={() => carregarHistorico(proximoCursor)}
+                  disabled={carregandoMais}
+                  className="text-purple-400 hover:text-purple-300 hover:bg-purple-400/10 text-[11px] font-black uppercase tracking-widest"
+                >
+                  {carregandoMais ? 'Carregando...' : 'Carregar execuções anteriores'}
+                </Button>
+              </div>
             )}
           </div>
         </div>
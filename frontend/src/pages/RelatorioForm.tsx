@@ -9,6 +9,7 @@ import type { Filtro } from '@/components/features/FiltroForm'
 import type { PastaNode } from '@/components/features/FolderTree'
 import { useAuth } from '@/contexts/AuthContext'
 import { useToast } from '@/hooks/useToast'
+import { descreverQuantidadeLinhas, normalizarResultado } from '@/utils/resultado'
 
 interface Conexao {
   id: string
@@ -147,9 +148,9 @@ export default function RelatorioForm() {
 
     try {
       const response = await api.post(`/relatorios/${id}/testar/`)
-      setResultadoTeste(response.data)
+      setResultadoTeste(normalizarResultado(response.data))
       if (response.data.sucesso) {
-        showToast(`Query válida! ${response.data.total_linhas} linhas encontradas`, 'success')
+        showToast(`Query válida! ${descreverQuantidadeLinhas(response.data)}`, 'success')
       } else {
         showToast('Erro na query', 'error')
       }
@@ -407,7 +408,7 @@ export default function RelatorioForm() {
               {resultadoTeste.sucesso ? (
                 <div>
                   <div className="text-green-400 font-semibold mb-3 flex items-center gap-2">
-                    ✓ Query válida! {resultadoTeste.total_linhas} linhas encontradas
+                    ✓ Query válida! {descreverQuantidadeLinhas(resultadoTeste)}
                   </div>
                   <div className="overflow-auto rounded-lg border border-slate-700">
                     <table className="w-full text-sm">
@@ -0,0 +1,42 @@
+/**
+ * Utilitário para converter o resultado de execução da API
+ */
+
+/**
+ * O backend devolve o resultado no formato colunar (`colunas` + `linhas`
+ * como arrays). Monta `dados` (lista de objetos) para as telas que
+ * acessam os valores por nome de coluna.
+ */
+export function normalizarResultado<T extends Record<string, any>>(resultado: T): T & { dados?: Record<string, any>[] } {
+  if (!resultado || resultado.dados || !Array.isArray(resultado.linhas)) {
+    return resultado
+  }
+
+  const colunas: string[] = resultado.colunas || []
+  const dados = resultado.linhas.map((linha: any[]) => {
+    const registro: Record<string, any> = {}
+    colunas.forEach((coluna, idx) => {
+      registro[coluna] = linha[idx]
+    })
+    return registro
+  })
+
+  return { ...resultado, dados }
+}
+
+/**
+ * Texto com a quantidade de linhas do resultado. Sem contagem
+ * (contar_total=false), `total_linhas` vem null: mostra as linhas
+ * retornadas ou "mais de N" quando o resultado foi cortado no limite.
+ */
+export function descreverQuantidadeLinhas(resultado: {
+  total_linhas?: number | null
+  linhas_exibidas?: number
+  possui_mais?: boolean
+}): string {
+  if (resultado.total_linhas != null) {
+    return `${resultado.total_linhas} linhas encontradas`
+  }
+  const exibidas = resultado.linhas_exibidas ?? 0
+  return resultado.possui_mais ? `mais de ${exibidas} linhas encontradas` : `${exibidas} linhas encontradas`
+}